@@ -72,7 +72,8 @@
  ^{:arglists '([^Class c x])
    :doc "Evaluates x and tests if it is an instance of the class
     c. Returns true or false"
-   :added "1.0"}
+   :added "1.0"
+   :inline (fn instance?__inliner [c x] (list 'py/isinstance x c))}
  instance? (fn instance? [c x] (py/isinstance x c)))
 
 (def
@@ -227,12 +228,13 @@
           (recur (next s))
           (first s))))
 
-(def nil?
+(def
  ^{:tag Boolean
    :doc "Returns true if x is nil, false otherwise."
    :added "1.0"
-   :static true}
-  (fn nil? [x] (is? x nil)))
+   :static true
+   :inline (fn nil?__inliner [x] (list 'is? x nil))}
+ nil? (fn nil? [x] (is? x nil)))
 
 (def
  ^{:arglists '([& args])
@@ -272,6 +274,7 @@
 (def set-macro 
     (fn set-macro [f]
         (py/setattr f "macro?" true)
+        (clojure.lang.namespace/changed)
         f))	 
  	 
  	 
@@ -344,7 +347,7 @@
                   (py/if (py/if (.__eq__ 'fn ifn)
                         (py/if (instance? clojure.lang.symbol/Symbol iname) false true))
                     ;; inserts the same fn name to the inline fn if it does not have one
-                    (assoc m :inline (cons ifn (cons (clojure.lang.symbol/symbol (.concat (.getName name) "__inliner"))
+                    (assoc m :inline (cons ifn (cons (clojure.lang.symbol/symbol (.__add__ (.getName name) "__inliner"))
                                                      (next inline))))
                     m))
               m (conj (py/if (meta name) (meta name) {}) m)
@@ -440,7 +443,8 @@
 
 (defn not
   "Returns true if x is logical false, false otherwise."
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x] (list 'py/if x false true))}
   [x] (py/if x false true))
 
 (defn println
@@ -493,7 +497,8 @@
   "Returns a number one greater than num. Does not auto-promote
   longs, will throw on overflow. See also: inc'"
   {:added "1.2"
-   :static true}
+   :static true
+   :inline (fn [x] (list 'py.bytecode/BINARY_ADD x 1))}
   [x] (py.bytecode/BINARY_ADD x 1))
 
 (defn +
@@ -505,11 +510,11 @@
   {:added "1.0"}
   ([] {})
   ([& keyvals]
-      (let [coll {}]
+      (let [coll (.asTransient {})]
           (loop [keyvals (seq keyvals) coll coll]
               (py/if (nil? keyvals)
-                  coll
-                  (do (py/if (py.bytecode/COMPARE_OP "==" (py/len keyvals) 1)
+                  (.persistent coll)
+                  (do (py/if (nil? (next keyvals))
                           (throw (py/Exception "Even number of args required to hash-map")))
                       (py/if (py.bytecode/COMPARE_OP "in" (first keyvals) coll)
                           (throw (py/Exception "Duplicate keys found in hash-map")))
@@ -573,7 +578,9 @@
   numbers and collections in a type-independent manner.  Clojure's immutable data
   structures define equals() (and thus =) as a value, not an identity,
   comparison."
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP "==" x y))
+   :inline-arities #{2}}
   ([x] true)
   ([x y] (py.bytecode/COMPARE_OP "==" x y))
   ([x y & more]
@@ -726,6 +733,13 @@
 	                   (if (py.bytecode/COMPARE_OP "==" (first s) (first o))
 	                       (recur (next s) (next o))
 	                       false)))))
+	(__hash__ [self]
+	    (let [s (seq self)]
+	         (py/if (nil? s)
+	             1
+	             (py/hash s))))
+	(hasheq [self]
+	    (py/hash self))
 	(__iter__ [self]
 	    (loop [s (seq self)]
 	          (when s
@@ -779,42 +793,9 @@
   (list 'clojure.core/LazySeq (list* '^{:once true} fn* [] body) nil nil nil))    
 
 
-(definterface IChunkedSeq [] 
-	clojure.lang.sequential/Sequential
-
-	clojure.lang.iseq/ISeq
-	(chunkedFirst [self] nil)
-	(chunkedNext [self] nil)
-	(chunkedMore [self] nil))
-
-
-
-(deftype ArrayChunk [array off end]
-    (__getitem__ 
-        ([self i]
-          (py.bytecode/BINARY_SUBSCR array (py.bytecode/BINARY_ADD off i)))
-        ([self i not-found]
-          (if (py.bytecode/COMPARE_OP ">=" i 0)
-              (if (py.bytecode/COMPARE_OP "<" i (py/len self))
-                  (py.bytecode/BINARY_SUBSCR array i)
-                  not-found)
-              not-found)))
+(def IChunkedSeq clojure.lang.ichunkedseq/IChunkedSeq)
 
-    (__len__ [self]
-        (py.bytecode/BINARY_SUBTRACT end off))
-
-    (dropFirst [self]
-        (if (= off end)
-            (throw (IllegalStateException "dropFirst of empty chunk")))
-        (ArrayChunk array (inc off) end))
-
-    (reduce [self f start]
-        (loop [ret (f start (py.bytecode/BINARY_SUBSCR array off))
-               x (inc off)]
-             (if (py.bytecode/COMPARE_OP "<" x end)
-             (recur (f ret (py.bytecode/BINARY_SUBSCR array x)) 
-                (inc x))
-             ret))))
+(def ArrayChunk clojure.lang.arraychunk/ArrayChunk)
 
 
 (deftype ChunkBuffer [buffer end]
@@ -945,7 +926,8 @@
 
 (defn identical?
   "Tests if 2 arguments are the same object"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP "is" x y))}
   ([x y] (py.bytecode/COMPARE_OP "is" x y)))
 
 (defn compare
@@ -957,6 +939,13 @@
   {:added "1.0"}
   [x y] (py/cmp x y))
 
+(defn hash
+  "Returns the hash code of its argument. Note this is the hash code
+  consistent with =, and that nil hashes to 0. Persistent collections
+  work theirs out once and keep it."
+  {:added "1.0"}
+  [x] (clojure.lang.util/hasheq x))
+
 (defmacro or
   "Evaluates exprs one at a time, from left to right. If a form
   returns a logical true value, or returns that value and doesn't
@@ -971,7 +960,8 @@
 
 (defn zero?
   "Returns true if num is zero, else false"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x] (list 'py.bytecode/COMPARE_OP "==" x 0))}
   [x] (py.bytecode/COMPARE_OP "==" x 0))
 
 (defn count
@@ -990,7 +980,9 @@
   "Returns non-nil if nums are in monotonically increasing order,
   otherwise false."
   {:added "1.0"
-   :static true}
+   :static true
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP "<" x y))
+   :inline-arities #{2}}
   ([x] true)
   ([x y] (py.bytecode/COMPARE_OP "<" x y))
   ([x y & more]
@@ -1023,13 +1015,32 @@
   [coll]
     (reduce1 conj () coll))
 
+(defn rseq
+  "Returns, in constant time, a seq of the items in rev (which
+  can be a vector or sorted-map), in reverse order. If rev is empty returns nil"
+  {:added "1.0"}
+  [rev]
+    (.rseq rev))
+
 (defn >1? [n] (py.bytecode/COMPARE_OP ">" n 1))
 (defn >0? [n] (py.bytecode/COMPARE_OP ">" n 0))
 
+(defn nary-inline
+  "Expands (op x y & more) into nested two argument calls of the bytecode op,
+  for use in :inline fns"
+  {:private true}
+  [op x y more]
+  (loop [ret (list op x y) more (seq more)]
+    (if more
+      (recur (list op ret (first more)) (next more))
+      ret)))
+
 (defn +
   "Returns the sum of nums. (+) returns 0. Does not auto-promote
   longs, will throw on overflow. See also: +'"
-  {:added "1.2"}
+  {:added "1.2"
+   :inline (fn [x y & more] (nary-inline 'py.bytecode/BINARY_ADD x y more))
+   :inline-arities >1?}
   ([] 0)
   ([x] x)
   ([x y] (py.bytecode/BINARY_ADD x y))
@@ -1039,7 +1050,9 @@
 (defn *
   "Returns the product of nums. (*) returns 1. Does not auto-promote
   longs, will throw on overflow. See also: *'"
-  {:added "1.2"}
+  {:added "1.2"
+   :inline (fn [x y & more] (nary-inline 'py.bytecode/BINARY_MULTIPLY x y more))
+   :inline-arities >1?}
   ([] 1)
   ([x] x)
   ([x y] (py.bytecode/BINARY_MULTIPLY x y))
@@ -1049,7 +1062,9 @@
 (defn /
   "If no denominators are supplied, returns 1/numerator,
   else returns numerator divided by all of the denominators."
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y & more] (nary-inline 'py.bytecode/BINARY_DIVIDE x y more))
+   :inline-arities >1?}
   ([x] (/ 1 x))
   ([x y] (py.bytecode/BINARY_DIVIDE x y))
   ([x y & more]
@@ -1059,7 +1074,11 @@
   "If no ys are supplied, returns the negation of x, else subtracts
   the ys from x and returns the result. Does not auto-promote
   longs, will throw on overflow. See also: -'"
-  {:added "1.2"}
+  {:added "1.2"
+   :inline (fn
+             ([x] (list 'py.bytecode/UNARY_NEGATIVE x))
+             ([x y & more] (nary-inline 'py.bytecode/BINARY_SUBTRACT x y more)))
+   :inline-arities >0?}
   ([x] (py.bytecode/UNARY_NEGATIVE x))
   ([x y] (py.bytecode/BINARY_SUBTRACT x y))
   ([x y & more]
@@ -1068,7 +1087,9 @@
 (defn <=
   "Returns non-nil if nums are in monotonically non-decreasing order,
   otherwise false."
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP "<=" x y))
+   :inline-arities #{2}}
   ([x] true)
   ([x y] (py.bytecode/COMPARE_OP "<=" x y))
   ([x y & more]
@@ -1081,7 +1102,9 @@
 (defn >
   "Returns non-nil if nums are in monotonically decreasing order,
   otherwise false."
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP ">" x y))
+   :inline-arities #{2}}
   ([x] true)
   ([x y] (py.bytecode/COMPARE_OP ">" x y))
   ([x y & more]
@@ -1094,7 +1117,9 @@
 (defn >=
   "Returns non-nil if nums are in monotonically non-increasing order,
   otherwise false."
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP ">=" x y))
+   :inline-arities #{2}}
   ([x] true)
   ([x y] (py.bytecode/COMPARE_OP ">=" x y))
   ([x y & more]
@@ -1107,7 +1132,9 @@
 (defn ==
   "Returns non-nil if nums all have the equivalent
   value (type-independent), otherwise false"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y] (list 'py.bytecode/COMPARE_OP "==" x y))
+   :inline-arities #{2}}
   ([x] true)
   ([x y] (py.bytecode/COMPARE_OP "==" x y))
   ([x y & more]
@@ -1120,7 +1147,8 @@
 (defn dec
   "Returns a number one less than num. Does not auto-promote
   longs, will throw on overflow. See also: dec'"
-  {:added "1.2"}
+  {:added "1.2"
+   :inline (fn [x] (list 'py.bytecode/BINARY_SUBTRACT x 1))}
   [x] (py.bytecode/BINARY_SUBTRACT x 1))
 
 (defn max
@@ -1176,26 +1204,33 @@
 
 (defn bit-not
   "Bitwise complement"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x] (list 'py.bytecode/UNARY_INVERT x))}
   [x] (py.bytecode/UNARY_INVERT x))
 
 (defn bit-and
   "Bitwise and"
-   {:added "1.0"}
+   {:added "1.0"
+    :inline (fn [x y & more] (nary-inline 'py.bytecode/BINARY_AND x y more))
+    :inline-arities >1?}
    ([x y] (py.bytecode/BINARY_AND x y))
    ([x y & more]
       (reduce1 bit-and (bit-and x y) more)))
 
 (defn bit-or
   "Bitwise or"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y & more] (nary-inline 'py.bytecode/BINARY_OR x y more))
+   :inline-arities >1?}
   ([x y] (py.bytecode/BINARY_OR x y))
   ([x y & more]
     (reduce1 bit-or (bit-or x y) more)))
 
 (defn bit-xor
   "Bitwise exclusive or"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x y & more] (nary-inline 'py.bytecode/BINARY_XOR x y more))
+   :inline-arities >1?}
   ([x y] (py.bytecode/BINARY_XOR x y))
   ([x y & more]
     (reduce1 bit-xor (bit-xor x y) more)))
@@ -1209,12 +1244,14 @@
 
 (defn bit-shift-left
   "Bitwise shift left"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x n] (list 'py.bytecode/BINARY_LSHIFT x n))}
   [x n] (py.bytecode/BINARY_LSHIFT x n))
 
 (defn bit-shift-right
   "Bitwise shift right"
-  {:added "1.0"}
+  {:added "1.0"
+   :inline (fn [x n] (list 'py.bytecode/BINARY_RSHIFT x n))}
   [x n] (py.bytecode/BINARY_RSHIFT x n))
 
 (defn bit-clear
@@ -1444,6 +1481,19 @@
   [e]
     (. e (getValue)))
 
+(defn reduce-kv
+  "Reduces an associative collection. f should be a function of 3
+  arguments. Returns the result of applying f to init, the first key
+  and the first value in coll, then applying f to that result and the
+  2nd key and value, etc. If coll contains no entries, returns init
+  and f is not called. Maps that implement IKVReduce do it without
+  making map entries."
+  {:added "1.4"}
+  [f init coll]
+    (if (instance? clojure.lang.ikvreduce/IKVReduce coll)
+        (.kvreduce coll f init)
+        (reduce1 (fn [ret e] (f ret (key e) (val e))) init coll)))
+
 (defn unicode?
   "Returns true if x is unicode"
   [x]
@@ -1514,7 +1564,7 @@
   [& pairs]
   `(do (when-not ~(first pairs)
          (throw (py/Exception
-                  (str (first ~'&form) " requires " ~(second pairs) " in " ~'__name__ ":" (:line (meta ~'&form))))))
+                  (str (first ~'&form) " requires " ~(second pairs) " in " ~'__name__ ":" (clojure.lang.lispreader/lineOf ~'&form)))))
      ~(let [more (nnext pairs)]
         (when more
           (list* `assert-args more)))))
@@ -1926,14 +1976,14 @@
   "Returns a map with the keys mapped to the corresponding vals."
   {:added "1.0"}
   [keys vals]
-    (loop [map {}
+    (loop [map (.asTransient {})
            ks (seq keys)
            vs (seq vals)]
       (if (and ks vs)
-        (recur (assoc map (first ks) (first vs))
+        (recur (.assoc map (first ks) (first vs))
                (next ks)
                (next vs))
-        map)))
+        (.persistent map))))
 
 
 (defn line-seq
@@ -2167,7 +2217,9 @@
 						     (py/locals)
 					  	     (py/list (list ~@symnames))
 						     -1)]
-		       ~@copies ))))
+		       ~@copies
+		       ; STORE_GLOBAL doesn't go through the setattr of the namespace
+		       (clojure.lang.namespace/changed)))))
 
 (defmacro import 
   "import-list => (package-symbol class-name-symbols*)
@@ -2233,7 +2285,52 @@
 (defn read-string
   "Reads one object from the string s"
   {:added "1.0"}
-  [s] (readString s))
+  [s] (readString s false))
+
+
+;;; printing
+
+(def ^{:dynamic true
+       :doc "The most items of a collection printed, the rest is
+  printed as ... nil prints all of them."}
+  *print-length* nil)
+
+(def ^{:dynamic true
+       :doc "How many levels of nested collections are printed, deeper
+  ones are printed as #. nil prints all of them."}
+  *print-level* nil)
+
+(import '(clojure.lang.printer printTo printString))
+
+(defn pr-str
+  "Prints the objects to a string the way the reader reads them back,
+  separated by spaces, and returns it."
+  {:added "1.0"}
+  [& xs] (.join " " (map printString xs)))
+
+(defn print-str
+  "Prints the objects to a string, strings as they are, separated by
+  spaces, and returns it."
+  {:added "1.0"}
+  [& xs] (.join " " (map #(printString % false) xs)))
+
+(defn pr
+  "Prints the objects to sys.stdout the way the reader reads them back,
+  separated by spaces. Collections are written an item at a time."
+  {:added "1.0"}
+  ([] nil)
+  ([x] (printTo x))
+  ([x & more]
+   (printTo x)
+   (printTo " " nil false)
+   (apply pr more)))
+
+(defn prn
+  "Same as pr followed by a newline."
+  {:added "1.0"}
+  [& more]
+  (apply pr more)
+  (printTo "\n" nil false))
 
 
 (defn subvec
@@ -2248,6 +2345,68 @@
   ([v start end]
    (. clojure.lang.rt (subvec v start end))))
 
+
+;;; transients
+
+(defn transient
+  "Returns a new, transient version of the collection, in constant time."
+  {:added "1.1"}
+  [coll] (.asTransient coll))
+
+(defn persistent!
+  "Returns a new, persistent version of the transient collection, in
+  constant time. The transient collection cannot be used after this
+  call, any such use will throw an exception."
+  {:added "1.1"}
+  [coll] (.persistent coll))
+
+(defn conj!
+  "Adds x to the transient collection, and return coll. The 'addition'
+  may happen at different 'places' depending on the concrete type."
+  {:added "1.1"}
+  [coll x] (.conj coll x))
+
+(defn assoc!
+  "When applied to a transient map, adds mapping of key(s) to
+  val(s). When applied to a transient vector, sets the val at index.
+  Note - index must be <= (count vector). Returns coll."
+  {:added "1.1"}
+  ([coll key val] (.assoc coll key val))
+  ([coll key val & kvs]
+   (let [ret (.assoc coll key val)]
+     (if kvs
+       (recur ret (first kvs) (second kvs) (nnext kvs))
+       ret))))
+
+(defn dissoc!
+  "Returns a transient map that doesn't contain a mapping for key(s)."
+  {:added "1.1"}
+  ([map key] (.without map key))
+  ([map key & ks]
+   (let [ret (.without map key)]
+     (if ks
+       (recur ret (first ks) (next ks))
+       ret))))
+
+(defn disj!
+  "disj[oin]. Returns a transient set of the same (hashed/sorted) type, that
+  does not contain key(s)."
+  {:added "1.1"}
+  ([set] set)
+  ([set key]
+   (.disjoin set key))
+  ([set key & ks]
+   (let [ret (.disjoin set key)]
+     (if ks
+       (recur ret (first ks) (next ks))
+       ret))))
+
+(defn pop!
+  "Removes the last item from a transient vector. If
+  the collection is empty, throws an exception. Returns coll"
+  {:added "1.1"}
+  [coll] (.pop coll))
+
 (defmacro doto
   "Evaluates x then calls all of the methods and functions with the
   value of x supplied at the front of the given arguments.  The forms
@@ -2292,7 +2451,40 @@
   "Returns a set of the distinct elements of coll."
   {:added "1.0"
    :static true}
-  [coll] (clojure.lang.persistenthashset/create (seq coll)))
+  [coll] (persistent! (reduce1 conj! (transient #{}) coll)))
+
+(defn hash-set
+  "Returns a new hash set with supplied keys."
+  {:added "1.0"
+   :static true}
+  ([] #{})
+  ([& keys]
+   (clojure.lang.persistenthashset/fromList keys)))
+
+(defn into
+  "Returns a new coll consisting of to-coll with all of the items of
+  from-coll conjoined."
+  {:added "1.0"
+   :static true}
+  [to from]
+  (if (instance? clojure.lang.ieditablecollection/IEditableCollection to)
+    (with-meta (persistent! (reduce1 conj! (transient to) from)) (meta to))
+    (reduce1 conj to from)))
+
+(defn distinct
+  "Returns a lazy sequence of the elements of coll with duplicates removed"
+  {:added "1.0"
+   :static true}
+  [coll]
+  (let [step (fn step [xs seen]
+               (lazy-seq
+                (loop [s (seq xs)]
+                  (when s
+                    (let [f (first s)]
+                      (if (contains? seen f)
+                        (recur (next s))
+                        (cons f (step (rest s) (conj seen f)))))))))]
+    (step coll #{})))
 
 (defn find-ns
   "Returns the namespace named by the symbol or nil if it doesn't exist."
@@ -2534,7 +2726,7 @@
   {:added "1.0"
    :static true}
   [ns]
-  (clojure.lang.rt/map (.-__dict__ (the-ns ns))))
+  (clojure.lang.rt/map (clojure.lang.namespace/mappings (the-ns ns))))
 
 (defn ns-publics
   "Returns a map of the public intern mappings for the namespace."
@@ -2809,14 +3001,24 @@
           
 
 (defn load-lib
-  "Loads a lib with options"
+  "Loads a lib with options. :reload loads it again if it was already
+  loaded, compiling only what changed, along with the loaded libs that
+  depend on what changed. :reload-all also reloads the libs it uses
+  whose source changed."
   [to-ns lib & options]
-  (let [opts (apply hash-map options)
-        {:keys [as reload reload-all require use verbose]} opts
-        loaded (contains? sys/modules lib)
+  (let [flags (set (filter #{:reload :reload-all :verbose} options))
+        options (seq (remove flags options))
+        opts (apply hash-map options)
+        {:keys [as require use]} opts
+        loaded (contains? sys/modules (name lib))
         need-ns (or as use)
         filter-opts (select-keys opts '(:exclude :only :rename))]
        (load-all lib)
+       (when loaded
+         (cond (contains? flags :reload-all)
+                (clojure.lang.reload/reloadLib (name lib) true)
+               (contains? flags :reload)
+                (clojure.lang.reload/reloadLib (name lib))))
        (cond (not options)
               (py/setattr (the-ns (name to-ns)) 
                           (name lib) 
@@ -0,0 +1,51 @@
+(ns clojure.edn)
+
+(import '(clojure.lang.ednreader EdnReader readString readForms readFile))
+
+(defn read-string
+  "Reads one object from the string s. Returns nil when s is nil.
+
+  opts is a map that can include:
+
+  :eof - value to return at the end of input, if not supplied the end of
+  input throws
+  :readers - map of tag symbols to the fns that read the values of tagged
+  literals, used before the default #inst and #uuid readers
+  :default - fn of the tag and the value, called for tags without a reader"
+  ([s] (read-string {:eof nil} s))
+  ([opts s]
+     (when s
+       (readString s (not (contains? opts :eof)) (:eof opts)
+                   (:readers opts) (:default opts)))))
+
+(defn read
+  "Reads the next object from rdr, a reader like
+  clojure.lang.fileseq/StringReader or the one returned by
+  clojure.lang.fileseq/fileReader. See read-string for opts."
+  ([rdr] (read {} rdr))
+  ([opts rdr]
+     (.read (EdnReader (:readers opts) (:default opts))
+            rdr (not (contains? opts :eof)) (:eof opts))))
+
+(def ^{:private true} done (py/object))
+
+(defn ^{:private true} generator-seq [gen]
+  (lazy-seq
+   (let [x (py/next gen done)]
+     (when-not (identical? x done)
+       (cons x (generator-seq gen))))))
+
+(defn read-seq
+  "Lazy seq of the objects read from rdr, one top level form at a time. See
+  read-string for opts, :eof is ignored."
+  ([rdr] (read-seq {} rdr))
+  ([opts rdr]
+     (generator-seq (readForms rdr (:readers opts) (:default opts)))))
+
+(defn read-file-seq
+  "Lazy seq of the objects in the file named filename. The file is read as
+  the seq is walked, it is never loaded into memory whole. See read-string
+  for opts, :eof is ignored."
+  ([filename] (read-file-seq {} filename))
+  ([opts filename]
+     (generator-seq (readFile filename (:readers opts) (:default opts)))))
@@ -12,6 +12,13 @@ class AMapEntry(APersistentVector):
         else:
             raise IndexOutOfBoundsException()
 
+    def nth(self, i, notFound=None):
+        if i == 0:
+            return self.getKey()
+        elif i == 1:
+            return self.getValue()
+        return notFound
+
     def asVector(self):
         return createVector(self.getKey(), self.getValue())
 
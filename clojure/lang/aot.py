@@ -0,0 +1,187 @@
+"""Ahead of time compilation of a tree of .clj files
+
+The ns, require and use forms of every file are read to find the files it
+loads, then the files are compiled to their code cache files by a pool of
+processes, each one once the files it loads are done. This is
+clojurepy --aot <dir>.
+"""
+
+import multiprocessing
+import os
+import Queue
+import sys
+import time
+import traceback
+from collections import OrderedDict
+
+from clojure.lang.cljkeyword import Keyword
+from clojure.lang.fileseq import StringReader
+from clojure.lang.ipersistentvector import IPersistentVector
+from clojure.lang.iseq import ISeq
+from clojure.lang.lispreader import read
+from clojure.lang.symbol import Symbol, symbol
+import clojure.lang.codecache as codecache
+
+
+def _libNames(spec, prefix=None):
+    """ The namespaces named by a lib spec of require or use: a symbol, a
+        vector starting with one, or a prefix list """
+    if isinstance(spec, Symbol):
+        name = str(spec)
+        return [prefix + "." + name if prefix else name]
+    if isinstance(spec, IPersistentVector):
+        return _libNames(spec.nth(0), prefix) if len(spec) else []
+    if isinstance(spec, ISeq):
+        if spec.first() == _QUOTE:
+            return _libNames(spec.next().first(), prefix)
+        head = _libNames(spec.first(), prefix)
+        if not head:
+            return []
+        names = []
+        for x in (spec.next() or []):
+            names.extend(_libNames(x, head[0]))
+        return names
+    return []
+
+_QUOTE = symbol("quote")
+_LOADS = set(["require", "use", "clojure.core/require", "clojure.core/use"])
+_NS_LOADS = set(["require", "use"])
+
+def namespaceDeps(filename):
+    """ Returns the namespace filename declares, or None, and the namespaces
+        its ns, require and use forms load. Forms are only read, the file
+        isn't compiled; reading stops at the first form the reader can't
+        handle without compiling what comes before. """
+    with open(filename) as fl:
+        r = StringReader(fl.read())
+    name, deps = None, []
+    while True:
+        try:
+            form = read(r, False, None, True)
+        except Exception:
+            break
+        if form is None:
+            break
+        if not isinstance(form, ISeq) or not isinstance(form.first(), Symbol):
+            continue
+        head = str(form.first())
+        if head in ("ns", "clojure.core/ns") and name is None:
+            name = str(form.next().first())
+            for clause in (form.next().next() or []):
+                if isinstance(clause, ISeq) and \
+                   isinstance(clause.first(), Keyword) and \
+                   clause.first().getName() in _NS_LOADS:
+                    for spec in (clause.next() or []):
+                        deps.extend(_libNames(spec))
+        elif head in _LOADS:
+            for spec in (form.next() or []):
+                deps.extend(_libNames(spec))
+    return name, deps
+
+def namespaceGraph(root):
+    """ Maps every .clj file under root to the set of files under root it
+        loads """
+    files = []
+    for path, dirs, names in os.walk(root):
+        dirs.sort()
+        files.extend(os.path.join(path, x) for x in sorted(names)
+                     if x.endswith(".clj"))
+    declared, loads = {}, {}
+    for filename in files:
+        name, deps = namespaceDeps(filename)
+        if name is not None:
+            declared[name] = filename
+        loads[filename] = deps
+    return OrderedDict((f, set(declared[x] for x in loads[f]
+                               if x in declared and declared[x] != f))
+                       for f in files)
+
+def _aotInit(root):
+    sys.path.insert(0, root)
+
+def _aotCompileFile(filename):
+    """ Runs in a worker of aotCompile. The files filename loads are already
+        cached, so loading them here doesn't compile them again. """
+    from clojure.lang.compiler import compilerOptions
+    from clojure.main import VERSION, requireClj
+    try:
+        with open(filename) as fl:
+            key = codecache.cacheKey(fl.read(), VERSION, compilerOptions())
+        if not codecache.CacheReader(filename, key).isValid():
+            if not requireClj(filename, forcecompile=True):
+                return filename, "could not write the cache file"
+    except BaseException:
+        # a worker that dies (sys.exit for instance) never reports back
+        return filename, traceback.format_exc()
+    return filename, None
+
+def aotCompile(root, processes=None, timeout=600):
+    """ Compiles every .clj file under root to its code cache file.
+        Files are compiled by a pool of processes (one per CPU by default),
+        each one as soon as all the files it loads are done, so namespaces
+        that don't depend on each other are compiled in parallel. Files
+        whose cache is up to date are skipped. A file that isn't done
+        timeout seconds after it was handed to the pool fails. Returns a
+        dict of filename -> error for the files that could not be compiled.
+    """
+    graph = namespaceGraph(root)
+    pending = dict((f, set(deps)) for f, deps in graph.items())
+    failed = {}
+    results = Queue.Queue()
+    pool = multiprocessing.Pool(processes, _aotInit, (root,))
+    # filename -> when it was handed to the pool
+    running = {}
+    timedout = False
+    try:
+        while True:
+            ready = [f for f in graph if f in pending and not pending[f]]
+            for f in ready:
+                del pending[f]
+                pool.apply_async(_aotCompileFile, (f,),
+                                 callback=results.put)
+                running[f] = time.time()
+            if not running:
+                break
+            wait = min(running.values()) + timeout - time.time()
+            try:
+                filename, error = results.get(timeout=max(wait, 0))
+            except Queue.Empty:
+                now = time.time()
+                late = [f for f, t in running.items() if now - t >= timeout]
+                timedout = timedout or bool(late)
+                done = [(f, "timed out after %d seconds" % timeout)
+                        for f in late]
+            else:
+                done = [(filename, error)] if filename in running else []
+            for filename, error in done:
+                del running[filename]
+                if error is not None:
+                    failed[filename] = error
+                    for f in _dependents(graph, filename):
+                        if f in pending:
+                            del pending[f]
+                            failed[f] = "depends on " + filename
+                for deps in pending.values():
+                    deps.discard(filename)
+    finally:
+        if timedout:
+            # the workers of the files that timed out are still busy
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    for f in pending:
+        failed[f] = "circular dependency"
+    return failed
+
+def _dependents(graph, filename):
+    """ The files that load filename, directly or not """
+    found = set()
+    pending = [filename]
+    while pending:
+        x = pending.pop()
+        for f, deps in graph.items():
+            if x in deps and f not in found:
+                found.add(f)
+                pending.append(f)
+    return found
@@ -1,13 +1,19 @@
 from clojure.lang.ipersistentmap import IPersistentMap
+from clojure.lang.ihasheq import IHashEq
 from clojure.lang.ipersistentvector import IPersistentVector
 from clojure.lang.mapentry import MapEntry
 from clojure.lang.cljexceptions import (ArityException,
                                            InvalidArgumentException)
 from clojure.lang.aseq import ASeq
 from clojure.lang.iprintable import IPrintable
+from clojure.lang.printer import reprString, writeMap
+from clojure.lang.util import unhashedState
 
 
-class APersistentMap(IPersistentMap, IPrintable):
+class APersistentMap(IPersistentMap, IHashEq, IPrintable):
+    # the hash of the entries, worked out the first time it is asked for
+    _hash = -1
+
     def cons(self, o):
         if isinstance(o, MapEntry):
             return self.assoc(o.getKey(), o.getValue())
@@ -25,12 +31,23 @@ class APersistentMap(IPersistentMap, IPrintable):
         return ret
 
     def toDict(self):
+        return dict(self.items())
+
+    def items(self):
+        """ An iterator of (key, value) for each entry """
         s = self.seq()
-        d = {}
         while s is not None:
-            d[s.first().getKey()] = s.first().getValue()
+            e = s.first()
+            yield e.getKey(), e.getValue()
             s = s.next()
-        return d
+
+    def keys(self):
+        for k, v in self.items():
+            yield k
+
+    def vals(self):
+        for k, v in self.items():
+            yield v
 
     def __eq__(self, other):
         return mapEquals(self, other)
@@ -44,13 +61,19 @@ class APersistentMap(IPersistentMap, IPrintable):
     def __iter__(self):
         s = self.seq()
         while s is not None:
-            if s.first() is None:
-                pass
             yield s.first().getKey()
             s = s.next()
 
-#    def __hash__(self):
-#        return mapHash(self)
+    def __hash__(self):
+        if self._hash == -1:
+            self._hash = mapHash(self)
+        return self._hash
+
+    def hasheq(self):
+        return hash(self)
+
+    def __getstate__(self):
+        return unhashedState(self)
 
     def __call__(self, *args, **kwargs):
         return apply(self.valAt, args)
@@ -59,38 +82,41 @@ class APersistentMap(IPersistentMap, IPrintable):
         return self.containsKey(item)
 
     def writeAsString(self, writer):
-        writer.write(repr(self))
+        writeMap(self, writer, False)
 
     def writeAsReplString(self, writer):
-        writer.write(repr(self))
+        writeMap(self, writer, True)
+
+    def __repr__(self):
+        return reprString(self)
 
 
 def mapEquals(m1, m2):
     if m1 is m2:
         return True
-    if not hasattr(m2, "__getitem__"):
-        return False
-    if not hasattr(m2, "__len__"):
+    if not isinstance(m2, (IPersistentMap, dict)):
         return False
-    if not hasattr(m2, "__iter__"):
+    if (m1._hash != -1
+            and getattr(m2, "_hash", -1) not in (-1, m1._hash)):
         return False
 
     if len(m1) != len(m2):
         return False
 
-    for s in m1:
-        if s not in m2 or m2[s] != m1[s]:
+    for key, val in m1.items():
+        if key not in m2 or m2[key] != val:
             return False
     return True
 
 
 def mapHash(m):
-    return reduce(lambda h, v: h + (0 if v.getKey() is None
-                                      else hash(v.getKey()))
-                                 ^ (0 if v.getValue() is None
-                                      else hash(v.getValue())),
-                  m.interator(),
-                  0)
+    """ The sum of hash(key) ^ hash(value) for each entry, nil hashes to 0,
+        kept to 32 bits """
+    h = 0
+    for key, val in m.items():
+        h += (0 if key is None else hash(key)) ^ (0 if val is None
+                                                  else hash(val))
+    return h & 0xFFFFFFFF
 
 
 class KeySeq(ASeq):
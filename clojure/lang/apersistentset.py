@@ -1,11 +1,14 @@
 from clojure.lang.ifn import IFn
 from clojure.lang.cljexceptions import AbstractMethodCall, ArityException
 from clojure.lang.ipersistentset import IPersistentSet
+from clojure.lang.ihasheq import IHashEq
 from clojure.lang.apersistentmap import createKeySeq
 import clojure.lang.rt as RT
 from clojure.lang.iprintable import IPrintable
+from clojure.lang.printer import reprString, seqItems, writeColl
+from clojure.lang.util import hashUnordered, unhashedState
 
-class APersistentSet(IPersistentSet, IFn, IPrintable):
+class APersistentSet(IPersistentSet, IFn, IHashEq, IPrintable):
     def __init__(self, impl):
         self.impl = impl
         self._hash = -1
@@ -19,6 +22,9 @@ class APersistentSet(IPersistentSet, IFn, IPrintable):
     def __len__(self):
         return len(self.impl)
 
+    def __iter__(self):
+        return iter(self.impl)
+
     def seq(self):
         return createKeySeq(self.impl.seq())
 
@@ -34,6 +40,13 @@ class APersistentSet(IPersistentSet, IFn, IPrintable):
         if not isinstance(other, IPersistentSet):
             return False
 
+        if len(self) != len(other):
+            return False
+
+        if (self._hash != -1
+                and getattr(other, "_hash", -1) not in (-1, self._hash)):
+            return False
+
         for s in self.impl:
             if s not in other or not other[s] == self[s]:
                 return False
@@ -44,17 +57,20 @@ class APersistentSet(IPersistentSet, IFn, IPrintable):
 
     def __hash__(self):
         if self._hash == -1:
-            hsh = 0
-            s = self.seq()
-            while s is not None:
-                e = s.first()
-                hsh += hash(e)
-                s = s.next()
-            self._hash = hsh
+            self._hash = hashUnordered(self)
         return self._hash
 
+    def hasheq(self):
+        return hash(self)
+
+    def __getstate__(self):
+        return unhashedState(self)
+
     def writeAsString(self, writer):
-        writer.write(repr(self))
+        writeColl(seqItems(self.seq()), writer, "#{", "}", False)
 
     def writeAsReplString(self, writer):
-        writer.write(repr(self))
+        writeColl(seqItems(self.seq()), writer, "#{", "}", True)
+
+    def __repr__(self):
+        return reprString(self)
@@ -1,12 +1,19 @@
 from clojure.lang.ipersistentvector import IPersistentVector
+from clojure.lang.ihasheq import IHashEq
+from clojure.lang.sequential import Sequential
 from clojure.lang.cljexceptions import AbstractMethodCall, ArityException
 from clojure.lang.indexableseq import IndexableSeq
 import clojure.lang.rt as RT
 from clojure.lang.iprintable import IPrintable
+from clojure.lang.printer import reprString, writeColl
+from clojure.lang.util import hashOrdered, unhashedState
+
+class APersistentVector(IPersistentVector, IHashEq, IPrintable):
+    # the hash of the items, worked out the first time it is asked for
+    _hash = -1
 
-class APersistentVector(IPersistentVector, IPrintable):
     def __iter__(self):
-        for x in range(len(self)):
+        for x in xrange(len(self)):
             yield self.nth(x)
 
     def peek(self):
@@ -23,6 +30,11 @@ class APersistentVector(IPersistentVector, IPrintable):
         return IndexableSeq(self, 0)
         
     def __eq__(self, other):
+        if self is other:
+            return True
+        if (self._hash != -1 and isinstance(other, Sequential)
+                and getattr(other, "_hash", -1) not in (-1, self._hash)):
+            return False
         s = self.seq()
         if not RT.isSeqable(other):
             return False
@@ -32,11 +44,25 @@ class APersistentVector(IPersistentVector, IPrintable):
     def __ne__(self, other):
         return not self == other
 
+    def __hash__(self):
+        if self._hash == -1:
+            self._hash = hashOrdered(self)
+        return self._hash
+
+    def hasheq(self):
+        return hash(self)
+
+    def __getstate__(self):
+        return unhashedState(self)
+
     def writeAsString(self, writer):
-        writer.write(repr(self))
+        writeColl(self, writer, "[", "]", False)
 
     def writeAsReplString(self, writer):
-        writer.write(repr(self))
+        writeColl(self, writer, "[", "]", True)
+
+    def __repr__(self):
+        return reprString(self)
 
 
 class SubVec(APersistentVector):
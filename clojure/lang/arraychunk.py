@@ -0,0 +1,38 @@
+from clojure.lang.ichunk import IChunk
+from clojure.lang.cljexceptions import IllegalStateException
+
+class ArrayChunk(IChunk):
+    """ The items of array from off up to end, end defaults to the end of
+        array. The array is shared, not copied. """
+    def __init__(self, array, off=0, end=None):
+        self.array = array
+        self.off = off
+        self.end = len(array) if end is None else end
+
+    def __getitem__(self, i):
+        return self.array[self.off + i]
+
+    def nth(self, i, notFound=None):
+        if 0 <= i < self.end - self.off:
+            return self.array[self.off + i]
+        return notFound
+
+    def __len__(self):
+        return self.end - self.off
+
+    def __iter__(self):
+        array = self.array
+        for x in xrange(self.off, self.end):
+            yield array[x]
+
+    def dropFirst(self):
+        if self.off == self.end:
+            raise IllegalStateException("dropFirst of empty chunk")
+        return ArrayChunk(self.array, self.off + 1, self.end)
+
+    def reduce(self, f, start):
+        ret = start
+        array = self.array
+        for x in xrange(self.off, self.end):
+            ret = f(ret, array[x])
+        return ret
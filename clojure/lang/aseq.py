@@ -7,12 +7,20 @@ from clojure.lang.ihasheq import IHashEq
 from clojure.lang.iterable import Iterable
 import clojure.lang.rt as RT
 from clojure.lang.iprintable import IPrintable
+from clojure.lang.printer import reprString, seqItems, writeColl
+from clojure.lang.util import hashOrdered, unhashedState
 
 
 class ASeq(Obj, Sequential, ISeq, IHashEq, Iterable, IPrintable):
+    # the hash of the items, worked out the first time it is asked for
+    _hash = -1
+
     def __eq__(self, other):
         if self is other:
             return True
+        if (self._hash != -1 and isinstance(other, Sequential)
+                and getattr(other, "_hash", -1) not in (-1, self._hash)):
+            return False
         if not RT.isSeqable(other):
             return False
         se = RT.seq(other)
@@ -67,17 +75,25 @@ class ASeq(Obj, Sequential, ISeq, IHashEq, Iterable, IPrintable):
             yield s.first()
             s = s.next()
 
+    def __hash__(self):
+        if self._hash == -1:
+            self._hash = hashOrdered(self)
+        return self._hash
+
     def hasheq(self):
-        hash = 1
-        for s in self:
-            hash = 31 * hash + Util.hasheq(s.first())#FIXME: Util is... where?
-        return hash
+        return hash(self)
+
+    def __getstate__(self):
+        return unhashedState(self)
 
     def writeAsString(self, writer):
-        writer.write(repr(self))
+        writeColl(seqItems(self.seq()), writer, "(", ")", False)
 
     def writeAsReplString(self, writer):
-        writer.write(repr(self))
+        writeColl(seqItems(self.seq()), writer, "(", ")", True)
+
+    def __repr__(self):
+        return reprString(self)
         
     def cons(self, other):
         from clojure.lang.cons import Cons
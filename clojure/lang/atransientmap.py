@@ -1,9 +1,12 @@
 from clojure.lang.ifn import IFn
 from clojure.lang.cljexceptions import AbstractMethodCall
 from clojure.lang.itransientmap import ITransientMap
-import clojure.lang.rt as RT
+from clojure.lang.util import conjToAssoc
 from clojure.lang.iprintable import IPrintable
 
+# returned by valAt for keys that aren't there
+_NOT_FOUND = object()
+
 class ATransientMap(IFn, ITransientMap, IPrintable):
     def ensureEditable(self):
         raise AbstractMethodCall(self)
@@ -25,14 +28,14 @@ class ATransientMap(IFn, ITransientMap, IPrintable):
 
     def conj(self, val):
         self.ensureEditable()
-        return RT.conjToAssoc(self, val)
+        return conjToAssoc(self, val)
 
     def __call__(self, *args):
         return apply(self.valAt, args)
 
     def without(self, key):
         self.ensureEditable()
-        return self.doWithout()
+        return self.doWithout(key)
 
     def valAt(self, key, notFound = None):
         self.ensureEditable()
@@ -42,13 +45,19 @@ class ATransientMap(IFn, ITransientMap, IPrintable):
         self.ensureEditable()
         return self.doAssoc(key, value)
 
+    def __contains__(self, key):
+        return self.valAt(key, _NOT_FOUND) is not _NOT_FOUND
+
     def count(self):
         self.ensureEditable()
+        return self.doCount()
+
+    def __len__(self):
         return self.count()
 
     def persistent(self):
         self.ensureEditable()
-        return self.persistent()
+        return self.doPersistent()
 
     def writeAsString(self, writer):
         writer.write(repr(self))
@@ -0,0 +1,39 @@
+from clojure.lang.ifn import IFn
+from clojure.lang.cljexceptions import AbstractMethodCall, ArityException
+from clojure.lang.itransientset import ITransientSet
+
+class ATransientSet(IFn, ITransientSet):
+    """ A set kept in impl, a transient map from each item to itself. The
+        map checks the owner on every call. """
+    def __init__(self, impl):
+        self.impl = impl
+
+    def count(self):
+        return self.impl.count()
+
+    def __len__(self):
+        return self.impl.count()
+
+    def conj(self, val):
+        self.impl = self.impl.assoc(val, val)
+        return self
+
+    def disjoin(self, key):
+        self.impl = self.impl.without(key)
+        return self
+
+    def __contains__(self, key):
+        return key in self.impl
+
+    def get(self, key):
+        return self.impl.valAt(key)
+
+    def __call__(self, *args):
+        if len(args) == 1:
+            return self.impl.valAt(args[0])
+        if len(args) == 2:
+            return self.impl.valAt(args[0], args[1])
+        raise ArityException()
+
+    def persistent(self):
+        raise AbstractMethodCall(self)
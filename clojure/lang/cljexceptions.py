@@ -49,10 +49,10 @@ class ReaderException(Exception):
 
 class CompilerException(Exception):
     def __init__(self, reason, form):
-        from lispreader import LINE_KEY
-        if hasattr(form, "meta") and form.meta() is not None:
+        from lispreader import lineOf
+        if lineOf(form) is not None:
             msg = ("Compiler Exception " + reason + " at "
-                   + str(form.meta()[LINE_KEY]))
+                   + str(lineOf(form)))
         else:
             msg = "Compiler Exception " + reason
         Exception.__init__(self, msg)
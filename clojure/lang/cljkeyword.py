@@ -1,13 +1,16 @@
+from threading import Lock
+from weakref import WeakValueDictionary
+
 from clojure.lang.symbol import Symbol, symbol
-from clojure.lang.persistenthashmap import EMPTY as EMPTY_MAP
-from clojure.lang.atomicreference import AtomicReference
 from clojure.lang.cljexceptions import InvalidArgumentException, ArityException
 from clojure.lang.iprintable import IPrintable
-import weakref
 from clojure.lang.ifn import IFn
 from clojure.lang.named import Named
 
-interned = AtomicReference(EMPTY_MAP)
+# keywords by symbol, while something still holds them. There is only ever
+# one keyword of a name alive, so they compare by identity.
+interned = WeakValueDictionary()
+internLock = Lock()
 
 class Keyword(IFn, Named, IPrintable):
     def getNamespace(self):
@@ -46,11 +49,15 @@ def keyword(*args):
             sym = args[0]
             if sym.meta() is not None:
                 sym = sym.withMeta(None)
-            k = Keyword(sym)
-
-            interned.mutate(lambda old: old if sym in old else old.assoc(sym,k))
-
-            return interned.get()[sym]
+            k = interned.get(sym)
+            if k is not None:
+                return k
+            with internLock:
+                k = interned.get(sym)
+                if k is None:
+                    k = Keyword(sym)
+                    interned[sym] = k
+                return k
         elif isinstance(args[0], (str, unicode)):
             return keyword(symbol(args[0]))
         else:
@@ -60,14 +67,15 @@ def keyword(*args):
     else:
         raise ArityException()
 
-def find(self, *args):
+def find(*args):
+    """ The keyword of that name if there is one, without creating it """
     if len(args) == 1:
         if isinstance(args[0], Symbol):
-            return interned.val()[args[0]]()
-        if isinstance(args[0], str):
-            return Keyword.find(symbol(args[0]))
+            return interned.get(args[0].withMeta(None))
+        if isinstance(args[0], (str, unicode)):
+            return find(symbol(args[0]))
     if len(args) == 2:
-        return Keyword.find(symbol(*args))
+        return find(symbol(*args))
     raise ArityException()
 
 
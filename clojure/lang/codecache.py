@@ -0,0 +1,466 @@
+"""On-disk cache of compiled .clj files
+
+Every top level form of a file is compiled to its own code object. The
+cache keeps those code objects in the order they were compiled so a later
+load can execute them without reading or compiling the source again.
+
+Code objects are marshalled; the constants marshal can't handle (vars,
+namespaces, keywords, functions, ...) are written with cPickle and resolved
+by reference when the cache is read back. A cache file is only used as a whole when
+the source hash, the compiler version and the Python version all match the
+ones it was written with.
+
+After the forms comes an index with the hash of the source of every form
+and the vars it depended on while it was compiled. When only the source
+changed, the forms whose source and dependencies are unchanged are taken
+from the cache and the rest is compiled, see main.requireClj.
+"""
+
+import cPickle
+import hashlib
+import imp
+import marshal
+import new
+import os
+import struct
+import sys
+import types
+
+from clojure.lang.cljkeyword import Keyword, keyword
+from clojure.lang.persistenthashmap import (PersistentHashMap,
+                                             EMPTY as EMPTY_MAP)
+from clojure.lang.symbol import symbol
+from clojure.lang.var import Var, linkFunction, relinkCode
+import clojure.lang.namespace as namespace
+
+# bump this whenever the compiler output changes in a way that would make
+# old cache files invalid
+CACHE_VERSION = 12
+
+CACHE_SUFFIX = "c"
+
+# placeholder for constants that are stored next to a marshalled code object
+_EXTERNAL = "\0clojure-py external"
+
+_MARSHALLABLE = (type(None), bool, int, long, float, complex, str, unicode)
+
+
+class Unserializable(Exception):
+    pass
+
+
+def cacheFileFor(filename):
+    return filename + CACHE_SUFFIX
+
+
+def cacheKey(source, compilerVersion, options=()):
+    """ Builds the key a cache file must match to be used for source """
+    return (CACHE_VERSION,
+            compilerVersion,
+            imp.get_magic(),
+            tuple(options),
+            hashlib.sha1(source).hexdigest())
+
+
+# the index is found through its offset, written in the last bytes of the file
+_TRAILER = struct.Struct("<Q")
+
+
+def formHash(text):
+    """ Hash of the source of a top level form """
+    return hashlib.sha1(text).hexdigest()
+
+
+def isCompatible(key, other):
+    """ True if code compiled under the cache key other can be used under
+        key, as long as the source of the form is the same """
+    return key[:-1] == other[:-1]
+
+
+class IndexEntry(object):
+    """ What the cache knows about a compiled top level form. deps are the
+        names ("ns/name") of the vars whose meta or value the compiler used
+        (macros, inlines, tags), refs the names of all the globals the form
+        refers to. """
+    __slots__ = ["hash", "line", "deps", "refs"]
+
+    def __init__(self, hash, line, deps, refs):
+        self.hash = hash
+        self.line = line
+        self.deps = deps
+        self.refs = refs
+
+    def __getstate__(self):
+        return (self.hash, self.line, self.deps, self.refs)
+
+    def __setstate__(self, state):
+        self.hash, self.line, self.deps, self.refs = state
+
+
+def shiftLines(code, delta, seen=None):
+    """ Returns code with every line number moved by delta, for forms taken
+        from the cache after the lines above them changed. Functions in the
+        constants are updated in place. """
+    if delta == 0:
+        return code
+    if seen is None:
+        seen = set()
+    consts = []
+    for c in code.co_consts:
+        if type(c) is types.CodeType:
+            c = shiftLines(c, delta, seen)
+        elif type(c) is types.FunctionType and id(c) not in seen:
+            seen.add(id(c))
+            c.func_code = shiftLines(c.func_code, delta, seen)
+        consts.append(c)
+    return new.code(code.co_argcount, code.co_nlocals, code.co_stacksize,
+                    code.co_flags, code.co_code, tuple(consts),
+                    code.co_names, code.co_varnames, code.co_filename,
+                    code.co_name, code.co_firstlineno + delta,
+                    code.co_lnotab, code.co_freevars, code.co_cellvars)
+
+
+def _isMarshallable(obj):
+    tp = type(obj)
+    if tp in _MARSHALLABLE:
+        return True
+    if tp is tuple or tp is frozenset:
+        for x in obj:
+            if not _isMarshallable(x):
+                return False
+        return True
+    return False
+
+
+def _stripCode(co):
+    """ Splits a code object into a marshalled string and a tuple of the
+        constants marshal can't write """
+    consts = []
+    externals = []
+    for c in co.co_consts:
+        if _isMarshallable(c):
+            consts.append(c)
+        else:
+            consts.append((_EXTERNAL, len(externals)))
+            externals.append(c)
+    stripped = new.code(co.co_argcount, co.co_nlocals, co.co_stacksize,
+                        co.co_flags, co.co_code, tuple(consts), co.co_names,
+                        co.co_varnames, co.co_filename, co.co_name,
+                        co.co_firstlineno, co.co_lnotab, co.co_freevars,
+                        co.co_cellvars)
+    return marshal.dumps(stripped), tuple(externals)
+
+
+def _rebuildCode(data, externals):
+    co = marshal.loads(data)
+    if not externals:
+        return co
+    consts = []
+    for c in co.co_consts:
+        if type(c) is tuple and len(c) == 2 and c[0] == _EXTERNAL:
+            c = externals[c[1]]
+        consts.append(c)
+    return new.code(co.co_argcount, co.co_nlocals, co.co_stacksize,
+                    co.co_flags, co.co_code, tuple(consts), co.co_names,
+                    co.co_varnames, co.co_filename, co.co_name,
+                    co.co_firstlineno, co.co_lnotab, co.co_freevars,
+                    co.co_cellvars)
+
+
+def _unlinkCode(co, links):
+    """ Clears the constant slots of the directly linked roots of co """
+    if not links:
+        return co
+    consts = list(co.co_consts)
+    for v, slot, argc in links:
+        consts[slot] = None
+    return new.code(co.co_argcount, co.co_nlocals, co.co_stacksize,
+                    co.co_flags, co.co_code, tuple(consts), co.co_names,
+                    co.co_varnames, co.co_filename, co.co_name,
+                    co.co_firstlineno, co.co_lnotab, co.co_freevars,
+                    co.co_cellvars)
+
+
+def _singletons():
+    """ Objects whose identity matters and that therefore have to be written
+        as a reference instead of by value """
+    import clojure.lang.persistentlist as persistentlist
+    import clojure.lang.persistentvector as persistentvector
+    import clojure.lang.persistenthashmap as persistenthashmap
+    import clojure.lang.persistenthashset as persistenthashset
+    import clojure.lang.persistentarraymap as persistentarraymap
+    singletons = {}
+    for mod, names in [(persistentlist, ["EMPTY"]),
+                       (persistentvector, ["EMPTY", "EMPTY_NODE", "NOEDIT"]),
+                       (persistenthashmap, ["EMPTY", "NOT_FOUND",
+                                            "EMPTY_BITMAP_NODE"]),
+                       (persistenthashset, ["EMPTY"]),
+                       (persistentarraymap, ["EMPTY"])]:
+        for name in names:
+            if hasattr(mod, name):
+                singletons[id(getattr(mod, name))] = (mod.__name__, name)
+    return singletons
+
+
+def _lookupGlobal(obj):
+    """ Finds a reference for obj based on its __module__ and __name__,
+        returns None if obj isn't reachable that way """
+    modname = getattr(obj, "__module__", None)
+    name = getattr(obj, "__name__", None)
+    if not isinstance(modname, str) or not isinstance(name, str):
+        return None
+    mod = sys.modules.get(modname)
+    if mod is None:
+        return None
+    val = getattr(mod, name, None)
+    if val is obj:
+        return ("global", modname, name)
+    if isinstance(val, Var) and val.root is obj:
+        return ("varroot", val)
+    return None
+
+
+def _nativeGlobal(pid):
+    """ pickle writes module level globals itself, and unlike persistent ids
+        it memoizes them """
+    if pid[0] == "global":
+        return None
+    return pid
+
+
+class CacheWriter(object):
+    """ Collects the compiled forms of a file. Nothing is written until
+        commit() is called, and nothing at all if any of the forms could not
+        be serialized. """
+    def __init__(self, filename, key):
+        self.filename = cacheFileFor(filename)
+        self.tmpname = "%s.%d.tmp" % (self.filename, os.getpid())
+        self.failed = False
+        self.pids = {}
+        self.singletons = _singletons()
+        self.index = []
+        try:
+            self.file = open(self.tmpname, "wb")
+            self.pickler = cPickle.Pickler(self.file, 2)
+            self.pickler.persistent_id = self.persistentId
+            self.pickler.dump(key)
+        except (IOError, OSError):
+            self.file = None
+            self.failed = True
+
+    def add(self, ns, defs, code, entry):
+        """ Adds a form that was compiled in namespace ns. defs are the vars
+            the form defined at compile time, their meta and dynamic flag
+            is restored before code is run again. entry is the IndexEntry of
+            the form. """
+        if self.failed:
+            return
+        try:
+            self.pickler.dump((ns.__name__,
+                               tuple((v, v.isDynamic(), v.meta())
+                                     for v in defs),
+                               code))
+        except Exception:
+            self.abort()
+        self.index.append(entry)
+
+    def persistentId(self, obj):
+        tp = type(obj)
+        if tp in _MARSHALLABLE or tp is tuple:
+            return None
+        pid = self.pids.get(id(obj))
+        if pid is not None:
+            return pid[1]
+        pid = self.makeId(obj, tp)
+        if pid is not None and pid[0] != "varroot":
+            # keep obj alive so its id can't be reused, and always hand out
+            # the same tuple so the pickle memo shares it
+            self.pids[id(obj)] = (obj, pid)
+        return pid
+
+    def makeId(self, obj, tp):
+        if id(obj) in self.singletons:
+            return ("global",) + self.singletons[id(obj)]
+        if tp is types.CodeType:
+            data, externals = _stripCode(obj)
+            return ("code", data, externals)
+        if tp is Var:
+            if obj.ns is None:
+                raise Unserializable(obj)
+            return ("var", obj.ns.__name__, obj.sym.name)
+        if tp is Keyword:
+            return ("kw", obj.sym)
+        if tp is PersistentHashMap:
+            # the hash of a key isn't always the same from one process to
+            # the next (hash(None) for instance), so the trie is rebuilt
+            return ("map", obj._meta,
+                    tuple((k, obj.valAt(k)) for k in obj))
+        if issubclass(tp, types.ModuleType):
+            return ("module", obj.__name__)
+        if tp is types.FunctionType:
+            pid = _lookupGlobal(obj)
+            if pid is not None:
+                return _nativeGlobal(pid)
+            if obj.func_closure is not None:
+                raise Unserializable(obj)
+            modname = obj.func_globals.get("__name__")
+            if sys.modules.get(modname) is None or \
+               sys.modules[modname].__dict__ is not obj.func_globals:
+                raise Unserializable(obj)
+            # the slots of directly linked roots are filled from the vars
+            # again when the function is loaded
+            return ("fn", _unlinkCode(obj.func_code,
+                                      obj.func_dict.get("__linked__", ())),
+                    modname, obj.__name__,
+                    obj.func_defaults, dict(obj.func_dict))
+        if isinstance(obj, (type, types.ClassType, types.BuiltinFunctionType)):
+            pid = _lookupGlobal(obj)
+            if pid is None:
+                raise Unserializable(obj)
+            return _nativeGlobal(pid)
+        if tp is types.MethodType or tp is file:
+            raise Unserializable(obj)
+        return None
+
+    def commit(self):
+        if self.failed:
+            return False
+        try:
+            self.pickler.dump(None)
+            offset = self.file.tell()
+            cPickle.dump(self.index, self.file, 2)
+            self.file.write(_TRAILER.pack(offset))
+            self.file.close()
+            if os.name == "nt" and os.path.exists(self.filename):
+                os.remove(self.filename)
+            os.rename(self.tmpname, self.filename)
+        except (IOError, OSError):
+            self.abort()
+            return False
+        return True
+
+    def abort(self):
+        self.failed = True
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            try:
+                os.remove(self.tmpname)
+            except OSError:
+                pass
+
+
+class CacheReader(object):
+    """ Iterates over the (ns, defs, code) records of a cache file. Each
+        record is only read once it is requested, so references to vars and
+        functions are resolved after the forms before it have run. """
+    def __init__(self, filename, key):
+        self.file = None
+        self.resolved = {}
+        self.current = False
+        cachefile = cacheFileFor(filename)
+        try:
+            self.file = open(cachefile, "rb")
+            self.unpickler = cPickle.Unpickler(self.file)
+            self.unpickler.persistent_load = self.persistentLoad
+            cachedkey = self.unpickler.load()
+            self.current = cachedkey == key
+            if not isCompatible(key, cachedkey):
+                self.close()
+        except Exception:
+            self.close()
+
+    def isValid(self):
+        """ True if the whole file can be run from the cache """
+        return self.file is not None and self.current
+
+    def isCompatible(self):
+        """ True if forms whose source is unchanged can be taken from the
+            cache """
+        return self.file is not None
+
+    def readIndex(self):
+        """ Returns the IndexEntry of every form in the cache """
+        start = self.file.tell()
+        self.file.seek(-_TRAILER.size, 2)
+        offset, = _TRAILER.unpack(self.file.read(_TRAILER.size))
+        self.file.seek(offset)
+        index = cPickle.load(self.file)
+        self.file.seek(start)
+        return index
+
+    def next(self):
+        """ Reads the next form, returns (ns, defs, code) or None once all
+            forms have been read """
+        if self.file is None:
+            return None
+        record = self.unpickler.load()
+        if record is None:
+            self.close()
+            return None
+        nsname, defs, code = record
+        ns = namespace.findOrCreate(nsname)
+        for v, dynamic, meta in defs:
+            v.setDynamic(dynamic)
+            v.setMeta(meta)
+        return ns, [v for v, dynamic, meta in defs], code
+
+    def skip(self):
+        """ Reads past the next form without restoring the meta of the vars
+            it defined, they may have been defined again since """
+        if self.file is not None and self.unpickler.load() is None:
+            self.close()
+
+    def __iter__(self):
+        while True:
+            record = self.next()
+            if record is None:
+                return
+            yield record[0], record[2]
+
+    def persistentLoad(self, pid):
+        resolved = self.resolved.get(id(pid))
+        if resolved is not None:
+            return resolved[1]
+        kind = pid[0]
+        if kind == "varroot":
+            # the root may have been rebound since, so never memoize it
+            return pid[1].root
+        if kind == "code":
+            obj = _rebuildCode(pid[1], pid[2])
+        elif kind == "var":
+            obj = namespace.intern(namespace.findOrCreate(pid[1]),
+                                   symbol(pid[2]))
+        elif kind == "kw":
+            obj = keyword(pid[1])
+        elif kind == "map":
+            obj = EMPTY_MAP
+            for k, v in pid[2]:
+                obj = obj.assoc(k, v)
+            if pid[1] is not None:
+                obj = obj.withMeta(pid[1])
+        elif kind == "module":
+            obj = sys.modules.get(pid[1])
+            if obj is None:
+                obj = namespace.findOrCreate(pid[1])
+        elif kind == "global":
+            if pid[1] not in sys.modules:
+                __import__(pid[1])
+            obj = getattr(sys.modules[pid[1]], pid[2])
+        elif kind == "fn":
+            code, modname, name, defaults, attrs = pid[1:]
+            obj = new.function(code, namespace.findOrCreate(modname).__dict__,
+                               name, defaults)
+            obj.func_dict.update(attrs)
+            if attrs.get("__linked__"):
+                obj.func_code = relinkCode(code, attrs["__linked__"])
+                linkFunction(obj, attrs["__linked__"])
+        else:
+            raise cPickle.UnpicklingError("unknown reference " + repr(kind))
+        self.resolved[id(pid)] = (pid, obj)
+        return obj
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
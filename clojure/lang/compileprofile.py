@@ -0,0 +1,64 @@
+"""Time spent in each phase of loading a .clj file
+
+Set CLOJUREPY_COMPILE_PROFILE=1 to collect it, report() prints the totals.
+Phases nest (a macro runs while the form around it is compiled, and the
+fns it compiles are assembled in the middle of it), time is counted for
+the innermost phase only, so the totals add up to the time spent loading.
+
+    with compileprofile.MACROEXPAND:
+        ...
+"""
+
+import os
+import sys
+import time
+
+enabled = os.environ.get("CLOJUREPY_COMPILE_PROFILE", "0") != "0"
+
+# phase name -> seconds
+totals = {}
+
+# [phase, time it was last entered or resumed]
+_stack = []
+
+_clock = time.clock if sys.platform == "win32" else time.time
+
+
+class Phase(object):
+    def __init__(self, name):
+        self.name = name
+        totals[name] = 0.0
+
+    def __enter__(self):
+        if enabled:
+            now = _clock()
+            if _stack:
+                top = _stack[-1]
+                totals[top[0]] += now - top[1]
+            _stack.append([self.name, now])
+
+    def __exit__(self, tp, value, tb):
+        if enabled:
+            now = _clock()
+            name, start = _stack.pop()
+            totals[name] += now - start
+            if _stack:
+                _stack[-1][1] = now
+
+
+READ = Phase("read")
+MACROEXPAND = Phase("macroexpand")
+CODEGEN = Phase("codegen")
+ASSEMBLE = Phase("assemble")
+CACHE = Phase("cache")
+RUN = Phase("run")
+
+
+def report(out=sys.stderr):
+    """ Prints the time spent in each phase so far """
+    total = sum(totals.values())
+    for phase in [READ, MACROEXPAND, CODEGEN, ASSEMBLE, CACHE, RUN]:
+        secs = totals[phase.name]
+        print >> out, "%-12s %8.1f ms %5.1f%%" % (
+            phase.name, secs * 1000, 100 * secs / total if total else 0.0)
+    print >> out, "%-12s %8.1f ms" % ("total", total * 1000)
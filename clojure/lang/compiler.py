@@ -1,28 +1,58 @@
 from clojure.lang.symbol import Symbol, symbol
 from clojure.lang.namespace import findOrCreate as findOrCreateNamespace
-from clojure.lang.cljexceptions import CompilerException, AbstractMethodCall
+from clojure.lang.cljexceptions import (CompilerException, AbstractMethodCall,
+                                        ArityException)
 from clojure.lang.persistentvector import PersistentVector
 from clojure.lang.ipersistentvector import IPersistentVector
 from clojure.lang.ipersistentmap import IPersistentMap
 from clojure.lang.ipersistentset import IPersistentSet
 from clojure.lang.ipersistentlist import IPersistentList
-from clojure.lang.var import Var, define, intern as internVar, var as createVar
+from clojure.lang.iseq import ISeq
+from clojure.lang.ilookup import ILookup
+from clojure.lang.ipersistentcollection import IPersistentCollection
+from clojure.lang.protocol import ProtocolFn
+from clojure.lang.var import (Var, define, intern as internVar,
+                              var as createVar, linkFunction,
+                              relinkCode, arityFor)
 from clojure.util.byteplay import *
 import clojure.util.byteplay as byteplay
-from clojure.lang.cljkeyword import Keyword, keyword
+from clojure.lang.cljkeyword import Keyword, keyword, TAG_KEY
 from clojure.lang.namespace import find as findNamespace
 import new
 import clojure.lang.rt as RT
 from clojure.lang.lispreader import _AMP_
-from clojure.lang.namespace import findItem
-from clojure.lang.lispreader import LINE_KEY, garg
+from clojure.lang.namespace import findItem, resolve as resolveItem, isMacro
+from clojure.lang.lispreader import lineOf, setLine, garg
+import clojure.lang.peephole as peephole
+import clojure.lang.compileprofile as compileprofile
 import re
 import new
+import os
 import sys
+import types
 
-_MACRO_ = keyword(symbol("macro"))
+_DYNAMIC_ = keyword(symbol("dynamic"))
+_INLINE_ = keyword(symbol("inline"))
+_INLINE_ARITIES_ = keyword(symbol("inline-arities"))
 version = (sys.version_info[0] * 10) + sys.version_info[1]
 
+# When set, only vars marked ^:dynamic are looked up through deref at run
+# time. All other references are compiled to their root value, and
+# functions that embed a root are relinked when it is rebound.
+directLinking = os.environ.get("CLOJUREPY_DIRECT_LINKING", "0") != "0"
+
+# When set, calls the compiler knows how to specialize but couldn't, because
+# the type of the first argument isn't known, are collected in
+# reflectionWarnings. reportReflection() prints them.
+warnOnReflection = os.environ.get("CLOJUREPY_WARN_ON_REFLECTION", "0") != "0"
+
+# (filename, line, name of the fn called)
+reflectionWarnings = []
+
+def compilerOptions():
+    """ Settings that change the code the compiler emits """
+    return ("direct-linking",) if directLinking else ()
+
 PTR_MODE_GLOBAL = "PTR_MODE_GLOBAL"
 PTR_MODE_DEREF = "PTR_MODE_DEREF"
 
@@ -30,21 +60,24 @@ class MetaBytecode(object):
     pass
 
 class GlobalPtr(MetaBytecode):
-    def __init__(self, ns, name):
+    def __init__(self, ns, name, source):
         self.ns = ns
         self.name = name
+        # the module name is read from, ns or the module it refers name from
+        self.source = source
+        # number of arguments when this is the fn of a call
+        self.argc = None
         
     def __repr__(self):
         return "GblPtr<%s/%s>" % (self.ns.__name__, self.name)
     
-    def emit(self, comp, mode):
-        module = self.ns
+    def emit(self, comp, mode, linked=None):
+        module = self.source
         val = getattr(module, self.name)
         
         if isinstance(val, Var):
             if not val.isDynamic():
-                val = val.deref()
-                return [(LOAD_CONST, val)]
+                return linkVar(val, linked, self.argc)
             else:
                 if mode is PTR_MODE_DEREF:
                     return [(LOAD_CONST, val),
@@ -53,14 +86,58 @@ class GlobalPtr(MetaBytecode):
                 else:
                     raise CompilerException("Invalid deref mode", mode)
         
-        return [(LOAD_CONST, module),
+        # referred names are read from where they come from, the namespace
+        # would have to look them up on every access
+        return [(LOAD_CONST, self.source),
                (LOAD_ATTR, self.name)]
                 
-def expandMetas(bc, comp):
+def isLinkable(root):
+    """ Roots that can be embedded as constants. Primitives, keywords, types
+        and builtins could share a constant slot with a literal and are read
+        from the var instead. """
+    return not isinstance(root, (types.NoneType, bool, int, long, float,
+                                 complex, str, unicode, tuple, frozenset,
+                                 Keyword, type, types.ClassType,
+                                 types.ModuleType, types.BuiltinFunctionType))
+
+class LinkedRoot(object):
+    """ Stands for the root of var in the constants of code being assembled,
+        linkCode puts the root in its place. argc is the number of arguments
+        if the root is called. """
+    def __init__(self, var, argc):
+        self.var = var
+        self.argc = argc
+
+def linkVar(var, linked, argc=None):
+    """ Code that loads the root of a non-dynamic var. linked is the list of
+        LinkedRoots of the function being assembled, or None if the code
+        can't be relinked later (closures). A call with argc arguments is
+        linked straight to the matching arity of a multi arity fn. """
+    if linked is not None and isLinkable(var.root):
+        for x in linked:
+            if x.var is var and x.argc == argc:
+                return [(LOAD_CONST, x)]
+        linked.append(LinkedRoot(var, argc))
+        return [(LOAD_CONST, linked[-1])]
+    return [(LOAD_CONST, var),
+            (LOAD_ATTR, "root")]
+
+def linkCode(code):
+    """ Puts the roots in the place of the LinkedRoots in the constants of
+        code. Returns the new code and the (var, slot, argc) links of the
+        slots, every LinkedRoot has a slot of its own so a var only ever
+        rewrites its own slots when it is rebound. """
+    links = [(c.var, slot, c.argc) for slot, c in enumerate(code.co_consts)
+             if isinstance(c, LinkedRoot)]
+    if not links:
+        return code, links
+    return relinkCode(code, links), links
+
+def expandMetas(bc, comp, linked=None):
     code = []
     for x in bc:
         if isinstance(x, MetaBytecode):
-            code.extend(x.emit(comp, PTR_MODE_DEREF))
+            code.extend(x.emit(comp, PTR_MODE_DEREF, linked))
         else:
             code.append(x)
     return code
@@ -103,8 +180,16 @@ def compileDef(comp, form):
     comp.pushName(sym.name)
 
     code = []
+    old = getattr(comp.getNS(), sym.name, None)
+    if isinstance(old, Var) and old.ns is comp.getNS():
+        signature = compileSignature(old)
+    else:
+        signature = None
     v = internVar(comp.getNS(), sym)
-    v.setDynamic(True)
+    if directLinking:
+        v.setDynamic(bool(sym.meta() and sym.meta()[_DYNAMIC_]))
+    else:
+        v.setDynamic(True)
     code.append((LOAD_CONST, v))
     code.append((LOAD_ATTR, "bindRoot"))
     code.extend(comp.compile(value))
@@ -113,11 +198,286 @@ def compileDef(comp, form):
     #code.append((LOAD_CONST, False))
     #code.append((CALL_FUNCTION, 1))
     #code.append((POP_TOP, None))
-    v.setMeta(sym.meta())
+    v.setMeta(evalInlineMeta(comp, sym.meta()))
+    comp.defs.append(v)
+    comp.signatures.append((v, signature))
 
     comp.popName()
     return code
 
+def compileSignature(v):
+    """ What the compiler looks at when compiling code that uses v. Compare
+        it once the def has run, defmacro only makes v a macro then. """
+    meta = v.meta()
+    if meta is None:
+        return (v.isDynamic(), isMacro(v), False, None)
+    return (v.isDynamic(), isMacro(v), meta[_INLINE_] is not None,
+            meta[TAG_KEY])
+
+def evalInlineMeta(comp, meta):
+    """ :inline and :inline-arities are given as forms, evaluate them once so
+        the compiler can call them at every call site """
+    if meta is None:
+        return meta
+    for key in [_INLINE_, _INLINE_ARITIES_]:
+        val = meta[key]
+        if isinstance(val, (Symbol, ISeq)):
+            meta = meta.assoc(key, evalForm(val, comp.getNS().__name__))
+    return meta
+
+def inlineExpand(comp, form):
+    """ Returns the :inline expansion of the call form, or None if the called
+        var doesn't inline calls with this many arguments """
+    sym = form.first()
+    if not isinstance(sym, Symbol) or sym in comp.aliases:
+        return None
+    if sym.ns == "py" or sym.ns == "py.bytecode":
+        return None
+    v = findItem(comp.getNS(), sym)
+    if not isinstance(v, Var) or not v.meta():
+        return None
+    inline = v.meta()[_INLINE_]
+    if inline is None:
+        return None
+    comp.dependOn(v)
+    args = RT.seqToTuple(form.next())
+    arities = v.meta()[_INLINE_ARITIES_]
+    if isinstance(arities, IPersistentSet):
+        if len(args) not in arities:
+            return None
+    elif arities is not None and not arities(len(args)):
+        return None
+    with compileprofile.MACROEXPAND:
+        expansion = inline(*args)
+    if hasattr(expansion, "withMeta") and form.meta() is not None:
+        expansion = expansion.withMeta(form.meta())
+    return expandedLine(form, expansion)
+
+def expandedLine(form, expansion):
+    """ Gives the macro or :inline expansion of form the line of form,
+        unless the expansion was read with a line of its own """
+    line = lineOf(form)
+    if line is not None and isinstance(expansion, ISeq) \
+       and lineOf(expansion) is None:
+        setLine(expansion, line)
+    return expansion
+
+# tags that name Python types instead of a class in scope
+_PRIMITIVE_TAGS = {"int": int, "long": long, "float": float, "double": float,
+                   "boolean": bool, "bool": bool, "str": str,
+                   "unicode": unicode}
+
+_NUMERIC_TAGS = (int, long, float)
+
+def resolveTag(comp, tag):
+    """ The class a :tag names, or None if it doesn't name one that can be
+        found at compile time """
+    if isinstance(tag, (type, types.ClassType)):
+        return tag
+    if isinstance(tag, str):
+        tag = symbol(tag)
+    if not isinstance(tag, Symbol):
+        return None
+    if tag.ns is None and tag.name in _PRIMITIVE_TAGS:
+        return _PRIMITIVE_TAGS[tag.name]
+    if tag.ns == "py":
+        import __builtin__
+        cls = getattr(__builtin__, tag.name, None)
+    else:
+        try:
+            cls = findItem(comp.getNS(), tag)
+        except KeyError:
+            # the namespace of the tag isn't loaded
+            return None
+        if isinstance(cls, Var):
+            comp.dependOn(cls)
+            cls = cls.root if cls.hasRoot() else None
+    if isinstance(cls, (type, types.ClassType)):
+        return cls
+    return None
+
+def declaredTag(comp, form):
+    """ The class form is tagged with, or None """
+    m = meta(form)
+    if m is None or m[TAG_KEY] is None:
+        return None
+    return resolveTag(comp, m[TAG_KEY])
+
+def tagOf(comp, form):
+    """ The class form is known to evaluate to, or None. That is its own
+        tag, the tag of the local it names, the :tag of the var it calls or
+        the type of a literal. """
+    tag = declaredTag(comp, form)
+    if tag is not None:
+        return tag
+    if isinstance(form, Symbol):
+        alias = comp.getAlias(form)
+        return alias.tag if alias is not None else None
+    if isinstance(form, bool):
+        return bool
+    if type(form) in (int, long, float, str, unicode):
+        return type(form)
+    if isinstance(form, IPersistentVector):
+        return PersistentVector
+    if isinstance(form, ISeq) and isinstance(form.first(), Symbol):
+        v = calledVar(comp, form.first())
+        if v is not None and v.meta() is not None \
+           and v.meta()[TAG_KEY] is not None:
+            comp.dependOn(v)
+            return resolveTag(comp, v.meta()[TAG_KEY])
+    return None
+
+def calledVar(comp, sym):
+    """ The var a call with sym at its head calls, or None """
+    if sym in comp.aliases or sym.ns == "py" or sym.ns == "py.bytecode":
+        return None
+    try:
+        v = findItem(comp.getNS(), sym)
+    except KeyError:
+        return None
+    return v if isinstance(v, Var) else None
+
+def _method(name):
+    """ Calls the method name on the first argument """
+    def emit(args):
+        code = list(args[0])
+        code.append((LOAD_ATTR, name))
+        for x in args[1:]:
+            code.extend(x)
+        code.append((CALL_FUNCTION, len(args) - 1))
+        return code
+    return emit
+
+def _builtin(fn):
+    """ Calls the builtin fn with the arguments """
+    def emit(args):
+        code = [(LOAD_CONST, fn)]
+        for x in args:
+            code.extend(x)
+        code.append((CALL_FUNCTION, len(args)))
+        return code
+    return emit
+
+def _bytecode(*ops):
+    """ Runs ops on the arguments """
+    def emit(args):
+        code = []
+        for x in args:
+            code.extend(x)
+        code.extend(ops)
+        return code
+    return emit
+
+# var -> [(arities, type, emit)]. A call with one of arities arguments, the
+# first of which is tagged with a subclass of type, is compiled to emit(args)
+# instead of a call of the var. emit does what the fn would end up doing
+# for that type.
+_SPECIALIZED = {
+    "clojure.core/nth": [((2, 3), PersistentVector, _method("nth")),
+                         ((2,), (tuple, list, str, unicode),
+                          _bytecode((BINARY_SUBSCR, None)))],
+    "clojure.core/get": [((2, 3), ILookup, _method("valAt"))],
+    "clojure.core/contains?": [((2,), IPersistentMap,
+                                _method("containsKey"))],
+    "clojure.core/count": [((1,), object, _builtin(len))],
+    "clojure.core/conj": [((2,), IPersistentCollection, _method("cons"))],
+    "clojure.core/first": [((1,), ISeq, _method("first"))],
+    "clojure.core/next": [((1,), ISeq, _method("next"))],
+    "clojure.core/rest": [((1,), ISeq, _method("more"))],
+    "clojure.core/pos?": [((1,), _NUMERIC_TAGS,
+                           _bytecode((LOAD_CONST, 0), (COMPARE_OP, ">")))],
+    "clojure.core/neg?": [((1,), _NUMERIC_TAGS,
+                           _bytecode((LOAD_CONST, 0), (COMPARE_OP, "<")))],
+    "clojure.core/mod": [((2,), _NUMERIC_TAGS,
+                          _bytecode((BINARY_MODULO, None)))],
+    "clojure.core/max": [((2,), _NUMERIC_TAGS, _builtin(max))],
+    "clojure.core/min": [((2,), _NUMERIC_TAGS, _builtin(min))],
+    "clojure.core/even?": [((1,), (int, long),
+                            _bytecode((LOAD_CONST, 1), (BINARY_AND, None),
+                                      (LOAD_CONST, 0), (COMPARE_OP, "==")))],
+    "clojure.core/odd?": [((1,), (int, long),
+                           _bytecode((LOAD_CONST, 1), (BINARY_AND, None),
+                                     (LOAD_CONST, 0), (COMPARE_OP, "!=")))],
+}
+
+# var -> the protocol fn it dispatches through
+_PROTOCOL_FNS = {
+    "clojure.core/seq": lambda: RT.protocols.seq,
+}
+
+def protocolFnFor(v):
+    """ The protocol fn calls of v dispatch through, or None """
+    name = str(symbol(v.ns.__name__, v.sym.name))
+    if name in _PROTOCOL_FNS:
+        return _PROTOCOL_FNS[name]()
+    root = v.root if v.hasRoot() else None
+    return root if isinstance(root, ProtocolFn) else None
+
+def specialize(comp, form):
+    """ Compiles a call whose first argument is tagged to the operation the
+        called fn performs on that type, without calling the fn. Returns
+        None if the call can't be specialized. """
+    v = calledVar(comp, form.first())
+    if v is None or v.ns is None or form.next() is None:
+        return None
+    name = str(symbol(v.ns.__name__, v.sym.name))
+    pfn = protocolFnFor(v)
+    if name not in _SPECIALIZED and pfn is None:
+        return None
+    comp.dependOn(v)
+    args = RT.seqToTuple(form.next())
+    tag = tagOf(comp, args[0])
+    emit = None
+    if tag is not None:
+        for arities, tp, fn in _SPECIALIZED.get(name, []):
+            if len(args) in arities and issubclass(tag, tp):
+                emit = fn
+                break
+        if emit is None and pfn is not None:
+            method = pfn.methodFor(tag)
+            if method is not None:
+                emit = _method(method)
+    if emit is None:
+        if warnOnReflection:
+            line = lineOf(form)
+            reflectionWarnings.append((comp.filename, line or comp.lastlineno,
+                                       name))
+        return None
+    args = [comp.compile(x) for x in args]
+    if issubclass(tag, _NUMERIC_TAGS) or \
+       (len(args[0]) == 1 and args[0][0][0] == LOAD_CONST):
+        return emit(args)
+
+    # a tagged local can still be nil, which the fn handles
+    code = []
+    loads = []
+    for x in args:
+        if len(x) == 1 and x[0][0] in (LOAD_FAST, LOAD_DEREF, LOAD_CONST):
+            loads.append(x)
+            continue
+        local = garg(0).name
+        code.extend(x)
+        code.append((STORE_FAST, local))
+        loads.append([(LOAD_FAST, local)])
+    generic = Label("generic")
+    endlabel = Label("specializedEnd")
+    code.extend(loads[0])
+    code.append((LOAD_CONST, None))
+    code.append((COMPARE_OP, "is not"))
+    code.extend(emitJump(generic))
+    code.extend(emit(loads))
+    code.append((JUMP_ABSOLUTE, endlabel))
+    code.extend(emitLanding(generic))
+    code.extend(comp.compileCall(comp.compile(form.first()), loads))
+    code.append((endlabel, None))
+    return code
+
+def reportReflection(out=sys.stderr):
+    """ Prints the calls that could not be specialized so far """
+    for filename, line, name in reflectionWarnings:
+        print >> out, "Reflection warning, %s:%s - call to %s can't be " \
+                      "resolved." % (filename, line, name)
+
 def compileBytecode(comp, form):
     codename = form.first().name
     if not hasattr(byteplay, codename):
@@ -207,6 +567,7 @@ def compileLoopStar(comp, form):
             args.append(local)
             code.extend(comp.compile(body))
 
+        comp.getAlias(local).tag = declaredTag(comp, local)
         code.extend(comp.getAlias(local).compileSet(comp))
         idx += 1
 
@@ -241,6 +602,7 @@ def compileLetStar(comp, form):
         idx += 1
 
         body = s[idx]
+        tag = declaredTag(comp, local) or tagOf(comp, body)
         if comp.getAlias(local) is not None:
             code.extend(comp.compile(body))
             newlocal = symbol(str(local)+"_"+str(RT.nextID()))
@@ -251,6 +613,7 @@ def compileLetStar(comp, form):
             comp.pushAlias(local, RenamedLocal(local))
             args.append(local)
 
+        comp.getAlias(local).tag = tag
         code.extend(comp.getAlias(local).compileSet(comp))
 
         idx += 1
@@ -336,8 +699,17 @@ def compileIf(comp, form):
 
     elseLabel = Label("IfElse")
     endlabel = Label("IfEnd")
-    condition_name = garg(0).name
     code = cmp
+    if peephole.isBoolTest(cmp) or tagOf(comp, form.next().first()) is bool:
+        # True and False mean the same thing in Python and Clojure
+        code.extend(emitJump(elseLabel))
+        code.extend(body)
+        code.append((JUMP_ABSOLUTE, endlabel))
+        code.extend(emitLanding(elseLabel))
+        code.extend(body2)
+        code.append((endlabel, None))
+        return code
+    condition_name = garg(0).name
     code.append((STORE_FAST, condition_name))
     code.append((LOAD_FAST, condition_name))
     code.append((LOAD_CONST, None))
@@ -383,11 +755,9 @@ def compileFn(comp, name, form, orgform):
 
     for x in locals:
         comp.pushAlias(x, FnArgument(x))
+        comp.getAlias(x).tag = declaredTag(comp, x)
 
-    if orgform.meta() is not None:
-        line = orgform.meta()[LINE_KEY]
-    else:
-        line = 0
+    line = lineOf(orgform)
     code = [(SetLineno,line if line is not None else 0)]
     if lastisargs:
         code.extend(cleanRest(argsname.name))
@@ -407,10 +777,15 @@ def compileFn(comp, name, form, orgform):
     comp.popAliases(locals)
 
     clist = map(lambda x: x.sym.name, comp.closureList())
-    code = expandMetas(code, comp)
-    c = Code(code, clist, args, lastisargs, False, True, str(symbol(comp.getNS().__name__, name.name)), comp.filename, 0, None)
-    if not clist:
-        c = new.function(c.to_code(), comp.ns.__dict__, name.name)
+    linked = None if clist else []
+    fullname = str(symbol(comp.getNS().__name__, name.name))
+    with compileprofile.ASSEMBLE:
+        code = peephole.optimize(expandMetas(code, comp, linked), fullname)
+        c = Code(code, clist, args, lastisargs, False, True, fullname, comp.filename, 0, None)
+        if not clist:
+            code, links = linkCode(c.to_code())
+            c = new.function(code, comp.ns.__dict__, name.name)
+            linkFunction(c, links)
 
     return [(LOAD_CONST, c)], c
 
@@ -441,47 +816,179 @@ class MultiFn(object):
         body = form.next()
 
         self.locals, self.args, self.lastisargs, self.argsname = unpackArgs(argv)
-        endLabel = Label("endLabel")
-        argcode = [(LOAD_CONST, len),
-            (LOAD_FAST, '__argsv__'),
-            (CALL_FUNCTION, 1),
-            (LOAD_CONST, len(self.args) - (1 if self.lastisargs else 0)),
-            (COMPARE_OP, ">=" if self.lastisargs else "==")]
-        argcode.extend(emitJump(endLabel))
-        for x in range(len(self.args)):
-            if self.lastisargs and x == len(self.args) - 1:
-                offset = len(self.args) - 1
-                argcode.extend([(LOAD_FAST, '__argsv__'),
-                    (LOAD_CONST, offset),
-                    (SLICE_1, None),
-                    (STORE_FAST, self.argsname.name)])
-                argcode.extend(cleanRest(self.argsname.name))
-            else:
-                argcode.extend([(LOAD_FAST, '__argsv__'),
-                    (LOAD_CONST, x),
-                    (BINARY_SUBSCR, None),
-                    (STORE_FAST, self.args[x])])
+        self.argc = len(self.args) - (1 if self.lastisargs else 0)
 
         for x in self.locals:
             comp.pushAlias(x, FnArgument(x))
+            comp.getAlias(x).tag = declaredTag(comp, x)
 
         recurlabel = Label("recurLabel")
 
         recur = {"label": recurlabel,
         "args": map(lambda x: comp.getAlias(symbol(x)).compileSet(comp), self.args)}
 
-        bodycode = [(recurlabel, None)]
+        bodycode = []
+        if self.lastisargs:
+            bodycode.extend(cleanRest(self.argsname.name))
+        bodycode.append((recurlabel, None))
         comp.pushRecur(recur)
         bodycode.extend(compileImplcitDo(comp, body))
         bodycode.append((RETURN_VALUE, None))
-        bodycode.extend(emitLanding(endLabel))
         comp.popRecur()
         comp.popAliases(self.locals)
 
-        self.argcode = argcode
         self.bodycode = bodycode
 
 
+class NoArg(object):
+    """ Default of the parameters of a multi arity dispatcher, a parameter
+        that is still NoArg wasn't passed """
+
+
+def passedArgs(*args):
+    """ The arguments a dispatcher got, given its parameters """
+    return tuple(x for x in args if x is not NoArg)
+
+
+def dispatchArgs(argdefs):
+    """ The parameters of the dispatcher of argdefs. There is one for every
+        argument up to the most any arity names, all of them defaulting to
+        NoArg, so the arguments are passed on without building a tuple. The
+        last one, __rest__, takes any others. """
+    nargs = max(x.argc for x in argdefs)
+    return ["__arg%d__" % i for i in range(nargs)] + ["__rest__"]
+
+
+def dispatchCode(argdefs, loads, fullname):
+    """ Body of a fn that passes its arguments on to the arity matching
+        their count. loads holds the code that loads each arity, argdefs are
+        sorted by argc with the variadic arity last. """
+    params = dispatchArgs(argdefs)[:-1]
+    variadic = argdefs[-1].lastisargs
+    fixed = argdefs[:-1] if variadic else argdefs
+    # where a count no fixed arity takes goes
+    fallback = Label("variadicArity" if variadic else "wrongArity")
+    nextLabels = [Label("nextArity") for x in fixed[1:]] + [fallback]
+    code = []
+    prev = None
+    for x, load, nextLabel in zip(fixed, loads, nextLabels):
+        n = x.argc
+        if n < len(params):
+            # more than n arguments were passed
+            code.extend([(LOAD_FAST, params[n]),
+                         (LOAD_CONST, NoArg),
+                         (COMPARE_OP, "is")])
+            code.extend(emitJump(nextLabel))
+        else:
+            code.extend([(LOAD_FAST, "__rest__"),
+                         (UNARY_NOT, None)])
+            code.extend(emitJump(nextLabel))
+        # only the first arity, or one that comes after n - 1, can be
+        # reached with fewer than n arguments
+        if n > 0 and prev != n - 1:
+            code.extend([(LOAD_FAST, params[n - 1]),
+                         (LOAD_CONST, NoArg),
+                         (COMPARE_OP, "is not")])
+            code.extend(emitJump(fallback))
+        code.extend(load)
+        code.extend((LOAD_FAST, p) for p in params[:n])
+        code.extend([(CALL_FUNCTION, n),
+                     (RETURN_VALUE, None)])
+        code.extend(emitLanding(nextLabel))
+        prev = n
+
+    if variadic:
+        wrongArity = Label("wrongArity")
+        n = argdefs[-1].argc
+        if n > 0:
+            code.extend([(LOAD_FAST, params[n - 1]),
+                         (LOAD_CONST, NoArg),
+                         (COMPARE_OP, "is not")])
+            code.extend(emitJump(wrongArity))
+        code.extend(loads[-1])
+        code.extend((LOAD_FAST, p) for p in params[:n])
+        if n < len(params):
+            # a fixed arity takes more arguments than this one
+            code.extend(passArgs(params[n:]))
+        else:
+            code.append((LOAD_FAST, "__rest__"))
+        code.extend([(CALL_FUNCTION_VAR, n),
+                     (RETURN_VALUE, None)])
+        code.extend(emitLanding(wrongArity))
+
+    code.extend([(LOAD_CONST, ArityException),
+                 (LOAD_CONST, "Wrong number of args (%d) passed to " + fullname),
+                 (LOAD_CONST, len)])
+    code.extend(passArgs(params))
+    code.extend([(CALL_FUNCTION, 1),
+                 (BINARY_MODULO, None),
+                 (CALL_FUNCTION, 1),
+                 (RAISE_VARARGS, 1)])
+    return code
+
+
+def passArgs(params):
+    """ Code that builds the tuple of the arguments passed to the
+        dispatcher parameters params and __rest__ """
+    code = [(LOAD_CONST, passedArgs)]
+    code.extend((LOAD_FAST, p) for p in params)
+    code.extend([(LOAD_FAST, "__rest__"),
+                 (CALL_FUNCTION_VAR, len(params))])
+    return code
+
+
+def dispatchDefaults(argdefs):
+    return (NoArg,) * (len(dispatchArgs(argdefs)) - 1)
+
+
+class ArityClosures(object):
+    """ The arities of a multi arity fn* that closes over locals. Every
+        arity and the dispatcher have to be created at run time. """
+    def __init__(self, argdefs, codes, fullname, filename):
+        self.argdefs = argdefs
+        self.codes = codes
+        self.cells = ["__arity%d__" % RT.nextID() for x in codes]
+        loads = [[(LOAD_DEREF, x)] for x in self.cells]
+        code = peephole.optimize(dispatchCode(argdefs, loads, fullname),
+                                 fullname)
+        self.dispatch = Code(code, self.cells, dispatchArgs(argdefs), True,
+                             False, True, fullname, filename, 0, None)
+
+    def emit(self, clist):
+        """ Code that leaves the dispatcher on the stack, clist are the
+            closure cells the arities share """
+        code = []
+        for cell, c in zip(self.cells, self.codes):
+            code.extend(makeClosure(clist, c))
+            code.append((STORE_DEREF, cell))
+        code.extend(makeClosure(self.cells, self.dispatch,
+                                dispatchDefaults(self.argdefs)))
+        code.append((DUP_TOP, None))
+        code.append((BUILD_MAP, len(self.cells)))
+        for x, cell in zip(self.argdefs, self.cells):
+            code.append((LOAD_DEREF, cell))
+            code.append((LOAD_CONST, arityKey(x)))
+            code.append((STORE_MAP, None))
+        code.append((ROT_TWO, None))
+        code.append((STORE_ATTR, "__arities__"))
+        return code
+
+
+def makeClosure(cells, code, defaults=()):
+    c = [(LOAD_CONST, x) for x in defaults]
+    c.extend((LOAD_CLOSURE, x) for x in cells)
+    c.append((BUILD_TUPLE, len(cells)))
+    c.append((LOAD_CONST, code))
+    c.append((MAKE_CLOSURE, len(defaults)))
+    return c
+
+
+def arityKey(argdef):
+    """ Key of an arity in __arities__, the variadic arity is stored as
+        -1 - the number of fixed arguments it takes """
+    return -1 - argdef.argc if argdef.lastisargs else argdef.argc
+
+
 def compileMultiFn(comp, name, form):
     s = form
     argdefs = []
@@ -489,36 +996,44 @@ def compileMultiFn(comp, name, form):
     while s is not None:
         argdefs.append(MultiFn(comp, s.first()))
         s = s.next()
-    argdefs = sorted(argdefs, lambda x, y: len(x.args) < len(y.args))
-    if len(filter(lambda x: x.lastisargs, argdefs)) > 1:
+    variadic = filter(lambda x: x.lastisargs, argdefs)
+    if len(variadic) > 1:
         raise CompilerException("Only one function overload may have variable number of arguments", form)
+    fixed = sorted(filter(lambda x: not x.lastisargs, argdefs),
+                   key=lambda x: x.argc)
+    argdefs = fixed + variadic
 
-    code = []
-    if len(argdefs) == 1 and not argdefs[0].lastisargs:
-        hasvararg = False
-        argslist = argdefs[0].args
-        code.extend(argdefs[0].bodycode)
-    else:
-        hasvararg = True
-        argslist = ["__argsv__"]
-        for x in argdefs:
-            code.extend(x.argcode)
-            code.extend(x.bodycode)
-
-        code.append((LOAD_CONST, Exception))
-        code.append((CALL_FUNCTION, 0))
-        code.append((RAISE_VARARGS, 1))
-
+    fullname = str(symbol(comp.getNS().__name__, name.name))
     clist = map(lambda x: x.sym.name, comp.closureList())
-    code = expandMetas(code, comp)
-    c = Code(code, clist, argslist, hasvararg, False, True, str(symbol(comp.getNS().__name__, name.name)), comp.filename, 0, None)
-
-    if not clist:
-        c = new.function(c.to_code(), comp.ns.__dict__, name.name)
-
+    with compileprofile.ASSEMBLE:
+        codes = []
+        for x in argdefs:
+            linked = None if clist else []
+            code = peephole.optimize(expandMetas(x.bodycode, comp, linked), fullname)
+            c = Code(code, clist, x.args, x.lastisargs, False, True, fullname, comp.filename, 0, None)
+            if not clist:
+                code, links = linkCode(c.to_code())
+                c = new.function(code, comp.ns.__dict__, name.name)
+                linkFunction(c, links)
+            codes.append(c)
+
+        if len(codes) == 1:
+            return [(LOAD_CONST, codes[0])], codes[0]
+
+        if clist:
+            return None, ArityClosures(argdefs, codes, fullname, comp.filename)
+
+        loads = [[(LOAD_CONST, c)] for c in codes]
+        code = peephole.optimize(dispatchCode(argdefs, loads, fullname), fullname)
+        c = Code(code, [], dispatchArgs(argdefs), True, False, True, fullname,
+                 comp.filename, 0, None)
+        c = new.function(c.to_code(), comp.ns.__dict__, name.name,
+                         dispatchDefaults(argdefs))
+        c.__arities__ = dict(zip(map(arityKey, argdefs), codes))
 
     return [(LOAD_CONST, c)], c
 
+
 def compileImplcitDo(comp, form):
     code = []
     s = form
@@ -537,8 +1052,9 @@ def compileFNStar(comp, form):
     aliases = []
     if len(comp.aliases) > 0: # we might have closures to deal with
         for x in comp.aliases:
-
-            comp.pushAlias(x, Closure(x))
+            closure = Closure(x)
+            closure.tag = comp.aliases[x].tag
+            comp.pushAlias(x, closure)
             aliases.append(x)
         haslocalcaptures = True
 
@@ -588,10 +1104,11 @@ def compileFNStar(comp, form):
             if x is not selfalias:   #we'll populate selfalias later
                 fcode.extend(comp.getAlias(x.sym).compile(comp))  # Load our local version
                 fcode.append((STORE_DEREF, x.sym.name))            # Store it in a Closure Cell
-            fcode.append((LOAD_CLOSURE, x.sym.name))           # Push the cell on the stack
-        fcode.append((BUILD_TUPLE, len(clist)))
-        fcode.extend(code)
-        fcode.append((MAKE_CLOSURE, 0))
+        cells = map(lambda x: x.sym.name, clist)
+        if isinstance(ptr, ArityClosures):
+            fcode.extend(ptr.emit(cells))
+        else:
+            fcode.extend(makeClosure(cells, ptr))
         code = fcode
 
     if selfalias in clist:
@@ -606,8 +1123,62 @@ def compileFNStar(comp, form):
     comp.popAlias(symbol(name)) #closure
     return code
 
+_CONSTANT_TYPES = (str, unicode, int, long, float, Keyword)
+
+def isConstant(form):
+    """ True if form evaluates to itself, vectors and maps are constant if
+        everything in them is """
+    if form is None or isinstance(form, _CONSTANT_TYPES):
+        return True
+    if isinstance(form, IPersistentVector):
+        for x in form:
+            if not isConstant(x):
+                return False
+        return True
+    if isinstance(form, IPersistentMap):
+        s = form.seq()
+        while s is not None:
+            if not isConstant(s.first().getKey()) \
+               or not isConstant(s.first().getValue()):
+                return False
+            s = s.next()
+        return True
+    # set literals are never evaluated
+    return isinstance(form, IPersistentSet)
+
+def constantValue(form):
+    """ The value a constant form evaluates to. Vectors and maps are
+        rebuilt so they don't carry the reader's meta. """
+    if isinstance(form, IPersistentVector):
+        return RT.vector(*[constantValue(x) for x in form])
+    if isinstance(form, IPersistentMap):
+        args = []
+        s = form.seq()
+        while s is not None:
+            args.append(constantValue(s.first().getKey()))
+            args.append(constantValue(s.first().getValue()))
+            s = s.next()
+        return RT.map(*args)
+    return form
+
 def compileVector(comp, form):
+    if isConstant(form):
+        return [(LOAD_CONST, constantValue(form))]
+    items = list(form)
+    consts = [isConstant(x) for x in items]
     code = []
+    if True in consts:
+        # start from the constant part and assoc in the rest
+        template = RT.vector(*[constantValue(x) if c else None
+                               for x, c in zip(items, consts)])
+        code.append((LOAD_CONST, template))
+        for idx, x in enumerate(items):
+            if not consts[idx]:
+                code.append((LOAD_ATTR, "assocN"))
+                code.append((LOAD_CONST, idx))
+                code.extend(comp.compile(x))
+                code.append((CALL_FUNCTION, 2))
+        return code
     code.extend(comp.compile(symbol("clojure.lang.rt", "vector")))
     for x in form:
         code.extend(comp.compile(x))
@@ -645,9 +1216,31 @@ def compileIs(comp, form):
 
 
 def compileMap(comp, form):
+    if isConstant(form):
+        return [(LOAD_CONST, constantValue(form))]
     s = form.seq()
-    c = 0
+    template = []
+    dynamic = []
+    while s is not None:
+        kvp = s.first()
+        if isConstant(kvp.getKey()) and isConstant(kvp.getValue()):
+            template.append(constantValue(kvp.getKey()))
+            template.append(constantValue(kvp.getValue()))
+        else:
+            dynamic.append(kvp)
+        s = s.next()
     code = []
+    if template:
+        # start from the constant entries and assoc in the rest
+        code.append((LOAD_CONST, RT.map(*template)))
+        for kvp in dynamic:
+            code.append((LOAD_ATTR, "assoc"))
+            code.extend(comp.compile(kvp.getKey()))
+            code.extend(comp.compile(kvp.getValue()))
+            code.append((CALL_FUNCTION, 2))
+        return code
+    s = form.seq()
+    c = 0
     code.extend(comp.compile(symbol("clojure.lang.rt", "map")))
     while s is not None:
         kvp = s.first()
@@ -779,6 +1372,8 @@ class AAlias(object):
     """Base class for all aliases"""
     def __init__(self, rest = None):
         self.rest = rest
+        # the class the value is known to be, see tagOf
+        self.tag = None
     def compile(self, comp):
         raise AbstractMethodCall(self)
     def compileSet(self, comp):
@@ -871,14 +1466,6 @@ def evalForm(form, ns):
     return comp.executeCode(code)
 
 
-def ismacro(macro):
-    if not isinstance(macro, type) \
-            and (hasattr(macro, "meta") and macro.meta() and macro.meta()[_MACRO_])\
-            or (hasattr(macro, "macro?") and getattr(macro, "macro?")):
-            return True
-
-    return False
-
 def meta(form):
     if hasattr(form, "meta"):
         return form.meta()
@@ -889,27 +1476,29 @@ def macroexpand(form, comp, one = False):
         if form.first().ns == 'py' or form.first().ns == "py.bytecode":
             return form, False
 
-        itm = findItem(comp.getNS(), form.first())
-        dreffed = itm
-        if isinstance(dreffed, Var):
-            dreffed = itm.deref()
+        entry = resolveItem(comp.getNS(), form.first())
+        itm = entry[1]
 
         # Handle macros here
         # TODO: Break this out into a seperate function
-        if ismacro(itm) or ismacro(dreffed):
-            macro = dreffed
+        if entry[3]:
+            macro = itm
+            if isinstance(itm, Var):
+                comp.dependOn(itm)
+                macro = itm.deref()
             args = RT.seqToTuple(form.next())
 
             macroform = macro
             if hasattr(macro, "_macro-form"):
                 macroform = getattr(macro, "_macro-form")
 
-            mresult = macro(macroform, None, *args)
+            with compileprofile.MACROEXPAND:
+                mresult = macro(macroform, None, *args)
 
             if hasattr(mresult, "withMeta") \
                and hasattr(form, "meta"):
                 mresult = mresult.withMeta(form.meta())
-            mresult = comp.compile(mresult)   
+            mresult = comp.compile(expandedLine(form, mresult))   
             return mresult, True
 
     return form, False
@@ -923,10 +1512,23 @@ class Compiler(object):
         self.lastlineno = -1
         self.aliases = {}
         self.filename = "<unknown>"
+        self.defs = []
+        # (var, compileSignature before the def) for each of defs
+        self.signatures = []
+        # names ("ns/name") of the vars whose meta or value the code being
+        # compiled depends on, and of all the globals it refers to
+        self.deps = set()
+        self.refs = set()
 
     def setFile(self, filename):
         self.filename = filename
 
+    def dependOn(self, var):
+        """ Records that the code being compiled depends on the meta or the
+            value var has right now """
+        if var.ns is not None:
+            self.deps.add(str(symbol(var.ns.__name__, var.sym.name)))
+
     def pushAlias(self, sym, alias):
         """ Pushes this alias onto the alias stack for the entry sym.
             if no entry is found, a new one is created """
@@ -1006,6 +1608,13 @@ class Compiler(object):
         form, ret = macroexpand(form, self)
         if ret:
             return form
+        if isinstance(form.first(), Symbol):
+            specialized = specialize(self, form)
+            if specialized is not None:
+                return specialized
+        inlined = inlineExpand(self, form)
+        if inlined is not None:
+            return self.compile(inlined)
         if isinstance(form.first(), Symbol):
             if form.first().ns == "py.bytecode":
                 return compileBytecode(self, form)
@@ -1013,15 +1622,22 @@ class Compiler(object):
                 return self.compilePropertyAccess(form)
             if form.first().name.startswith(".") and form.first().ns is None:
                 return self.compileMethodAccess(form)
-        c = self.compile(form.first())
+        args = []
         f = form.next()
-        acount = 0
         while f is not None:
-            c.extend(self.compile(f.first()))
-            acount += 1
+            args.append(self.compile(f.first()))
             f = f.next()
-        c.append((CALL_FUNCTION, acount))
-
+        return self.compileCall(self.compile(form.first()), args)
+
+    def compileCall(self, fn, args):
+        """ Calls the fn fn loads with the arguments args load """
+        c = list(fn)
+        ptr = c[-1] if c else None
+        for x in args:
+            c.extend(x)
+        if isinstance(ptr, GlobalPtr):
+            ptr.argc = len(args)
+        c.append((CALL_FUNCTION, len(args)))
         return c
 
     def compileAccessList(self, sym):
@@ -1032,38 +1648,17 @@ class Compiler(object):
         return code
 
     def getAccessCode(self, sym):
-        if (sym.ns is not None and sym.ns == self.getNS().__name__) \
-           or sym.ns is None:
-            if self.getNS() is None:
-                raise CompilerException("no namespace has been defined", None)
-            if not hasattr(self.getNS(), sym.name):
+        if self.getNS() is None:
+            raise CompilerException("no namespace has been defined", None)
+        module, item, source = resolveItem(self.getNS(), sym)[:3]
+        self.refs.add(str(symbol(module.__name__, sym.name)))
+        if item is None and not hasattr(module, sym.name):
+            if module is self.getNS():
                 raise CompilerException("could not resolve '" + str(sym) + "', '" \
                                         + sym.name + "' not found in " + self.getNS().__name__ +
                                         " reference " + str(self.getNamesString(False)), None)
-            var = getattr(self.getNS(), sym.name)
-            return [GlobalPtr(self.getNS(), sym.name)]
-
-        if hasattr(self.getNS(), "__aliases__") and \
-            symbol(sym.ns) in self.getNS().__aliases__:
-            sym = symbol(self.getNS().__aliases__[symbol(sym.ns)].__name__, sym.name)
-
-        splt = []
-        if sym.ns is not None:
-            module = findNamespace(sym.ns) 
-            if not hasattr(module, sym.name):
-                raise CompilerException(str(module) + " does not define " + sym.name, None)
-            
-            return [GlobalPtr(module, sym.name)]
-
-        code = LOAD_ATTR if sym.ns else LOAD_GLOBAL
-        #if not sym.ns and sym.name.find(".") != -1 and sym.name != "..":
-        raise CompilerException("unqualified dotted forms not supported: " + str(sym), sym)
-
-        if len(sym.name.replace(".", "")):
-            splt.extend((code, attr) for attr in sym.name.split("."))
-        else:
-            splt.append((code, sym.name))
-        return splt
+            raise CompilerException(str(module) + " does not define " + sym.name, None)
+        return [GlobalPtr(module, sym.name, source)]
 
     def compileSymbol(self, sym):
         """ Compiles the symbol. First the compiler tries to compile it
@@ -1095,12 +1690,11 @@ class Compiler(object):
             from clojure.lang.cons import Cons
             c = []
             lineset = False
-            if hasattr(itm, "meta") and itm.meta() is not None:
-                line = itm.meta()[LINE_KEY]
-                if line is not None and line > self.lastlineno:
-                    lineset = True
-                    self.lastlineno = line
-                    c.append([SetLineno, line])
+            line = lineOf(itm)
+            if line is not None and line > self.lastlineno:
+                lineset = True
+                self.lastlineno = line
+                c.append([SetLineno, line])
 
             if isinstance(itm, Symbol):
                 c.extend(self.compileSymbol(itm))
@@ -1150,14 +1744,21 @@ class Compiler(object):
         if self.ns is not None:
             return self.ns
 
+    def assemble(self, code):
+        """ Turns the bytecode of a top level form into a code object that
+            can be evaluated in the current namespace """
+        with compileprofile.ASSEMBLE:
+            newcode = expandMetas(code, self)
+            newcode.append((RETURN_VALUE, None))
+            fullname = str(symbol(self.getNS().__name__, "<string>"))
+            newcode = peephole.optimize(newcode, fullname)
+            c = Code(newcode, [], [], False, False, False, fullname, self.filename, 0, None)
+            return c.to_code()
+
     def executeCode(self, code):
-        import sys
         if code == []:
             return None
-        newcode = expandMetas(code, self)
-        newcode.append((RETURN_VALUE, None))
-        c = Code(newcode, [], [], False, False, False, str(symbol(self.getNS().__name__, "<string>")), self.filename, 0, None)
-        retval = eval(c.to_code(), self.getNS().__dict__)
+        retval = eval(self.assemble(code), self.getNS().__dict__)
         return retval
 
     def pushPropertyAlias(self, mappings):
@@ -43,10 +43,3 @@ class Cons(ASeq):
             s = s.next()
         return c
 
-    def __repr__(self):
-        s = self
-        strs = []
-        while s is not None:
-            strs.append(repr(s.first()))
-            s = s.next()
-        return "(" + " ".join(strs) + ")"
@@ -0,0 +1,240 @@
+"""Reader for edn, the data subset of Clojure's syntax
+
+Only literals are read: nil, booleans, numbers, characters, strings,
+symbols, keywords, lists, vectors, maps, sets and tagged literals. There
+is no syntax-quote, #(), %, #' or regex literal and lists get no :line
+meta. Collections are built from the list of their items in one go.
+
+    readString("{:a [1 2]}")
+    for form in readFile("data.edn"):
+        ...
+"""
+
+import datetime
+import re
+import uuid
+
+from clojure.lang.cljexceptions import ReaderException
+from clojure.lang.cljkeyword import Keyword, TAG_KEY, T
+from clojure.lang.fileseq import StringReader, fileReader
+from clojure.lang.ipersistentmap import IPersistentMap
+from clojure.lang.lispreader import (read1, isWhitespace, isDigit,
+                                     readNumber, readToken, interpretToken,
+                                     stringReader, characterReader,
+                                     SKIP_PAT)
+from clojure.lang.symbol import Symbol, symbol
+import clojure.lang.persistenthashmap as persistenthashmap
+import clojure.lang.persistenthashset as persistenthashset
+import clojure.lang.persistentlist as persistentlist
+import clojure.lang.persistentvector as persistentvector
+import clojure.lang.rt as RT
+
+
+# returned by #_ and comments, which read nothing
+_NOTHING = object()
+
+_INST_PAT = re.compile(r"""
+(\d{4})(?:-(\d{2})(?:-(\d{2})
+(?:[Tt](\d{2})(?::(\d{2})(?::(\d{2})(?:\.(\d+))?)?)?
+(?:([Zz])|([+-])(\d{2}):(\d{2}))?)?)?)?
+$""", re.X)
+
+
+def readInst(s):
+    """ The datetime, in UTC, of an RFC 3339 timestamp """
+    m = _INST_PAT.match(s) if isinstance(s, basestring) else None
+    if m is None:
+        raise ReaderException("Unrecognized date/time syntax: " + repr(s))
+    (year, month, day, hour, minute, second, fraction, z, sign,
+     offhour, offminute) = m.groups()
+    micros = int((fraction or "0")[:6].ljust(6, "0"))
+    inst = datetime.datetime(int(year), int(month or 1), int(day or 1),
+                             int(hour or 0), int(minute or 0),
+                             int(second or 0), micros)
+    if sign is not None:
+        offset = datetime.timedelta(hours=int(offhour),
+                                    minutes=int(offminute))
+        inst = inst - offset if sign == "+" else inst + offset
+    return inst
+
+
+def readUUID(s):
+    if not isinstance(s, basestring):
+        raise ReaderException("#uuid needs a string, got " + repr(s))
+    return uuid.UUID(s)
+
+
+DEFAULT_READERS = {symbol("inst"): readInst,
+                   symbol("uuid"): readUUID}
+
+
+class EdnReader(object):
+    """ readers maps tag symbols to the fn that reads the value of a tagged
+        literal, they take precedence over #inst and #uuid. default is
+        called with the tag and the value of tags without a reader. """
+    def __init__(self, readers=None, default=None):
+        # readers can be a dict or a persistent map
+        self.readers = dict(DEFAULT_READERS)
+        for tag in (readers or ()):
+            self.readers[tag] = readers[tag]
+        self.default = default
+        self.macros = {'"': stringReader,
+                       "(": self.readList,
+                       "[": self.readVector,
+                       "{": self.readMap,
+                       ")": self.unmatchedDelimiter,
+                       "]": self.unmatchedDelimiter,
+                       "}": self.unmatchedDelimiter,
+                       ";": self.readComment,
+                       "^": self.readMeta,
+                       "#": self.readDispatch,
+                       "\\": characterReader}
+        self.dispatchMacros = {"{": self.readSet,
+                               "_": self.readDiscard}
+
+    def read(self, rdr, eofIsError=True, eofValue=None):
+        while True:
+            form = self.readForm(rdr)
+            if form is rdr:
+                if eofIsError:
+                    raise ReaderException("EOF while reading", rdr)
+                return eofValue
+            if form is not _NOTHING:
+                return form
+
+    def readForm(self, rdr):
+        """ Reads the next form, returns rdr at the end of input and
+            _NOTHING after a comment or #_ """
+        if isinstance(rdr, StringReader):
+            ch = rdr.readAfter(SKIP_PAT)
+        else:
+            ch = read1(rdr)
+        while isWhitespace(ch):
+            ch = read1(rdr)
+        if ch == "":
+            return rdr
+        if isDigit(ch):
+            return readNumber(rdr, ch)
+        macro = self.macros.get(ch)
+        if macro is not None:
+            return macro(rdr, ch)
+        if ch == "+" or ch == "-":
+            ch2 = read1(rdr)
+            rdr.back()
+            if isDigit(ch2):
+                return readNumber(rdr, ch)
+        return interpretToken(readToken(rdr, ch))
+
+    def readDelimited(self, delim, rdr):
+        """ The forms up to delim, in a Python list """
+        items = []
+        while True:
+            if isinstance(rdr, StringReader):
+                ch = rdr.readAfter(SKIP_PAT)
+            else:
+                ch = read1(rdr)
+            while isWhitespace(ch):
+                ch = read1(rdr)
+            if ch == "":
+                raise ReaderException("EOF while reading " + delim, rdr)
+            if ch == delim:
+                return items
+            rdr.back()
+            form = self.readForm(rdr)
+            if form is not _NOTHING:
+                items.append(form)
+
+    def readList(self, rdr, leftparen):
+        return persistentlist.create(self.readDelimited(")", rdr))
+
+    def readVector(self, rdr, leftbracket):
+        return persistentvector.fromList(self.readDelimited("]", rdr))
+
+    def readMap(self, rdr, leftbrace):
+        kvs = self.readDelimited("}", rdr)
+        if len(kvs) % 2:
+            raise ReaderException("Map literal must contain an even number "
+                                  "of forms", rdr)
+        return persistenthashmap.fromList(kvs, True)
+
+    def readSet(self, rdr, leftbrace):
+        return persistenthashset.fromList(self.readDelimited("}", rdr), True)
+
+    def unmatchedDelimiter(self, rdr, ch):
+        raise ReaderException("Unmatched delimiter: " + ch, rdr)
+
+    def readComment(self, rdr, semicolon):
+        while True:
+            ch = read1(rdr)
+            if ch == "" or ch == "\n" or ch == "\r":
+                return _NOTHING
+
+    def readDiscard(self, rdr, underscore):
+        self.read(rdr)
+        return _NOTHING
+
+    def readMeta(self, rdr, caret):
+        meta = self.read(rdr)
+        if isinstance(meta, (Symbol, str)):
+            meta = RT.map(TAG_KEY, meta)
+        elif isinstance(meta, Keyword):
+            meta = RT.map(meta, T)
+        elif not isinstance(meta, IPersistentMap):
+            raise ReaderException("Metadata must be Symbol, Keyword, String "
+                                  "or Map", rdr)
+        form = self.read(rdr)
+        if not hasattr(form, "withMeta"):
+            raise ReaderException("Metadata can only be applied to "
+                                  "IMetas", rdr)
+        return form.withMeta(meta)
+
+    def readDispatch(self, rdr, hash):
+        ch = read1(rdr)
+        if ch == "":
+            raise ReaderException("EOF while reading dispatch macro", rdr)
+        macro = self.dispatchMacros.get(ch)
+        if macro is not None:
+            return macro(rdr, ch)
+        rdr.back()
+        tag = self.read(rdr)
+        if not isinstance(tag, Symbol):
+            raise ReaderException("No dispatch macro for: #" + ch, rdr)
+        return self.readTagged(rdr, tag)
+
+    def readTagged(self, rdr, tag):
+        value = self.read(rdr)
+        fn = self.readers.get(tag)
+        if fn is not None:
+            return fn(value)
+        if self.default is not None:
+            return self.default(tag, value)
+        raise ReaderException("No reader function for tag " + str(tag), rdr)
+
+
+def read(rdr, eofIsError=True, eofValue=None, readers=None, default=None):
+    """ Reads the next form from rdr """
+    return EdnReader(readers, default).read(rdr, eofIsError, eofValue)
+
+def readString(s, eofIsError=True, eofValue=None, readers=None,
+               default=None):
+    """ Reads the first form of the string s """
+    return read(StringReader(s), eofIsError, eofValue, readers, default)
+
+def readForms(rdr, readers=None, default=None):
+    """ Yields the forms of rdr one at a time """
+    reader = EdnReader(readers, default)
+    while True:
+        form = reader.read(rdr, False, _NOTHING)
+        if form is _NOTHING:
+            return
+        yield form
+
+def readFile(filename, readers=None, default=None):
+    """ Yields the forms of the file filename one at a time. The file isn't
+        loaded into memory, see fileseq.fileReader. """
+    rdr = fileReader(filename)
+    try:
+        for form in readForms(rdr, readers, default):
+            yield form
+    finally:
+        rdr.close()
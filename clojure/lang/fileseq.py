@@ -1,3 +1,5 @@
+import mmap
+
 from clojure.lang.aseq import ASeq
 from clojure.lang.cljexceptions import IllegalAccessError, ArityException, InvalidArgumentException
 
@@ -83,6 +85,9 @@ class FileSeq(ASeq):
 
 
 class MutatableFileSeq(ASeq):
+    # see StringReader.trackLines
+    trackLines = True
+
     def __init__(self, fs):
         self.fs = fs
         self.old = None
@@ -112,28 +117,54 @@ class MutatableFileSeq(ASeq):
 
 
 class StringReader(object):
+    """ Reads a string one character at a time. Runs of characters can be
+        consumed at once with scan(). Line and column are worked out from
+        the offset when they are asked for. The reader records the line of
+        the lists it reads, see lispreader.lineOf, unless trackLines is
+        False. """
+    trackLines = True
+
     def __init__(self, s):
-        self.line = 1;
-        self.col = 1
         self.idx = -1
         self.s = s
-        self.lastline = -1
-        self.lastcol = -1
         self.haslast = False
+        # line number at offset _linepos, newlines are counted from there
+        self._linepos = 0
+        self._line = 1
 
     def read(self):
-        self.lastcol = self.col
-        self.lastline = self.line
         self.haslast = True
         self.idx += 1
         if self.idx >= len(self.s):
             return ""
+        return self.s[self.idx]
+
+    def scan(self, pat):
+        """ Consumes the match of the compiled regex pat at the next
+            character and returns it """
+        end = self._matchEnd(pat)
+        start = self.idx + 1
+        self.idx = end - 1
+        self.haslast = False
+        return self.s[start:end]
+
+    def readAfter(self, pat):
+        """ Consumes the match of pat like scan(), then reads the character
+            after it """
+        idx = self._matchEnd(pat)
+        self.idx = idx
+        self.haslast = True
+        return self.s[idx] if idx < len(self.s) else ""
+
+    def _matchEnd(self, pat):
+        """ Where the match of pat at the next character ends """
+        start = self.idx + 1
+        if start >= len(self.s):
+            return start
+        return pat.match(self.s, start).end()
 
-        cc = self.s[self.idx]
-        if cc == '\n':
-            self.line += 1;
-            self.col = 1
-        return cc
+    def _newlines(self, start, end):
+        return self.s.count("\n", start, end)
 
     def next(self):
         self.read()
@@ -142,6 +173,21 @@ class StringReader(object):
     def first(self):
         return self.s[self.idx] if self.idx < len(self.s) else ""
 
+    @property
+    def line(self):
+        end = min(self.idx + 1, len(self.s))
+        if end >= self._linepos:
+            self._line += self._newlines(self._linepos, end)
+        else:
+            self._line -= self._newlines(end, self._linepos)
+        self._linepos = end
+        return self._line
+
+    @property
+    def col(self):
+        end = min(self.idx + 1, len(self.s))
+        return end - self.s.rfind("\n", 0, end)
+
     def lineCol(self):
         return [self.line, self.col]
 
@@ -150,5 +196,106 @@ class StringReader(object):
             raise IllegalAccessError()
         self.idx -= 1
         self.haslast = False
-        self.line = self.lastline
-        self.col = self.lastcol
+
+
+class MappedFileReader(StringReader):
+    """ A StringReader over a memory mapped file, the file isn't read into
+        memory. It must not be truncated while it is being read. """
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            try:
+                s = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can't be mapped
+                s = ""
+        StringReader.__init__(self, s)
+
+    def _newlines(self, start, end):
+        return self.s[start:end].count("\n")
+
+    def close(self):
+        if isinstance(self.s, mmap.mmap):
+            self.s.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tp, value, tb):
+        self.close()
+
+
+class BufferedFileReader(StringReader):
+    """ A StringReader over a file object, read chunksize bytes at a time.
+        Only the chunk being read and the token that runs into the next one
+        are kept in memory, so it works on pipes and files of any size.
+        self.s is that window of the file and self.idx is relative to it. """
+    def __init__(self, f, chunksize=1 << 16):
+        self.file = f
+        self.chunksize = chunksize
+        chunk = f.read(chunksize)
+        self.eof = chunk == ""
+        # columns the line the window starts in has before the window
+        self._colbase = 0
+        StringReader.__init__(self, chunk)
+
+    def _fill(self):
+        """ Reads the next chunk. The part of the window before the current
+            character is dropped. """
+        chunk = self.file.read(self.chunksize)
+        if chunk == "":
+            self.eof = True
+            return
+        drop = max(self.idx - 1, 0)
+        s = self.s
+        if self._linepos < drop:
+            self._line += self._newlines(self._linepos, drop)
+            self._linepos = drop
+        self._linepos -= drop
+        nl = s.rfind("\n", 0, drop)
+        self._colbase = drop - nl - 1 if nl != -1 else self._colbase + drop
+        self.s = s[drop:] + chunk
+        self.idx -= drop
+
+    def read(self):
+        if self.idx + 1 >= len(self.s) and not self.eof:
+            self._fill()
+        return StringReader.read(self)
+
+    def _matchEnd(self, pat):
+        while True:
+            start = self.idx + 1
+            if start < len(self.s):
+                end = pat.match(self.s, start).end()
+                # a match that reaches the end of the window could go on in
+                # the next chunk
+                if end < len(self.s) or self.eof:
+                    return end
+            elif self.eof:
+                return start
+            self._fill()
+
+    @property
+    def col(self):
+        end = min(self.idx + 1, len(self.s))
+        nl = self.s.rfind("\n", 0, end)
+        if nl == -1:
+            return self._colbase + end + 1
+        return end - nl
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tp, value, tb):
+        self.close()
+
+
+def fileReader(filename):
+    """ A reader over filename that doesn't load it into memory, memory
+        mapped if the file can be """
+    try:
+        return MappedFileReader(filename)
+    except (EnvironmentError, mmap.error):
+        return BufferedFileReader(open(filename, "rb"))
@@ -0,0 +1,9 @@
+from clojure.lang.cljexceptions import AbstractMethodCall
+from clojure.lang.indexed import Indexed
+
+class IChunk(Indexed):
+    def dropFirst(self):
+        raise AbstractMethodCall(self)
+
+    def reduce(self, f, start):
+        raise AbstractMethodCall(self)
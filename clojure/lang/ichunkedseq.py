@@ -0,0 +1,13 @@
+from clojure.lang.cljexceptions import AbstractMethodCall
+from clojure.lang.iseq import ISeq
+from clojure.lang.sequential import Sequential
+
+class IChunkedSeq(Sequential, ISeq):
+    def chunkedFirst(self):
+        raise AbstractMethodCall(self)
+
+    def chunkedNext(self):
+        raise AbstractMethodCall(self)
+
+    def chunkedMore(self):
+        raise AbstractMethodCall(self)
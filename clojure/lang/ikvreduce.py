@@ -0,0 +1,5 @@
+from clojure.lang.cljexceptions import AbstractMethodCall
+
+class IKVReduce(object):
+    def kvreduce(self, f, init):
+        raise AbstractMethodCall(self)
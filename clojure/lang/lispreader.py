@@ -1,5 +1,6 @@
 import re
 import fractions
+import weakref
 
 from clojure.lang.fileseq import FileSeq, MutatableFileSeq
 from clojure.lang.var import Var, pushThreadBindings, popThreadBindings, var
@@ -45,6 +46,34 @@ _UNQUOTE_SPLICING_ = symbol("~@")
 ARG_ENV = var(None).setDynamic()
 GENSYM_ENV = var(None).setDynamic()
 
+
+class _LineRef(weakref.ref):
+    """ Weak reference to a form and the line it was read at """
+    __slots__ = ["key", "line"]
+
+# the lines of the lists read so far, by id of the list. Lines used to be
+# kept in the meta of the lists, which allocated a map for every one of them.
+_lines = {}
+
+def _forgetLine(ref):
+    if _lines.get(ref.key) is ref:
+        del _lines[ref.key]
+
+def setLine(form, line):
+    """ Records that form was read at line, returns form """
+    ref = _LineRef(form, _forgetLine)
+    ref.key = id(form)
+    ref.line = line
+    _lines[ref.key] = ref
+    return form
+
+def lineOf(form):
+    """ The line form was read at, or None """
+    ref = _lines.get(id(form))
+    if ref is None or ref() is not form:
+        return None
+    return ref.line
+
 WHITESPACE = [',', '\n', '\t', '\r', ' ']
 
 symbolPat = re.compile("[:]?([\\D^/].*/)?([\\D^/][^/]*)")
@@ -121,13 +150,17 @@ chrLiterals = {'t': '\t',
                '"': '"',
                "f": '\f'}
 
-def readString(s):
+def readString(s, trackLines=True):
+    """ Reads one form from s. With trackLines False the lines of the lists
+        in it aren't recorded """
     r = StringReader(s)
+    r.trackLines = trackLines
     return read(r, False, None, False)
 
 def read(rdr, eofIsError, eofValue, isRecursive):
+    scan = isinstance(rdr, StringReader)
     while True:
-        ch = read1(rdr)
+        ch = rdr.readAfter(SKIP_PAT) if scan else read1(rdr)
 
         while isWhitespace(ch):
             ch = read1(rdr)
@@ -284,6 +317,9 @@ def stringReader(rdr, doublequote):
 
     Return a str or unicode object."""
     buf = []
+    scan = isinstance(rdr, StringReader)
+    if scan:
+        buf.append(rdr.scan(STRING_CHUNK_PAT))
     ch = read1(rdr)
     while True:
         if ch == "":
@@ -320,9 +356,13 @@ def stringReader(rdr, doublequote):
         elif ch == '"':
             return "".join(buf)
         buf += ch
+        if scan:
+            buf.append(rdr.scan(STRING_CHUNK_PAT))
         ch = read1(rdr)
     
 def readToken(rdr, initch):
+    if isinstance(rdr, StringReader):
+        return initch + rdr.scan(TOKEN_PAT)
     sb = [initch]
     while True:
         ch = read1(rdr)
@@ -345,15 +385,17 @@ def interpretToken(s):
     return ret
 
 def readNumber(rdr, initch):
-    sb = [initch]
-    while True:
-        ch = read1(rdr)
-        if ch == "" or isWhitespace(ch) or isMacro(ch):
-            rdr.back()
-            break
-        sb.append(ch)
-
-    s = "".join(sb)
+    if isinstance(rdr, StringReader):
+        s = initch + rdr.scan(NUMBER_PAT)
+    else:
+        sb = [initch]
+        while True:
+            ch = read1(rdr)
+            if ch == "" or isWhitespace(ch) or isMacro(ch):
+                rdr.back()
+                break
+            sb.append(ch)
+        s = "".join(sb)
     try:
         n = matchNumber(s)
     except Exception as e:
@@ -397,6 +439,8 @@ def getMacro(ch):
     return macros[ch] if ch in macros else None
 
 def commentReader(rdr, semicolon):
+    if isinstance(rdr, StringReader):
+        rdr.scan(COMMENT_PAT)
     while True:
         chr = read1(rdr)
         if chr == "" or chr == '\n' or chr == '\r':
@@ -429,19 +473,19 @@ def dispatchReader(rdr, hash):
     return dispatchMacros[ch](rdr, ch)
 
 def listReader(rdr, leftparen):
-    startline = rdr.lineCol()[0]
+    startline = rdr.lineCol()[0] if rdr.trackLines else None
     lst = readDelimitedList(')', rdr, True)
     lst = apply(RT.list, lst)
-    return lst.withMeta(RT.map(LINE_KEY, startline))
+    if startline is not None and lst:
+        setLine(lst, startline)
+    return lst
 
 def vectorReader(rdr, leftbracket):
-    startline = rdr.lineCol()[0]
     lst = readDelimitedList(']', rdr, True)
     lst = apply(RT.vector, lst)
     return lst
 
 def mapReader(rdr, leftbrace):
-    startline = rdr.lineCol()[0]
     lst = readDelimitedList('}', rdr, True)
     lst = apply(RT.map, lst)
     return lst
@@ -452,9 +496,10 @@ def unmatchedDelimiterReader(rdr, un):
 def readDelimitedList(delim, rdr, isRecursive):
     firstline = rdr.lineCol()[0]
     a = []
+    scan = isinstance(rdr, StringReader)
 
     while True:
-        ch = read1(rdr)
+        ch = rdr.readAfter(SKIP_PAT) if scan else read1(rdr)
         while isWhitespace(ch):
             ch = read1(rdr)
         if ch == "":
@@ -495,7 +540,6 @@ def metaReader(rdr, caret):
     from clojure.lang.symbol import Symbol
     from clojure.lang.cljkeyword import Keyword, TAG_KEY, T
     from clojure.lang.ipersistentmap import IPersistentMap
-    line = rdr.lineCol()[0]
     meta = read(rdr, True, None, True)
     if isinstance(meta, Symbol) or isinstance(meta, str):
         meta = RT.map(TAG_KEY, meta)
@@ -506,7 +550,11 @@ def metaReader(rdr, caret):
     o = read(rdr, True, None, True)
     if not hasattr(o, "withMeta"):
         raise ReaderException("Cannot attach meta to a object without .withMeta")
-    return o.withMeta(meta)
+    line = lineOf(o)
+    o = o.withMeta(meta)
+    if line is not None:
+        setLine(o, line)
+    return o
 
 def matchSymbol(s):
     from clojure.lang.symbol import Symbol
@@ -551,9 +599,12 @@ def argReader(rdr, perc):
     return registerArg(n)
 
 def varQuoteReader(rdr, singlequote):
-    line = rdr.lineCol()[0]
+    line = rdr.lineCol()[0] if rdr.trackLines else None
     form = read(rdr, True, None, True)
-    return RT.list(_VAR_, form).withMeta(RT.map(LINE_KEY, line))
+    form = RT.list(_VAR_, form)
+    if line is not None:
+        setLine(form, line)
+    return form
 
 def registerArg(arg):
     argsyms = ARG_ENV.deref()
@@ -720,3 +771,19 @@ dispatchMacros = {"\"": regexReader,
                   "(": fnReader,
                   "'": varQuoteReader,
                   "^": metaReader}
+
+# Patterns StringReader.scan() consumes whole runs of characters with,
+# instead of going through read1() for each one. They stop at the same
+# characters the loops they replace stop at.
+def _charClass(chars, negate=True):
+    return "[" + ("^" if negate else "") + "".join(map(re.escape, chars)) + "]"
+
+# whitespace and ; comments
+SKIP_PAT = re.compile("(?:%s+|;[^\n\r]*[\n\r]?)*"
+                      % _charClass(WHITESPACE, False))
+COMMENT_PAT = re.compile("[^\n\r]*")
+TOKEN_PAT = re.compile(_charClass(WHITESPACE
+                                  + filter(isTerminatingMacro, macros)) + "*")
+NUMBER_PAT = re.compile(_charClass(WHITESPACE + filter(isMacro, macros))
+                        + "*")
+STRING_CHUNK_PAT = re.compile(r'[^"\\]*')
@@ -6,28 +6,93 @@ from clojure.lang.cljexceptions import (InvalidArgumentException,
                                         ArityException,
                                         IllegalArgumentException)
 import clojure.lang.rt as RT
-from clojure.lang.symbol import Symbol
-import sys, new
+from clojure.lang.symbol import Symbol, symbol
+from clojure.lang.cljkeyword import keyword
+import itertools, sys, new
 
 namespaces = AtomicReference(EMPTY_MAP)
 
 def areDifferentInstancesOfSameClassName(o1, o2):
     return o1.__class__ is o2.__class__
 
-def addDefaultImports(mod):
-    import clojure.lang.rt as RT
+class Namespace(new.module):
+    """ The module of a namespace. The names of clojure.core and
+        clojure.standardimports that it doesn't map itself are referred to
+        when they are looked up, instead of being copied into every new
+        namespace.
+
+        intern, refer, alias and import all change a namespace with setattr,
+        which gives it a new __version__, see lookup(). """
+    def __getattr__(self, name):
+        item = referred(self, name)
+        if item is _MISSING:
+            raise AttributeError("'" + self.__name__ + "' namespace has no "
+                                 "attribute '" + name + "'")
+        return item
+
+    def __setattr__(self, name, value):
+        new.module.__setattr__(self, name, value)
+        changed(self)
+
+    def __delattr__(self, name):
+        new.module.__delattr__(self, name)
+        changed(self)
+
+_versions = itertools.count(1)
+# bumped by changed() for changes lookup() can't tell the namespace of
+_epoch = 0
+
+def changed(ns=None):
+    """ Drops what lookup() cached about the names of ns, or about every
+        name if ns isn't given. Vars call it when their root or meta
+        changes. """
+    global _epoch
+    if ns is None:
+        _epoch = next(_versions)
+    elif isinstance(ns, Namespace):
+        ns.__dict__["__version__"] = next(_versions)
+
+def referralsOf(ns):
+    """ The modules ns refers to names of, in the order they are looked up
+        in. They are kept in __referrals__ once clojure.core is loaded. """
+    referrals = ns.__dict__.get("__referrals__")
+    if referrals is not None:
+        return referrals
     import clojure.standardimports as stdimps
-    for i in dir(stdimps):
-        if i.startswith("_"):
-            continue
-        setattr(mod, i, getattr(stdimps, i))
-    if "clojure.core" in sys.modules:
-        core = sys.modules["clojure.core"]
-        for i in dir(core):
-            if i.startswith("_"):
-                continue
-            setattr(mod, i, getattr(core, i))
-    return mod
+    core = sys.modules.get("clojure.core")
+    if core is None:
+        return (stdimps,)
+    referrals = (stdimps,) if core is ns else (core, stdimps)
+    ns.__referrals__ = referrals
+    return referrals
+
+def referred(ns, name):
+    """ What name is referred to from ns, _MISSING if nothing """
+    if name.startswith("_") or not isinstance(ns, Namespace):
+        return _MISSING
+    for mod in referralsOf(ns):
+        item = mod.__dict__.get(name, _MISSING)
+        if item is not _MISSING:
+            return item
+    return _MISSING
+
+def referredFrom(ns, name):
+    """ The module name comes from when it is looked up in ns """
+    if name in ns.__dict__ or referred(ns, name) is _MISSING:
+        return ns
+    for mod in referralsOf(ns):
+        if name in mod.__dict__:
+            return mod
+
+def mappings(ns):
+    """ Everything ns maps, referrals included, as a dict """
+    d = {}
+    if isinstance(ns, Namespace):
+        for mod in reversed(referralsOf(ns)):
+            d.update((k, v) for k, v in mod.__dict__.items()
+                     if not k.startswith("_"))
+    d.update(ns.__dict__)
+    return d
 
 def findOrCreateIn(module, parts):
     if not parts:
@@ -49,10 +114,8 @@ def findOrCreate(name):
     if name in sys.modules:
         return sys.modules[name]
 
-    mod = new.module(name)
+    mod = Namespace(name)
     sys.modules[name] = mod
-
-    addDefaultImports(mod)
     return mod
 
 def remove(name):
@@ -65,7 +128,9 @@ def remove(name):
         raise KeyError("module " + name + " not found")
     if name == "clojure.core":
         raise IllegalArgumentException("Cannot remove clojure namespace");
-    del sys.modules[name]
+    ns = sys.modules.pop(name)
+    changed(ns)
+    ns.__dict__.pop("__resolved__", None)
     return None
             
     
@@ -85,28 +150,88 @@ def find(name, fromns = None):
     return sys.modules[name]
 
 def findItem(ns, sym):
-    from clojure.lang.symbol import Symbol, symbol
-    if sym.ns is not None and  hasattr(ns, "__aliases__") and \
-        symbol(sym.ns) in ns.__aliases__:
-        sym = symbol(ns.__aliases__[symbol(sym.ns)].__name__, sym.name)
-       
+    from clojure.lang.symbol import Symbol
     if isinstance(sym, Symbol):
-        if ns is None:
-            ns = sys.modules["clojure.core"] # we need this to boostrap files
-        if sym.ns == ns.__name__:
-            if not hasattr(ns, sym.name):
-                return None
-            return getattr(ns, sym.name)
-        if sym.ns is not None:
-            mod = find(sym.ns, ns)
-            if hasattr(mod, sym.name):
-                return getattr(mod, sym.name)
-            return None
-        if not hasattr(ns, str(sym)):
-            return None
-        return getattr(ns, str(sym))
+        return lookup(ns, sym)[1]
     return getattr(ns, sym)
 
+def lookup(ns, sym):
+    """ Resolves sym from ns. Returns the namespace sym is looked up in and
+        what it is mapped to there, None if it isn't mapped. """
+    entry = resolve(ns, sym)
+    return entry[0], entry[1]
+
+def resolve(ns, sym):
+    """ Resolves sym from ns. Returns an (owner, item, source, macro, ...)
+        entry: the namespace sym is looked up in, what it is mapped to there
+        (None if it isn't mapped), the module item is read from (owner, or
+        the module owner refers it from) and whether item is a macro.
+
+        Entries are cached in the __resolved__ of ns, so they go away with
+        it, along with the __version__ of the namespaces they were made
+        from: ns, owner, the module item is referred from and the namespace
+        of a var item. An entry is used as long as none of them changed. """
+    if ns is None:
+        ns = sys.modules["clojure.core"] # we need this to boostrap files
+    cache = ns.__dict__.get("__resolved__")
+    if cache is None:
+        cache = {}
+        if isinstance(ns, Namespace):
+            ns.__dict__["__resolved__"] = cache
+    entry = cache.get(sym)
+    if entry is not None and entry[4] == _epoch:
+        for mod, version in entry[5]:
+            if mod.__dict__.get("__version__") != version:
+                break
+        else:
+            return entry
+
+    owner = _owner(ns, sym)
+    item = owner.__dict__.get(sym.name, _MISSING)
+    source = owner
+    if item is _MISSING and isinstance(owner, Namespace):
+        source = referredFrom(owner, sym.name)
+        item = source.__dict__.get(sym.name, _MISSING)
+    if item is _MISSING:
+        return (owner, None, owner, False)
+    if not isinstance(owner, Namespace):
+        # plain modules have no __version__
+        return (owner, item, source, isMacro(item))
+    deps = []
+    for mod in [ns, owner, source, getattr(item, "ns", None)]:
+        if isinstance(mod, Namespace) and mod not in deps:
+            deps.append(mod)
+    entry = (owner, item, source, isMacro(item), _epoch,
+             tuple((mod, mod.__dict__.get("__version__")) for mod in deps))
+    cache[sym] = entry
+    return entry
+
+_MACRO_ = keyword(symbol("macro"))
+
+def _isMacro(x):
+    return not isinstance(x, type) \
+           and (hasattr(x, "meta") and x.meta() and x.meta()[_MACRO_]) \
+           or (hasattr(x, "macro?") and getattr(x, "macro?"))
+
+def isMacro(item):
+    """ True if item is a macro, or a var holding one """
+    from clojure.lang.var import Var
+    if _isMacro(item):
+        return True
+    return isinstance(item, Var) and bool(_isMacro(item.deref()))
+
+_MISSING = object()
+
+def _owner(ns, sym):
+    """ The namespace sym is looked up in from ns """
+    from clojure.lang.symbol import symbol
+    if sym.ns is not None and hasattr(ns, "__aliases__") and \
+        symbol(sym.ns) in ns.__aliases__:
+        sym = symbol(ns.__aliases__[symbol(sym.ns)].__name__, sym.name)
+    if sym.ns is None or sym.ns == ns.__name__:
+        return ns
+    return find(sym.ns, ns)
+
 def findModule(sym, module = None):
     if module is None:
         sym = sym.split(".")
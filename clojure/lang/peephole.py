@@ -0,0 +1,201 @@
+"""Peephole pass over the byteplay code the compiler emits
+
+Runs after expandMetas, right before a Code is assembled. The compiler
+emits every form on its own, so the joints between forms leave behind
+constants that are pushed and popped again, locals that are stored and
+read back only once and jumps that land on other jumps. This pass cleans
+those up without changing what the code does.
+
+Set CLOJUREPY_PEEPHOLE_REPORT=1 to collect the size of every function
+before and after the pass, report() prints them.
+"""
+
+import os
+import sys
+
+from clojure.util.byteplay import *
+
+reportSizes = os.environ.get("CLOJUREPY_PEEPHOLE_REPORT", "0") != "0"
+
+# (name, size before, size after) of every optimized code block, only
+# filled in when reportSizes is set
+sizes = []
+
+_UNCONDITIONAL = set([JUMP_ABSOLUTE, JUMP_FORWARD])
+_NO_FALLTHROUGH = set([JUMP_ABSOLUTE, JUMP_FORWARD, RETURN_VALUE,
+                       RAISE_VARARGS])
+
+# builtins that always return True or False
+_PREDICATES = (isinstance, issubclass, callable, hasattr)
+
+
+def isLabel(x):
+    return isinstance(x[0], Label)
+
+
+def isLineno(x):
+    return x[0] is SetLineno
+
+
+def codeSize(code):
+    """ Number of bytes code will take once assembled, ignoring
+        EXTENDED_ARG """
+    size = 0
+    for op, arg in code:
+        if isopcode(op):
+            size += 3 if op in hasarg else 1
+    return size
+
+
+def _callee(code, idx, argc):
+    """ Returns the instruction that pushed the callable of the
+        CALL_FUNCTION at idx, or None if it can't be found without following
+        a jump """
+    need = argc + 1
+    idx -= 1
+    while idx >= 0:
+        x = code[idx]
+        if not isinstance(x, (tuple, list)) or isLabel(x):
+            return None
+        if not isLineno(x):
+            try:
+                pop, push = getse(x[0], x[1])
+            except ValueError:
+                return None
+            need -= push
+            if need <= 0:
+                return x if need == 0 and push == 1 else None
+            need += pop
+        idx -= 1
+    return None
+
+
+def isBoolTest(code):
+    """ True if code is known to leave True or False on the stack, in which
+        case Python's truth test matches Clojure's and an if can jump on the
+        value directly """
+    if not code:
+        return False
+    last = code[-1]
+    if not isinstance(last, (tuple, list)):
+        return False
+    op, arg = last
+    if op == COMPARE_OP or op == UNARY_NOT:
+        return True
+    if op == CALL_FUNCTION and arg <= 0xFF:
+        callee = _callee(code, len(code) - 1, arg)
+        if callee is not None and callee[0] == LOAD_CONST:
+            return any(callee[1] is x for x in _PREDICATES)
+    return False
+
+
+def _labelIndex(code):
+    return dict((id(x[0]), idx) for idx, x in enumerate(code) if isLabel(x))
+
+
+def _nextInstruction(code, idx):
+    """ Index of the first real instruction at or after idx """
+    while idx < len(code) and (isLabel(code[idx]) or isLineno(code[idx])):
+        idx += 1
+    return idx
+
+
+def _threadJump(code, labels, label):
+    """ Follows label through unconditional jumps, returns the final label
+        and the instruction it lands on """
+    seen = set()
+    while id(label) not in seen:
+        seen.add(id(label))
+        idx = _nextInstruction(code, labels[id(label)])
+        if idx == len(code):
+            return label, None
+        if code[idx][0] not in _UNCONDITIONAL:
+            return label, code[idx]
+        label = code[idx][1]
+    return label, None
+
+
+def _pass(code):
+    labels = _labelIndex(code)
+    loads = {}
+    targets = set()
+    for op, arg in code:
+        if op == LOAD_FAST:
+            loads[arg] = loads.get(arg, 0) + 1
+        elif isopcode(op) and op in hasjump:
+            targets.add(id(arg))
+
+    out = []
+    idx = 0
+    reachable = True
+    while idx < len(code):
+        x = code[idx]
+        op, arg = x
+        nxt = code[idx + 1] if idx + 1 < len(code) else (None, None)
+        idx += 1
+
+        if isLabel(x):
+            # labels nothing jumps to only get in the way of the patterns
+            # below
+            if id(op) in targets:
+                out.append(x)
+                reachable = True
+            continue
+        if not reachable or isLineno(x):
+            if reachable:
+                out.append(x)
+            continue
+
+        if op == LOAD_CONST and nxt[0] == POP_TOP:
+            idx += 1
+            continue
+        if op == STORE_FAST:
+            if not loads.get(arg):
+                out.append((POP_TOP, None))
+                continue
+            if nxt[0] == LOAD_FAST and nxt[1] == arg and loads[arg] == 1:
+                idx += 1
+                continue
+
+        if isopcode(op) and op in hasjump and id(arg) in labels:
+            arg, dest = _threadJump(code, labels, arg)
+            if op in _UNCONDITIONAL:
+                if dest is not None and dest[0] == RETURN_VALUE:
+                    x = (RETURN_VALUE, None)
+                elif _nextInstruction(code, idx) == \
+                     _nextInstruction(code, labels[id(arg)]):
+                    # jumps to the very next instruction
+                    continue
+                else:
+                    x = (op, arg)
+            else:
+                x = (op, arg)
+
+        out.append(x)
+        if x[0] in _NO_FALLTHROUGH:
+            reachable = False
+    return out
+
+
+def optimize(code, name=None):
+    """ Returns an optimized copy of code, a list of byteplay
+        instructions """
+    before = codeSize(code) if reportSizes else 0
+    while True:
+        newcode = _pass(code)
+        if newcode == code:
+            break
+        code = newcode
+    if reportSizes:
+        sizes.append((name, before, codeSize(code)))
+    return code
+
+
+def report(out=sys.stderr):
+    """ Prints the size of every function optimized so far """
+    total, totalafter = 0, 0
+    for name, before, after in sizes:
+        print >> out, "%-50s %6d -> %6d" % (name, before, after)
+        total += before
+        totalafter += after
+    print >> out, "%-50s %6d -> %6d" % ("total", total, totalafter)
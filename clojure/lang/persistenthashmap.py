@@ -1,7 +1,14 @@
+from threading import currentThread
+
 from clojure.lang.apersistentmap import APersistentMap
-from clojure.lang.cljexceptions import ArityException, AbstractMethodCall
+from clojure.lang.atransientmap import ATransientMap
+from clojure.lang.cljexceptions import (ArityException, AbstractMethodCall,
+                                        IllegalArgumentException,
+                                        IllegalAccessError)
 from clojure.lang.ieditablecollection import IEditableCollection
+from clojure.lang.ikvreduce import IKVReduce
 from clojure.lang.iobj import IObj
+from clojure.lang.ipersistentvector import IPersistentVector
 from clojure.lang.aseq import ASeq
 from clojure.lang.util import bitCount, arrayCopy
 from clojure.lang.box import Box
@@ -36,19 +43,23 @@ def createNode(*args):
 
     key1hash = hash(key1)
     if key1hash == key2hash:
-        return HashCollisionNode(None, key1hash, 2, [key1, val1, key2, val2])
+        return HashCollisionNode(edit, key1hash, 2, [key1, val1, key2, val2])
     nbox = Box(None)
     nd1 =  EMPTY_BITMAP_NODE \
             .assocEd(edit, shift, key1hash, key1, val1, nbox)
     nd2 = nd1.assocEd(edit, shift, key2hash, key2, val2, nbox)
     return nd2
 
+# maps with up to this many entries are built quicker with assoc than
+# through a transient
+TRANSIENT_THRESHOLD = 4
+
 def removePair(array, i):
     newArray = array[:2*i]
     newArray.extend(array[2*(i + 1):])
     return newArray
     
-class PersistentHashMap(APersistentMap, IEditableCollection, IObj):
+class PersistentHashMap(APersistentMap, IEditableCollection, IKVReduce, IObj):
     def __init__(self, *args):
         if len(args) == 4:
             self._meta = None
@@ -74,6 +85,21 @@ class PersistentHashMap(APersistentMap, IEditableCollection, IObj):
                                  self.hasNull,
                                  self.noneValue)
 
+    def asTransient(self):
+        return TransientHashMap(self)
+
+    def cons(self, o):
+        if isinstance(o, IPersistentVector):
+            return APersistentMap.cons(self, o)
+        # conj of a map, as in merge
+        ret = self.asTransient()
+        s = o.seq()
+        while s is not None:
+            e = s.first()
+            ret.assoc(e.getKey(), e.getValue())
+            s = s.next()
+        return ret.persistent().withMeta(self._meta)
+
     def assoc(self, key, val):
         if key is None:
             if self.hasNull and val == self.noneValue:
@@ -113,6 +139,31 @@ class PersistentHashMap(APersistentMap, IEditableCollection, IObj):
         s =  self.root.nodeSeq() if self.root is not None else None
         return Cons(MapEntry(None, self.noneValue), s) if self.hasNull else s
 
+    def items(self):
+        if self.hasNull:
+            yield None, self.noneValue
+        if self.root is not None:
+            for kv in self.root.items():
+                yield kv
+
+    def keys(self):
+        for k, v in self.items():
+            yield k
+
+    def vals(self):
+        for k, v in self.items():
+            yield v
+
+    def __iter__(self):
+        return self.keys()
+
+    def kvreduce(self, f, init):
+        if self.hasNull:
+            init = f(init, None, self.noneValue)
+        if self.root is not None:
+            init = self.root.kvreduce(f, init)
+        return init
+
     def __len__(self):
         return self.count
 
@@ -121,18 +172,107 @@ class PersistentHashMap(APersistentMap, IEditableCollection, IObj):
             return self.hasNull
         return self.root.find(0, hash(key), key, NOT_FOUND) is not NOT_FOUND if self.root is not None else False
 
-    def __repr__(self):
-        s = []
-        for x in self:
-            s.append(repr(x))
-            s.append(repr(self[x]))
-        return "{" + " ".join(s) + "}"
+
+class TransientHashMap(ATransientMap):
+    """ A hash map that assoc and without change in place, until persistent
+        is called. Its nodes are edited through assocEd and withoutEd with
+        edit, an AtomicReference that holds the thread that made it. Nodes
+        with that edit are changed in place, the ones shared with the map
+        it came from are copied first. """
+    def __init__(self, m):
+        self.edit = AtomicReference(currentThread())
+        self.root = m.root
+        self.cnt = m.count
+        self.hasNull = m.hasNull
+        self.noneValue = m.noneValue
+        self.leafFlag = Box(None)
+
+    def ensureEditable(self):
+        owner = self.edit.get()
+        if owner is currentThread():
+            return
+        if owner is None:
+            raise IllegalAccessError("Transient used after persistent! call")
+        raise IllegalAccessError("Transient used by non-owner thread")
+
+    def doAssoc(self, key, val):
+        if key is None:
+            if self.noneValue is not val:
+                self.noneValue = val
+            if not self.hasNull:
+                self.cnt += 1
+                self.hasNull = True
+            return self
+        self.leafFlag.val = None
+        root = EMPTY_BITMAP_NODE if self.root is None else self.root
+        self.root = root.assocEd(self.edit, 0, hash(key), key, val,
+                                 self.leafFlag)
+        if self.leafFlag.val is not None:
+            self.cnt += 1
+        return self
+
+    def doWithout(self, key):
+        if key is None:
+            if not self.hasNull:
+                return self
+            self.hasNull = False
+            self.noneValue = None
+            self.cnt -= 1
+            return self
+        if self.root is None:
+            return self
+        removedLeaf = Box(None)
+        self.root = self.root.withoutEd(self.edit, 0, hash(key), key,
+                                        removedLeaf)
+        if removedLeaf.val is not None:
+            self.cnt -= 1
+        return self
+
+    def doPersistent(self):
+        self.edit.set(None)
+        if not self.cnt:
+            return EMPTY
+        return PersistentHashMap(self.cnt, self.root, self.hasNull,
+                                 self.noneValue)
+
+    def doValAt(self, key, notFound = None):
+        if key is None:
+            return self.noneValue if self.hasNull else notFound
+        if self.root is None:
+            return notFound
+        return self.root.find(0, hash(key), key, notFound)
+
+    def doCount(self):
+        return self.cnt
 
 def fromDict(d):
-    m = EMPTY
+    m = EMPTY.asTransient()
     for v in d:
-        m = m.assoc(v, d[v])
-    return m
+        m.assoc(v, d[v])
+    return m.persistent()
+
+def fromList(kvs, checkDuplicates=False):
+    """ A map of the keys and values alternating in the list kvs, built in a
+        transient unless it is small """
+    if len(kvs) <= 2 * TRANSIENT_THRESHOLD:
+        m = EMPTY
+        for i in range(0, len(kvs), 2):
+            cnt = m.count
+            m = m.assoc(kvs[i], kvs[i + 1])
+            if checkDuplicates and m.count == cnt:
+                raise duplicateKey(kvs[i])
+        return m
+    m = EMPTY.asTransient()
+    for i in range(0, len(kvs), 2):
+        cnt = m.cnt
+        m.assoc(kvs[i], kvs[i + 1])
+        if checkDuplicates and m.cnt == cnt:
+            raise duplicateKey(kvs[i])
+    return m.persistent()
+
+def duplicateKey(key):
+    return IllegalArgumentException("Duplicate key: "
+                                    + ("nil" if key is None else repr(key)))
 
 
 class INode(object):
@@ -148,6 +288,12 @@ class INode(object):
     def nodeSeq(self):
         raise AbstractMethodCall(self)
 
+    def items(self):
+        raise AbstractMethodCall(self)
+
+    def kvreduce(self, f, init):
+        raise AbstractMethodCall(self)
+
     def assocEd(self, edit,  shift, hsh, key, val, addedLeaf):
         raise AbstractMethodCall(self)
 
@@ -178,9 +324,9 @@ class ArrayNode(INode):
         if node is None:
             return self
         n = node.without(shift + 5, hsh, key)
-        if n is None:
+        if n is node:
             return self
-        if node is None:
+        if n is None:
             if self.count <= 8:
                 return self.pack(None, idx)
             return ArrayNode(None, self.count - 1, cloneAndSet(self.array, idx, n))
@@ -209,14 +355,14 @@ class ArrayNode(INode):
         j = 1
         bitmap = 0
         for i in range(0, idx):
-            if self.array[i] is None:
+            if self.array[i] is not None:
                 newArray[j] = self.array[i]
                 bitmap |= 1 << i
                 j += 2
         for i in range(idx + 1, len(self.array)):
-            if self.array[i] is None:
+            if self.array[i] is not None:
                 newArray[j] = self.array[i]
-                bitmap != 1 << i
+                bitmap |= 1 << i
                 j += 2
         return BitmapIndexedNode(edit, bitmap, newArray)
 
@@ -228,7 +374,7 @@ class ArrayNode(INode):
             editable = self.editAndSet(edit, idx, nnode)
             editable.count += 1
             return editable
-        n = node.assoc(edit, shift + 5, hsh, key, val, addedLeaf)
+        n = node.assocEd(edit, shift + 5, hsh, key, val, addedLeaf)
         if n is node:
             return self
         return self.editAndSet(edit, idx, n)
@@ -238,7 +384,7 @@ class ArrayNode(INode):
         node = self.array[idx]
         if node is None:
             return self
-        n = node.without(edit, shift + 5, hsh, key, removedLeaf)
+        n = node.withoutEd(edit, shift + 5, hsh, key, removedLeaf)
         if n is node:
             return self
         if n is None:
@@ -252,6 +398,18 @@ class ArrayNode(INode):
     def nodeSeq(self):
         return createSeq(self.array)
 
+    def items(self):
+        for node in self.array:
+            if node is not None:
+                for kv in node.items():
+                    yield kv
+
+    def kvreduce(self, f, init):
+        for node in self.array:
+            if node is not None:
+                init = node.kvreduce(f, init)
+        return init
+
 class Seq(ASeq):
     def __init__(self, meta, nodes, i, s):
         self._meta = meta
@@ -292,6 +450,12 @@ class BitmapIndexedNode(INode):
     def nodeSeq(self):
         return createNodeSeq(self.array)
 
+    def items(self):
+        return arrayItems(self.array)
+
+    def kvreduce(self, f, init):
+        return arrayKVReduce(self.array, f, init)
+
     def index(self, bit):
         return bitCount(self.bitmap & (bit - 1))
 
@@ -378,10 +542,9 @@ class BitmapIndexedNode(INode):
     def ensureEditable(self, edit):
         if self.edit is edit:
             return self
-        n = bitCount(self.bitmap)
-        newArray = [None] * (2*(n+1) if n >= 0 else 4) # make room for next assoc
-        arrayCopy(self.array, 0, newArray, 0, 2*n)
-        return BitmapIndexedNode(self.edit, self.bitmap, newArray)
+        # python lists grow in place, so unlike on the JVM no room is made
+        # for the next assoc
+        return BitmapIndexedNode(edit, self.bitmap, self.array[:])
 
     def editAndSet(self, edit, i, a, j = None, b = None):
         editable = self.ensureEditable(edit)
@@ -395,9 +558,7 @@ class BitmapIndexedNode(INode):
             return None
         editable = self.ensureEditable(edit)
         editable.bitmap ^= bit
-        arrayCopy(editable.array, 2*(i+1), editable.array, 2*i, len(editable.array) - 2*(i+1))
-        editable.array[len(editable.array) - 2] = None
-        editable.array[len(editable.array) - 1] = None
+        del editable.array[2*i:2*i+2]
         return editable
 
     def assocEd(self, edit, shift, hsh, key, val, addedLeaf):
@@ -407,13 +568,13 @@ class BitmapIndexedNode(INode):
             keyOrNull = self.array[2*idx]
             valOrNode = self.array[2*idx+1]
             if keyOrNull is None:
-                n = valOrNode.assoc(edit, shift + 5, hsh, key, val, addedLeaf)
-                if n == valOrNode:
+                n = valOrNode.assocEd(edit, shift + 5, hsh, key, val, addedLeaf)
+                if n is valOrNode:
                     return self
                 return self.editAndSet(edit, 2*idx+1, n)
 
             if key == keyOrNull:
-                if val == valOrNode:
+                if val is valOrNode:
                     return self
                 return self.editAndSet(edit, 2*idx+1, val)
             addedLeaf.val = addedLeaf
@@ -421,15 +582,13 @@ class BitmapIndexedNode(INode):
                                 createNode(edit, shift + 5, keyOrNull, valOrNode, hsh, key, val))
         else:
             n = bitCount(self.bitmap)
-            if n*2 < len(self.array):
+            if n < 16:
                 addedLeaf.val = addedLeaf
                 editable = self.ensureEditable(edit)
-                arrayCopy(editable.array, 2*idx, editable.array, 2*(idx+1), 2*(n-idx))
-                editable.array[2*idx] = key
-                editable.array[2*idx+1] = val
+                editable.array[2*idx:2*idx] = [key, val]
                 editable.bitmap |= bit
                 return editable
-            if n >= 16:
+            else:
                 nodes = [None] * 32
                 jdx = mask(hsh, shift)
                 nodes[jdx] = EMPTY_BITMAP_NODE.assocEd(edit, shift + 5, hsh, key, val, addedLeaf)
@@ -447,17 +606,6 @@ class BitmapIndexedNode(INode):
                                                                  addedLeaf)
                         j += 2
                 return ArrayNode(edit, n + 1, nodes)
-            else:
-                newArray = [None] * (2*(n+4))
-                arrayCopy(self.array, 0, newArray, 0, 2*idx)
-                newArray[2*idx] = key
-                addedLeaf.val = addedLeaf
-                newArray[2*idx+1] = val
-                arrayCopy(self.array, 2*idx, newArray, 2*(idx+1), 2*(n-idx))
-                editable = self.ensureEditable(edit)
-                editable.array = newArray
-                editable.bitmap |= bit
-                return editable
 
     def withoutEd(self, edit, shift, hsh, key, removedLeaf):
         bit = bitpos(hsh, shift)
@@ -467,7 +615,7 @@ class BitmapIndexedNode(INode):
         keyOrNull = self.array[2*idx]
         valOrNode = self.array[2*idx+1]
         if keyOrNull is None:
-            n = valOrNode.without(edit, shift + 5, hsh, key, removedLeaf)
+            n = valOrNode.withoutEd(edit, shift + 5, hsh, key, removedLeaf)
             if n is valOrNode:
                 return self
             if n is not None:
@@ -478,7 +626,7 @@ class BitmapIndexedNode(INode):
 
         if key == keyOrNull:
             removedLeaf.val = removedLeaf
-            return self.editAndRemovePair(self.edit, bit, idx)
+            return self.editAndRemovePair(edit, bit, idx)
         return self
 
 class HashCollisionNode(INode):
@@ -513,7 +661,7 @@ class HashCollisionNode(INode):
         if self.count == 1:
             return None
 
-        return HashCollisionNode(None, hash, self.count - 1, removePair(self.array, idx/2))
+        return HashCollisionNode(None, self.hsh, self.count - 1, removePair(self.array, idx/2))
 
     def findIndex(self, key):
         for x in range(0, self.count * 2, 2):
@@ -530,6 +678,12 @@ class HashCollisionNode(INode):
     def nodeSeq(self):
         return createNodeSeq(self.array)
 
+    def items(self):
+        return arrayItems(self.array)
+
+    def kvreduce(self, f, init):
+        return arrayKVReduce(self.array, f, init)
+
     def ensureEditable(self, edit, i = None, array = None):
         if self.edit is edit:
             if i is not None:
@@ -609,6 +763,26 @@ class NodeSeq(ASeq):
             return createNodeSeq(self.array, self.i, self.s.next())
         return createNodeSeq(self.array, self.i + 2, None)
 
+def arrayItems(array):
+    """ (key, value) for the entries in the array of a BitmapIndexedNode or
+        HashCollisionNode, and in the nodes it holds under None keys """
+    for i in xrange(0, len(array), 2):
+        key = array[i]
+        if key is not None:
+            yield key, array[i + 1]
+        elif array[i + 1] is not None:
+            for kv in array[i + 1].items():
+                yield kv
+
+def arrayKVReduce(array, f, init):
+    for i in xrange(0, len(array), 2):
+        key = array[i]
+        if key is not None:
+            init = f(init, key, array[i + 1])
+        elif array[i + 1] is not None:
+            init = array[i + 1].kvreduce(f, init)
+    return init
+
 def createNodeSeq(*args):
     if len(args) == 1:
         if len(args[0]) == 0:
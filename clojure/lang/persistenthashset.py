@@ -1,8 +1,11 @@
 from clojure.lang.apersistentset import APersistentSet
-from clojure.lang.persistenthashmap import EMPTY as EMPTY_MAP
+from clojure.lang.atransientset import ATransientSet
+from clojure.lang.persistenthashmap import EMPTY as EMPTY_MAP, \
+     TRANSIENT_THRESHOLD, duplicateKey
+from clojure.lang.ieditablecollection import IEditableCollection
 from clojure.lang.iobj import IObj
 
-class PersistentHashSet(APersistentSet, IObj):
+class PersistentHashSet(APersistentSet, IEditableCollection, IObj):
     def __init__(self, meta, impl):
         APersistentSet.__init__(self, impl)
         self._meta = meta
@@ -25,28 +28,42 @@ class PersistentHashSet(APersistentSet, IObj):
         if key not in self:
             return self
         return PersistentHashSet(self._meta, self.impl.without(key))
-        
-    def __repr__(self):
-        x = self.seq()
-        j = []
-        while x is not None:
-            j.append(str(x.first()))
-            x = x.next()
-        return "#{" + " ".join(j) + "}" 
+
+    def asTransient(self):
+        return TransientHashSet(self.impl.asTransient())
+
+
+class TransientHashSet(ATransientSet):
+    """ A set that conj and disjoin change in place, until persistent is
+        called, on top of a TransientHashMap """
+    def persistent(self):
+        return PersistentHashSet(None, self.impl.persistent())
+
 
 def create(*args):
-    if not len(args):
-        return EMPTY
     if len(args) == 1 and hasattr(args[0], "__iter__"):
-        m = EMPTY
-        s = args[0]
-        for x in s:
-            m = m.cons(x)
-        return m
-    m = EMPTY
-    for x in args:
-        m = m.cons(x)
-    return m
+        args = args[0]
+    return fromList(args)
+
+def fromList(lst, checkDuplicates=False):
+    """ A set of the items of lst, any iterable, built in a transient unless
+        lst is a short list or tuple. With checkDuplicates an item that is
+        there twice is an error, as in a set literal. """
+    if isinstance(lst, (list, tuple)) and len(lst) <= TRANSIENT_THRESHOLD:
+        s = EMPTY
+        for x in lst:
+            cnt = len(s)
+            s = s.cons(x)
+            if checkDuplicates and len(s) == cnt:
+                raise duplicateKey(x)
+        return s
+    s = EMPTY.asTransient()
+    for x in lst:
+        cnt = s.count()
+        s.conj(x)
+        if checkDuplicates and s.count() == cnt:
+            raise duplicateKey(x)
+    return s.persistent()
 
 
 EMPTY = PersistentHashSet(None, EMPTY_MAP)
@@ -67,12 +67,6 @@ class PersistentList(ASeq, IPersistentList, IReduce, Counted):
             return self
         return PersistentList(meta, self._first, self._rest, self._count)
 
-    def __repr__(self):
-        s = []
-        for x in self:
-            s.append(repr(x))
-        return "(" + " ".join(s) + ")"
-
 def create(lst):
     ret = EMPTY
     for x in range(len(lst) - 1, -1, -1):
@@ -1,11 +1,23 @@
+from threading import currentThread
+
 from clojure.lang.apersistentvector import APersistentVector
+from clojure.lang.aseq import ASeq
+from clojure.lang.arraychunk import ArrayChunk
+from clojure.lang.counted import Counted
+from clojure.lang.ichunkedseq import IChunkedSeq
+from clojure.lang.ieditablecollection import IEditableCollection
+from clojure.lang.reversible import Reversible
+from clojure.lang.itransientvector import ITransientVector
+from clojure.lang.ifn import IFn
 from clojure.lang.cljexceptions import (ArityException,
                                         IndexOutOfBoundsException,
-                                        IllegalStateException)
+                                        IllegalStateException,
+                                        IllegalAccessError,
+                                        InvalidArgumentException)
 from clojure.lang.atomicreference import AtomicReference
 
 
-class PersistentVector(APersistentVector):
+class PersistentVector(APersistentVector, IEditableCollection, Reversible):
     def __init__(self, *args):
         if len(args) == 4:
             cnt, shift, root, tail = args
@@ -33,9 +45,10 @@ class PersistentVector(APersistentVector):
             if i >= self.tailoff():
                 return self.tail
             node = self.root
-            for level in range(self.shift, 0, -5):
+            level = self.shift
+            while level > 0:
                 node = node.array[(i >> level) & 0x01f]
-
+                level -= 5
             return node.array
         raise IndexOutOfBoundsException()
 
@@ -48,6 +61,33 @@ class PersistentVector(APersistentVector):
     def meta(self):
         return self._meta
 
+    def seq(self):
+        return self.chunkedSeq()
+
+    def chunkedSeq(self):
+        if not self.cnt:
+            return None
+        return ChunkedSeq(self, self.arrayFor(0), 0, 0)
+
+    def rseq(self):
+        if not self.cnt:
+            return None
+        return RSeq(self, self.arrayFor(self.cnt - 1), self.cnt - 1)
+
+    def __iter__(self):
+        for i in xrange(0, self.tailoff(), 32):
+            for x in self.arrayFor(i):
+                yield x
+        for x in self.tail:
+            yield x
+
+    def __reversed__(self):
+        for x in reversed(self.tail):
+            yield x
+        for i in xrange(self.tailoff() - 32, -1, -32):
+            for x in reversed(self.arrayFor(i)):
+                yield x
+
     def assocN(self, i, val):
         if 0 <= i < self.cnt:
             if i >= self.tailoff():
@@ -72,6 +112,9 @@ class PersistentVector(APersistentVector):
         return PersistentVector(meta, self.cnt, self.shift, self.root,
                                 self.tail)
 
+    def asTransient(self):
+        return TransientVector(self)
+
     def cons(self, val):
         if self.cnt - self.tailoff() < 32:
             newTail = self.tail[:]
@@ -79,10 +122,10 @@ class PersistentVector(APersistentVector):
             return PersistentVector(self.meta(), self.cnt + 1, self.shift,
                                     self.root, newTail)
 
-        tailnode = PersistentVector.Node(self.root.edit, self.tail)
+        tailnode = Node(self.root.edit, self.tail)
         newshift = self.shift
         if (self.cnt >> 5) > (1 << self.shift):
-            newroot = PersistentVector.Node(self.root.edit)
+            newroot = Node(self.root.edit)
             newroot.array[0] = self.root
             newroot.array[1] = newPath(self.root.edit, self.shift, tailnode)
             newshift += 5
@@ -94,7 +137,7 @@ class PersistentVector(APersistentVector):
 
     def pushTail(self, level, parent, tailnode):
         subidx = ((self.cnt - 1) >> level) & 0x01f
-        ret = PersistentVector.Node(parent.edit, parent.array[:])
+        ret = Node(parent.edit, parent.array[:])
 
         if level == 5:
             nodeToInsert = tailnode
@@ -141,22 +184,16 @@ class PersistentVector(APersistentVector):
             if newchild is None and not subidx:
                 return None
             else:
-                ret = PersistentVector.Node(self.root.edit, node.array[:])
+                ret = Node(self.root.edit, node.array[:])
                 ret.array[subidx] = newchild
                 return ret
         elif not subidx:
             return None
         else:
-            ret = PersistentVector.Node(self.root.edit, node.array[:])
+            ret = Node(self.root.edit, node.array[:])
             ret.array[subidx] = None
             return ret
 
-    def __repr__(self):
-        s = []
-        for x in range(len(self)):
-            s.append(repr(self[x]))
-        return "[" + " ".join(s) + "]"
-
 #    def __eq__(self, other):
 #        if other is self:
 #            return True
@@ -175,6 +212,259 @@ class PersistentVector(APersistentVector):
 #        return True
 
 
+class ChunkedSeq(ASeq, IChunkedSeq, Counted):
+    """ A seq of a vector that hands out its leaf arrays as ArrayChunks.
+        node is the leaf array holding item i + offset, i is the index of
+        the first item of node. """
+    def __init__(self, vec, node, i, offset, meta=None):
+        self.vec = vec
+        self.node = node
+        self.i = i
+        self.offset = offset
+        self._meta = meta
+
+    def withMeta(self, meta):
+        if meta is self._meta:
+            return self
+        return ChunkedSeq(self.vec, self.node, self.i, self.offset, meta)
+
+    def chunkedFirst(self):
+        return ArrayChunk(self.node, self.offset)
+
+    def chunkedNext(self):
+        i = self.i + len(self.node)
+        if i < self.vec.cnt:
+            return ChunkedSeq(self.vec, self.vec.arrayFor(i), i, 0)
+        return None
+
+    def chunkedMore(self):
+        s = self.chunkedNext()
+        if s is None:
+            from clojure.lang.persistentlist import EMPTY
+            return EMPTY
+        return s
+
+    def first(self):
+        return self.node[self.offset]
+
+    def next(self):
+        if self.offset + 1 < len(self.node):
+            return ChunkedSeq(self.vec, self.node, self.i, self.offset + 1)
+        return self.chunkedNext()
+
+    def __iter__(self):
+        for x in xrange(self.offset, len(self.node)):
+            yield self.node[x]
+        vec = self.vec
+        for i in xrange(self.i + len(self.node), vec.cnt, 32):
+            for x in vec.arrayFor(i):
+                yield x
+
+    def __len__(self):
+        return self.vec.cnt - (self.i + self.offset)
+
+
+class RSeq(ASeq, Counted):
+    """ A seq of the items of a vector from the last to the first. node is
+        the leaf array holding item i. """
+    def __init__(self, vec, node, i, meta=None):
+        self.vec = vec
+        self.node = node
+        self.i = i
+        self._meta = meta
+
+    def withMeta(self, meta):
+        if meta is self._meta:
+            return self
+        return RSeq(self.vec, self.node, self.i, meta)
+
+    def first(self):
+        return self.node[self.i & 0x01f]
+
+    def next(self):
+        if self.i & 0x01f:
+            return RSeq(self.vec, self.node, self.i - 1)
+        if not self.i:
+            return None
+        return RSeq(self.vec, self.vec.arrayFor(self.i - 1), self.i - 1)
+
+    def __len__(self):
+        return self.i + 1
+
+
+class TransientVector(IFn, ITransientVector):
+    """ A vector that conj, assocN and pop change in place, until persistent
+        is called. The nodes it made itself have its root's edit as their
+        edit and are changed in place, the ones it shares with the vector it
+        came from are copied first. Only the thread that made it can use
+        it. """
+    def __init__(self, v):
+        self.cnt = v.cnt
+        self.shift = v.shift
+        self.root = Node(AtomicReference(currentThread()), v.root.array[:])
+        self.tail = v.tail[:]
+
+    def ensureEditable(self):
+        owner = self.root.edit.get()
+        if owner is currentThread():
+            return
+        if owner is None:
+            raise IllegalAccessError("Transient used after persistent! call")
+        raise IllegalAccessError("Transient used by non-owner thread")
+
+    def ensureEditableNode(self, node):
+        if node.edit is self.root.edit:
+            return node
+        return Node(self.root.edit, node.array[:])
+
+    def tailoff(self):
+        if self.cnt < 32:
+            return 0
+        return ((self.cnt - 1) >> 5) << 5
+
+    def __len__(self):
+        self.ensureEditable()
+        return self.cnt
+
+    def count(self):
+        self.ensureEditable()
+        return self.cnt
+
+    def persistent(self):
+        self.ensureEditable()
+        self.root.edit.set(None)
+        if self.cnt <= 32:
+            # the tail holds everything, don't keep an empty root around
+            return PersistentVector(self.cnt, 5, EMPTY_NODE, self.tail)
+        return PersistentVector(self.cnt, self.shift, self.root, self.tail)
+
+    def conj(self, val):
+        self.ensureEditable()
+        if self.cnt - self.tailoff() < 32:
+            self.tail.append(val)
+            self.cnt += 1
+            return self
+
+        tailnode = Node(self.root.edit, self.tail)
+        self.tail = [val]
+        if (self.cnt >> 5) > (1 << self.shift):
+            newroot = Node(self.root.edit)
+            newroot.array[0] = self.root
+            newroot.array[1] = newPath(self.root.edit, self.shift, tailnode)
+            self.shift += 5
+        else:
+            newroot = self.pushTail(self.shift, self.root, tailnode)
+        self.root = newroot
+        self.cnt += 1
+        return self
+
+    def pushTail(self, level, parent, tailnode):
+        parent = self.ensureEditableNode(parent)
+        subidx = ((self.cnt - 1) >> level) & 0x01f
+        if level == 5:
+            nodeToInsert = tailnode
+        else:
+            child = parent.array[subidx]
+            nodeToInsert = (self.pushTail(level - 5, child, tailnode)
+                            if child is not None
+                            else newPath(self.root.edit, level - 5, tailnode))
+        parent.array[subidx] = nodeToInsert
+        return parent
+
+    def arrayFor(self, i):
+        if 0 <= i < self.cnt:
+            if i >= self.tailoff():
+                return self.tail
+            node = self.root
+            level = self.shift
+            while level > 0:
+                node = node.array[(i >> level) & 0x01f]
+                level -= 5
+            return node.array
+        raise IndexOutOfBoundsException()
+
+    def nth(self, i, notFound=None):
+        self.ensureEditable()
+        if 0 <= i < self.cnt:
+            return self.arrayFor(i)[i & 0x01f]
+        return notFound
+
+    def __getitem__(self, i):
+        self.ensureEditable()
+        return self.arrayFor(i)[i & 0x01f]
+
+    def __call__(self, i):
+        return self[i]
+
+    def valAt(self, key, notFound=None):
+        if isinstance(key, int):
+            return self.nth(key, notFound)
+        self.ensureEditable()
+        return notFound
+
+    def assoc(self, key, val):
+        if isinstance(key, int):
+            return self.assocN(key, val)
+        raise InvalidArgumentException("Key must be integer")
+
+    def assocN(self, i, val):
+        self.ensureEditable()
+        if 0 <= i < self.cnt:
+            if i >= self.tailoff():
+                self.tail[i & 0x01f] = val
+            else:
+                self.root = self.doAssoc(self.shift, self.root, i, val)
+            return self
+        if i == self.cnt:
+            return self.conj(val)
+        raise IndexOutOfBoundsException()
+
+    def doAssoc(self, level, node, i, val):
+        node = self.ensureEditableNode(node)
+        if not level:
+            node.array[i & 0x01f] = val
+        else:
+            subidx = (i >> level) & 0x01f
+            node.array[subidx] = self.doAssoc(level - 5, node.array[subidx],
+                                              i, val)
+        return node
+
+    def pop(self):
+        self.ensureEditable()
+        if not self.cnt:
+            raise IllegalStateException("Can't pop empty vector")
+        if self.cnt == 1 or self.cnt - self.tailoff() > 1:
+            self.tail.pop()
+            self.cnt -= 1
+            return self
+
+        newtail = self.arrayFor(self.cnt - 2)[:]
+        newroot = self.popTail(self.shift, self.root)
+        if newroot is None:
+            newroot = Node(self.root.edit)
+        if self.shift > 5 and newroot.array[1] is None:
+            newroot = self.ensureEditableNode(newroot.array[0])
+            self.shift -= 5
+        self.root = newroot
+        self.cnt -= 1
+        self.tail = newtail
+        return self
+
+    def popTail(self, level, node):
+        node = self.ensureEditableNode(node)
+        subidx = ((self.cnt - 2) >> level) & 0x01f
+        if level > 5:
+            newchild = self.popTail(level - 5, node.array[subidx])
+            if newchild is None and not subidx:
+                return None
+            node.array[subidx] = newchild
+            return node
+        elif not subidx:
+            return None
+        node.array[subidx] = None
+        return node
+
+
 class Node(object):
     def __init__(self, edit, array=None):
         self.edit = edit
@@ -203,17 +493,42 @@ def vec(seq):
     if isinstance(seq, APersistentVector):
         return seq
     s = RT.seq(seq)
-    v = EMPTY
+    v = EMPTY.asTransient()
     while s is not None:
-        v = v.cons(RT.first(s))
+        v.conj(RT.first(s))
         s = RT.next(s)
-    return v
+    return v.persistent()
     
 def create(*args):
-    x = EMPTY
+    if len(args) <= 32:
+        # fits in the tail
+        return PersistentVector(len(args), 5, EMPTY_NODE, list(args)) \
+               if args else EMPTY
+    x = EMPTY.asTransient()
     for z in args:
-        x = x.cons(z)
-    return x
+        x.conj(z)
+    return x.persistent()
+
+def fromList(lst):
+    """ A vector of the items of the list lst, its tree is built directly
+        instead of through one cons per item """
+    cnt = len(lst)
+    if not cnt:
+        return EMPTY
+    tailoff = ((cnt - 1) >> 5) << 5 if cnt >= 32 else 0
+    if not tailoff:
+        return PersistentVector(cnt, 5, EMPTY_NODE, lst[:])
+    nodes = [Node(NOEDIT, lst[x:x + 32]) for x in range(0, tailoff, 32)]
+    shift = 5
+    while len(nodes) > 32:
+        nodes = [Node(NOEDIT, _padded(nodes[x:x + 32]))
+                 for x in range(0, len(nodes), 32)]
+        shift += 5
+    return PersistentVector(cnt, shift, Node(NOEDIT, _padded(nodes)),
+                            lst[tailoff:])
+
+def _padded(array):
+    return array + [None] * (32 - len(array))
 
 import clojure.lang.rt as RT
 
@@ -0,0 +1,190 @@
+"""Prints objects to a writer a piece at a time
+
+Collections write their items one by one through the IPrintable protocol,
+so printing a large collection to a file or a socket never builds its
+whole string. A print started by printTo is cut short by the values of
+*print-length* (items per collection) and *print-level* (nested
+collections) in clojure.core.
+
+    printTo(obj, sys.stdout)
+    printString(obj)
+"""
+
+import re
+import sys
+
+from clojure.lang.iprintable import IPrintable
+from clojure.lang.iseq import ISeq
+
+_ESCAPES = {'"': '\\"', '\\': '\\\\', '\n': '\\n', '\t': '\\t',
+            '\r': '\\r', '\b': '\\b', '\f': '\\f'}
+_ESCAPE_PAT = re.compile('["\\\\\n\t\r\b\f]')
+_NON_ASCII_PAT = re.compile(u'[^\x00-\x7f]')
+
+
+class StringWriter(object):
+    """ A writer that collects what is written to it, unlike cStringIO it
+        takes unicode """
+    def __init__(self):
+        self.parts = []
+        self.write = self.parts.append
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+
+class Printer(object):
+    """ Wraps the writer a print goes to, with the limits the print started
+        with and how deep into collections it is """
+    def __init__(self, writer, length=None, level=None):
+        self.writer = writer
+        self.write = writer.write
+        self.length = length
+        self.level = level
+        self.depth = 0
+
+
+def _coreValue(name):
+    core = sys.modules.get("clojure.core")
+    v = getattr(core, name, None)
+    return None if v is None else v.deref()
+
+
+def printTo(obj, writer=None, readably=True):
+    """ Writes obj to writer, sys.stdout by default. readably writes it the
+        way the reader reads it back (pr), otherwise strings are written as
+        they are (print). """
+    if writer is None:
+        writer = sys.stdout
+    printer = Printer(writer, _coreValue("*print-length*"),
+                      _coreValue("*print-level*"))
+    writeObj(obj, printer, readably)
+
+
+def printString(obj, readably=True):
+    """ obj printed with printTo, as a string """
+    writer = StringWriter()
+    printTo(obj, writer, readably)
+    return writer.getvalue()
+
+
+def reprString(obj):
+    """ obj printed readably as a byte string, what __repr__ has to return
+    """
+    s = printString(obj)
+    if isinstance(s, unicode):
+        s = s.encode("ascii", "backslashreplace")
+    return s
+
+
+def _printFn(tp, readably):
+    protocols = sys.modules.get("clojure.protocols")
+    if protocols is not None:
+        pfn = protocols.writeAsReplString if readably \
+              else protocols.writeAsString
+        return pfn.resolve(tp)
+    # before RT.init
+    if issubclass(tp, IPrintable):
+        return tp.writeAsReplString if readably else tp.writeAsString
+    return None
+
+
+def writeObj(obj, writer, readably=True):
+    """ Writes obj with the IPrintable protocol, objects it isn't extended
+        to are written as their repr (readably) or str """
+    fn = _printFn(type(obj), readably)
+    if fn is not None:
+        fn(obj, writer)
+    elif isinstance(obj, ISeq):
+        # lazy seqs, which can be endless
+        writeColl(seqItems(obj.seq()), writer, "(", ")", readably)
+    elif readably:
+        writer.write(repr(obj))
+    else:
+        writer.write(str(obj))
+
+
+def _unicodeEscape(m):
+    c = ord(m.group())
+    return "\\u%04x" % c if c <= 0xFFFF else "\\U%08x" % c
+
+
+def writeString(s, writer):
+    """ Writes the string s as a string literal. Non ASCII characters of a
+        unicode string are written as \\u escapes, so printing readably
+        gives a byte string. """
+    s = _ESCAPE_PAT.sub(lambda m: _ESCAPES[m.group()], s)
+    if isinstance(s, unicode):
+        s = _NON_ASCII_PAT.sub(_unicodeEscape, s).encode("ascii")
+    writer.write('"')
+    writer.write(s)
+    writer.write('"')
+
+
+def _enter(writer):
+    """ The Printer for a collection written to writer, or None if the
+        collection is past *print-level* """
+    if not isinstance(writer, Printer):
+        # somebody called writeAsString on a collection directly
+        writer = Printer(writer)
+    if writer.level is not None and writer.depth >= writer.level:
+        writer.write("#")
+        return None
+    return writer
+
+
+def writeColl(items, writer, opening, closing, readably):
+    """ Writes the python iterable items between opening and closing """
+    printer = _enter(writer)
+    if printer is None:
+        return
+    write = printer.write
+    length = printer.length
+    write(opening)
+    printer.depth += 1
+    try:
+        n = 0
+        for x in items:
+            if n:
+                write(" ")
+            if n == length:
+                write("...")
+                break
+            writeObj(x, printer, readably)
+            n += 1
+    finally:
+        printer.depth -= 1
+    write(closing)
+
+
+def seqItems(s):
+    """ The items of the seq s, for writeColl """
+    while s is not None:
+        yield s.first()
+        s = s.next()
+
+
+def writeMap(m, writer, readably):
+    """ Writes the entries of the map m as {k v k v} """
+    printer = _enter(writer)
+    if printer is None:
+        return
+    write = printer.write
+    length = printer.length
+    write("{")
+    printer.depth += 1
+    try:
+        n = 0
+        for key, val in m.items():
+            if n:
+                write(" ")
+            if n == length:
+                write("...")
+                break
+            writeObj(key, printer, readably)
+            write(" ")
+            writeObj(val, printer, readably)
+            n += 1
+    finally:
+        printer.depth -= 1
+    write("}")
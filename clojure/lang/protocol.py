@@ -1,30 +1,75 @@
+import inspect
+import types
+
 from clojure.lang.namespace import findOrCreate as findNamespace
 
 class ProtocolException(Exception):
     def __init__(self, msg):
-        Exception.__init__(msg)
+        Exception.__init__(self, msg)
 
 
 
 def getFuncName(protocol, funcname):
     return str(protocol) + funcname
+
+
+def _mro(tp):
+    mro = getattr(tp, "__mro__", None)
+    if mro is None:
+        # old style class
+        mro = inspect.getmro(tp)
+    return mro
+
+
+def _function(fn):
+    """ An unbound method checks the type of its first argument on every
+        call, the function it wraps doesn't """
+    if type(fn) is types.MethodType and fn.im_self is None:
+        return fn.im_func
+    return fn
+
     
 class ProtocolFn(object):
     """Defines a function that dispatches on the type of the first argument
-    passed to __call__"""
+    passed to __call__
+
+    A type uses the implementation of the first type in its MRO the fn was
+    extended to. That lookup happens once per type, the result is cached
+    until one of the types in the MRO is extended again, and the last type
+    seen is checked before the cache."""
     
     def __init__(self, fname):
+        # type -> fn it was extended with
         self.dispatchTable = {}
+        # types extended with their own method named like this fn, their
+        # subclasses use their override of that method
+        self.methodTypes = set()
+        # type -> resolved fn, None when the type isn't extended
+        self.cache = {}
+        # (type, fn) of the last call
+        self.last = (None, None)
         self.name = intern(fname)
-        self.attrname = intern("__proto__" + self.name)
+        self.__name__ = self.name
         self.default = None
         
     def extend(self, tp, fn):
-           
-        try:
-            setattr(tp, self.attrname, fn)
-        except:
-            self.dispatchTable[tp] = fn
+        self.dispatchTable[tp] = fn
+        self.methodTypes.discard(tp)
+        self.invalidate(tp)
+
+    def extendByMethod(self, tp):
+        """ Extends tp with its method of the same name as this fn """
+        self.dispatchTable[tp] = getattr(tp, self.__name__)
+        self.methodTypes.add(tp)
+        self.invalidate(tp)
+
+    def invalidate(self, tp):
+        """ Drops the cached implementation of tp and of every cached type
+            that inherits from it """
+        for x in self.cache.keys():
+            if tp in _mro(x):
+                del self.cache[x]
+        self.last = (None, None)
             
     def extendForTypes(self, tps, fn):
         for tp in tps:
@@ -32,23 +77,51 @@ class ProtocolFn(object):
             
     def setDefault(self, fn):
         self.default = fn
+        self.last = (None, None)
+
+    def resolve(self, tp):
+        """ Returns the implementation for tp, or None if tp isn't
+            extended """
+        try:
+            return self.cache[tp]
+        except KeyError:
+            pass
+        fn = None
+        for x in _mro(tp):
+            if x in self.dispatchTable:
+                if x in self.methodTypes:
+                    fn = getattr(tp, self.__name__)
+                else:
+                    fn = self.dispatchTable[x]
+                fn = _function(fn)
+                break
+        self.cache[tp] = fn
+        return fn
             
+    def methodFor(self, tp):
+        """ The name of the method tp implements this fn with, None if tp
+            isn't extended by a method """
+        for x in _mro(tp):
+            if x in self.dispatchTable:
+                return self.__name__ if x in self.methodTypes else None
+        return None
+
     def isExtendedBy(self, tp):
-        if hasattr(tp, self.attrname) or tp in self.dispatchTable:
-            return True
-        return False
+        return self.resolve(tp) is not None
             
     def __call__(self, *args):
         x = type(args[0])
-        if hasattr(x, self.attrname):
-            return getattr(x, self.attrname)(*args)
-        else:
-            try:
-                return self.dispatchTable[x](*args)
-            except:
-                if self.default:
-                    return self.default(*args)
-                raise
+        last = self.last
+        if x is last[0]:
+            return last[1](*args)
+        fn = self.resolve(x)
+        if fn is None:
+            fn = self.default
+            if fn is None:
+                raise ProtocolException(repr(self) + " is not extended to "
+                                        + repr(x))
+        self.last = (x, fn)
+        return fn(*args)
             
     def __repr__(self):
         return "ProtocolFn<" + self.name + ">"
@@ -132,7 +205,7 @@ def extendProtocolForClass(proto, tp):
         
         pfn = proto.protofns[fn]
         if hasattr(tp, fn):
-            pfn.extend(tp, getattr(tp, fn))
+            pfn.extendByMethod(tp)
         
     proto.markImplementor(tp)
     
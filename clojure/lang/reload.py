@@ -0,0 +1,98 @@
+"""Reloading of .clj files
+
+Every file main.requireClj loads is recorded in loadedFiles with the vars
+its forms depend on. Reloading a file compiles only the forms that changed
+and then reloads the other loaded files that depend on a var it redefined.
+"""
+
+from collections import OrderedDict
+
+import clojure.lang.codecache as codecache
+
+
+class LoadedFile(object):
+    """ What a loaded .clj file depends on, see reloadClj """
+    def __init__(self, sourcehash, namespaces, deps, refs):
+        self.sourcehash = sourcehash
+        self.namespaces = namespaces
+        self.deps = deps
+        self.refs = refs
+
+    def dependsOn(self, changes):
+        return bool(self.deps & changes.defined or self.refs & changes.resigned)
+
+
+class Changes(object):
+    """ Names ("ns/name") of the vars redefined by the forms that were
+        compiled while reloading. resigned are the ones whose definition
+        changed in a way that matters to code referring to them: new vars,
+        and vars that became or stopped being macros, inline, tagged or
+        dynamic. """
+    def __init__(self):
+        self.defined = set()
+        self.resigned = set()
+
+    def __nonzero__(self):
+        return bool(self.defined or self.resigned)
+
+
+# filename -> LoadedFile, in the order the files were first loaded
+loadedFiles = OrderedDict()
+
+
+def reloadClj(filename, reloadAll=False):
+    """ Loads filename again, then every other loaded file that depends on
+        a var it redefined. Only the forms that changed, or that depend on
+        something that did, are compiled. With reloadAll the loaded files
+        filename depends on are reloaded first when their source changed.
+        Returns the Changes that were made. """
+    from clojure.main import requireClj
+    changes = Changes()
+    reloaded = set([filename])
+    if reloadAll:
+        for dep in _upstream(filename):
+            if _sourceChanged(dep) or loadedFiles[dep].dependsOn(changes):
+                requireClj(dep, changes=changes)
+                reloaded.add(dep)
+    requireClj(filename, changes=changes)
+    for other in loadedFiles.keys():
+        if other not in reloaded and loadedFiles[other].dependsOn(changes):
+            requireClj(other, changes=changes)
+            reloaded.add(other)
+    return changes
+
+
+def reloadLib(name, reloadAll=False):
+    """ reloadClj for the file that defines the namespace name, this is
+        require's :reload and :reload-all """
+    for filename, loaded in loadedFiles.items():
+        if name in loaded.namespaces:
+            return reloadClj(filename, reloadAll)
+    return None
+
+
+def _upstream(filename):
+    """ The loaded files filename uses vars from, directly or not, in the
+        order they were loaded """
+    files = set()
+    pending = [filename]
+    while pending:
+        loaded = loadedFiles[pending.pop()]
+        used = set(x.split("/", 1)[0] for x in loaded.deps | loaded.refs)
+        for other, otherloaded in loadedFiles.items():
+            if other not in files and other != filename \
+               and otherloaded.namespaces & used:
+                files.add(other)
+                pending.append(other)
+    return [x for x in loadedFiles if x in files]
+
+
+def _sourceChanged(filename):
+    from clojure.main import VERSION
+    try:
+        with open(filename) as fl:
+            source = fl.read()
+    except IOError:
+        return False
+    return codecache.cacheKey(source, VERSION)[-1] != \
+           loadedFiles[filename].sourcehash
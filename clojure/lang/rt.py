@@ -119,54 +119,32 @@ def list(*args):
 
 
 def vector(*args):
-    from clojure.lang.persistentvector import EMPTY
-    c = EMPTY
-    for x in args:
-        c = c.cons(x)
-    return c
+    from clojure.lang.persistentvector import create
+    return create(*args)
 
 
 def map(*args):
-    from clojure.lang.persistenthashmap import EMPTY
+    from clojure.lang.persistenthashmap import EMPTY, fromList
     if len(args) == 0:
         return EMPTY
     if len(args) == 1:
         if isinstance(args[0], dict):
-            m = EMPTY
+            m = EMPTY.asTransient()
             for x in args[0]:
                 if x in m:
                     raise InvalidArgumentException("Duplicate key")
-                m = m.assoc(x, args[0][x])
-            return m
+                m.assoc(x, args[0][x])
+            return m.persistent()
         if fulfillsIndexable(args[0]):
             args = args[0]
-    m = EMPTY
-    for x in range(0, len(args), 2):
-        key = args[x]
-        value = args[x + 1]
-        m = m.assoc(key, value)
-    return m
+    return fromList(args)
 
 def set(*args):
-    from clojure.lang.persistenthashset import EMPTY
-    if len(args) == 0:
-        return EMPTY
-    if len(args) == 1:
-        if isinstance(args[0], dict):
-            m = EMPTY
-            for x in args[0]:
-                if x in m:
-                    raise InvalidArgumentException("Duplicate key")
-                m.impl = m.impl.assoc(x, args[0][x])
-            return m
-        if fulfillsIndexable(args[0]):
-            args = args[0]
-    m = EMPTY
-    for x in range(0, len(args), 2):
-        key = args[x]
-        value = args[x + 1]
-        m.impl = m.impl.assoc(key, value)
-    return m
+    from clojure.lang.persistenthashset import fromList
+    if len(args) == 1 and (isinstance(args[0], dict)
+                           or fulfillsIndexable(args[0])):
+        args = args[0]
+    return fromList(args)
 
 
 
@@ -205,6 +183,14 @@ def _extendIPrintableForManuals():
     protocols.writeAsString.extend(int, lambda obj, writer: writer.write(str(obj)))
     protocols.writeAsReplString.extend(int, lambda obj, writer: writer.write(str(obj)))
 
+    writeBool = lambda obj, writer: writer.write("true" if obj else "false")
+    protocols.writeAsString.extend(bool, writeBool)
+    protocols.writeAsReplString.extend(bool, writeBool)
+
+    from clojure.lang.printer import writeString
+    protocols.writeAsString.extendForTypes([str, unicode], lambda obj, writer: writer.write(obj))
+    protocols.writeAsReplString.extendForTypes([str, unicode], writeString)
+
 def _extendSeqableForManuals():
     from clojure.lang.indexableseq import create as createIndexableSeq
     from clojure.lang.persistentvector import PersistentVector
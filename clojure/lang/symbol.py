@@ -18,6 +18,7 @@ class Symbol(IObj, object):
             raise ArityException()
         if isinstance(self.ns, types.ModuleType):
             pass
+        self._hash = hash(self.name) ^ hash(self.ns)
 
     def getNamespace(self):
         return self.ns
@@ -36,7 +37,7 @@ class Symbol(IObj, object):
     def __eq__(self, other):
         if self is other:
             return True
-        if not isinstance(other, Symbol):
+        if not isinstance(other, Symbol) or self._hash != other._hash:
             return False
         return (self.ns == other.ns) and (self.name == other.name)
 
@@ -44,7 +45,14 @@ class Symbol(IObj, object):
         return not self == other
 
     def __hash__(self):
-        return hash(self.name) ^ hash(self.ns)
+        return self._hash
+
+    def __getstate__(self):
+        # hash(None) isn't the same from one process to the next
+        return (self._meta, self.ns, self.name)
+
+    def __setstate__(self, state):
+        Symbol.__init__(self, *state)
 
     def __repr__(self):
         if self.ns is None:
@@ -1,6 +1,5 @@
 from clojure.lang.cljexceptions import (AbstractMethodCall,
                                            InvalidArgumentException)
-from clojure.lang.mapentry import MapEntry
 import clojure.lang.rt as RT
 
 
@@ -10,10 +9,40 @@ def hashCombine(hash, seed):#FIXME - unused argument?
 
 
 def hasheq(o):
-    raise AbstractMethodCall()
+    """ The hash of o as a collection item, nil hashes to 0 """
+    if o is None:
+        return 0
+    return hash(o)
+
+
+def unhashedState(obj):
+    """ The __dict__ of a collection to pickle, without its cached hash: the
+        hashes of some items, such as symbols, aren't the same from one
+        process to the next """
+    state = obj.__dict__.copy()
+    state["_hash"] = -1
+    return state
+
+
+def hashOrdered(items):
+    """ The hash of a vector, list or seq of items: 31 * h + item for each
+        item from 1, kept to 32 bits """
+    h = 1
+    for x in items:
+        h = (31 * h + (0 if x is None else hash(x))) & 0xFFFFFFFF
+    return h
+
+
+def hashUnordered(items):
+    """ The hash of a set of items, their sum kept to 32 bits """
+    h = 0
+    for x in items:
+        h += 0 if x is None else hash(x)
+    return h & 0xFFFFFFFF
 
 
 def conjToAssoc(self, o):
+    from clojure.lang.mapentry import MapEntry
     if isinstance(o, MapEntry):
         return self.assoc(o.getKey(), o.getValue())
     if hasattr(o, "__getitem__") and hasattr(o, "__len__"):
@@ -36,4 +65,4 @@ def bitCount(i):
 
 
 def arrayCopy(src, srcPos, dest, destPos, length):
-    dest[destPos:length] = src[srcPos:length]
+    dest[destPos:destPos + length] = src[srcPos:srcPos + length]
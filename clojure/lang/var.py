@@ -9,7 +9,10 @@ from clojure.lang.persistenthashmap import EMPTY
 from clojure.lang.threadutil import ThreadLocal, currentThread
 from clojure.lang.symbol import symbol
 from clojure.lang.cljkeyword import keyword
+from clojure.lang.namespace import changed
 import persistentarraymap
+import new
+import weakref
 
 privateKey = keyword(symbol("private"))
 macrokey = keyword(symbol("macro"))
@@ -46,8 +49,8 @@ def popThreadBindings():
 
 class Var(ARef, Settable, IFn, IRef):
     def __init__(self, ns, sym, root=UKNOWN):
-        if root == UKNOWN:
-            self.root = Unbound(self)
+        if root is UKNOWN:
+            root = Unbound(self)
         self.ns = ns
         self.sym = sym
         self.threadBound = False
@@ -56,6 +59,7 @@ class Var(ARef, Settable, IFn, IRef):
         self.rev = 0
         self.dynamic = False
         self.public = True
+        self.links = None
         if isinstance(self.root, Unbound):
             self.rev += 1
 
@@ -96,8 +100,20 @@ class Var(ARef, Settable, IFn, IRef):
         oldroot = self.root
         self.root = root
         self.rev += 1
+        # whether the var holds a macro may have changed
+        changed(self.ns)
+        if self.links and oldroot is not root:
+            for fn in list(self.links):
+                fn.func_code = relinkCode(fn.func_code, fn.__linked__, self)
         return self
 
+    def link(self, fn):
+        """ Records that fn embeds the root of this var as a constant, fn is
+            relinked when the root changes """
+        if self.links is None:
+            self.links = weakref.WeakSet()
+        self.links.add(fn)
+
     def __call__(self, *args, **kw):
         """Exists for Python interop, don't use in clojure code"""
         return self.deref()(*args, **kw)
@@ -117,10 +133,19 @@ class Var(ARef, Settable, IFn, IRef):
 
     def setMeta(self, meta):
         self._meta = meta
+        changed(self.ns)
         if self._meta and self._meta[STATIC_KEY]:
             self.setDynamic(False)
         return self
 
+    def alterMeta(self, fn, x, y):
+        ARef.alterMeta(self, fn, x, y)
+        changed(self.ns)
+
+    def resetMeta(self, meta):
+        ARef.resetMeta(self, meta)
+        changed(self.ns)
+
     def setMacro(self):
         self.alterMeta(lambda x, y, z: x.assoc(y, z), macrokey, True)
 
@@ -132,6 +157,56 @@ class Var(ARef, Settable, IFn, IRef):
                  if self.sym is not None else "--unnamed--") + ">")
 
 
+def arityFor(fn, argc):
+    """ The function a call to fn with argc arguments ends up in, or None
+        if fn doesn't dispatch on the argument count """
+    arities = getattr(fn, "__arities__", None)
+    if arities is None:
+        return None
+    f = arities.get(argc)
+    if f is not None:
+        return f
+    for key in arities:
+        if key < 0 and argc >= -1 - key:
+            return arities[key]
+    return None
+
+
+def linkedConstant(root, argc):
+    """ The constant a link to root embeds. A call with argc arguments embeds
+        the arity of root it ends up in. """
+    if argc is not None:
+        arity = arityFor(root, argc)
+        if arity is not None:
+            return arity
+    return root
+
+
+def relinkCode(code, links, var=None):
+    """ Returns code with the constant slots of links refreshed from the
+        roots of their vars. links are (var, slot, argc) triples, only those
+        of var are refreshed if it is given. """
+    consts = list(code.co_consts)
+    for v, slot, argc in links:
+        if var is None or v is var:
+            consts[slot] = linkedConstant(v.root, argc)
+    return new.code(code.co_argcount, code.co_nlocals, code.co_stacksize,
+                    code.co_flags, code.co_code, tuple(consts),
+                    code.co_names, code.co_varnames, code.co_filename,
+                    code.co_name, code.co_firstlineno, code.co_lnotab,
+                    code.co_freevars, code.co_cellvars)
+
+
+def linkFunction(fn, links):
+    """ fn embeds the roots of vars in the constant slots of links, keep them
+        up to date when any of the vars is rebound """
+    if not links:
+        return
+    fn.__linked__ = tuple(links)
+    for v, slot, argc in links:
+        v.link(fn)
+
+
 def var(root=UKNOWN):
     if root is not UKNOWN:
         return Var(None, None, root)
@@ -2,7 +2,8 @@
 
 import sys
 import os.path
-import traceback
+import gc
+import atexit
 
 from clojure.lang.symbol import symbol
 from clojure.lang.var import Var, intern as internVar
@@ -30,37 +31,132 @@ from clojure.lang.lispreader import read
 from clojure.lang.fileseq import StringReader
 from clojure.lang.globals import currentCompiler
 import clojure.lang.rt as RT
-from clojure.lang.compiler import Compiler
-from clojure.lang.symbol import Symbol, symbol
-import cPickle
+import clojure.lang.compiler as compiler
+from clojure.lang.compiler import Compiler, compilerOptions, \
+     compileSignature
+import clojure.lang.codecache as codecache
+from clojure.lang.reload import LoadedFile, Changes, loadedFiles
+from clojure.lang.aot import aotCompile
+import clojure.lang.peephole as peephole
+import clojure.lang.compileprofile as compileprofile
 
 VERSION = "0.1.0h"
 
+if peephole.reportSizes:
+    atexit.register(peephole.report)
+if compileprofile.enabled:
+    atexit.register(compileprofile.report)
+if compiler.warnOnReflection:
+    atexit.register(compiler.reportReflection)
 
 
-def requireClj(filename, stopafter=None):
+
+def _varName(v):
+    return str(symbol(v.ns.__name__, v.sym.name))
+
+
+def requireClj(filename, stopafter=None, forcecompile=False, changes=None):
+    """ Loads filename. Forms are taken from the code cache when it is up to
+        date. Otherwise only the forms whose source changed, or that depend
+        on a var such a form redefined, are compiled. changes is the Changes
+        made by reloading other files, the vars this load redefines are
+        added to it. """
     with open(filename) as fl:
-        r = StringReader(fl.read())
+        source = fl.read()
 
     RT.init()
     comp = Compiler()
     comp.setFile(filename)
     currentCompiler.set(comp)
+    if changes is None:
+        changes = Changes()
+
+    key = codecache.cacheKey(source, VERSION, compilerOptions())
+    # warnings are only found while compiling
+    usecache = stopafter is None and not forcecompile \
+               and not compiler.warnOnReflection
+    ran = 0
+    if usecache and not changes:
+        ran = loadCached(comp, filename, key)
+        if ran is None:
+            return
 
-    #o = open(filename+".cljc", "w")
+    cache = None
+    index = []
+    # a cache that broke off half way isn't used again
+    if usecache and not ran:
+        cache = codecache.CacheReader(filename, key)
+        if cache.isCompatible():
+            index = cache.readIndex()
+    cached = 0
+
+    writer = None
+    if forcecompile or (stopafter is None and not sys.dont_write_bytecode):
+        writer = codecache.CacheWriter(filename, key)
+
+    namespaces, deps, refs = set(), set(), set()
+    r = StringReader(source)
     try:
         while True:
-            s = read(r, False, None, True)
+            start, line = r.idx + 1, r.line
+            with compileprofile.READ:
+                s = read(r, False, None, True)
             if s is None:
                 break
-            #cPickle.dump(s, o)
             try:
-                res = comp.compile(s)
-                comp.executeCode(res)
+                formhash = codecache.formHash(source[start:r.idx + 1])
+                match = _findCached(index, cached, formhash, changes)
+                if match is not None:
+                    with compileprofile.CACHE:
+                        while cached < match:
+                            cache.skip()
+                            cached += 1
+                        ns, defs, code = cache.next()
+                        cached += 1
+                    comp.ns = ns
+                    entry = index[match]
+                    code = codecache.shiftLines(code, line - entry.line)
+                    entry = codecache.IndexEntry(formhash, line, entry.deps,
+                                                 entry.refs)
+                    signatures = ()
+                else:
+                    del comp.defs[:]
+                    del comp.signatures[:]
+                    comp.deps.clear()
+                    comp.refs.clear()
+                    with compileprofile.CODEGEN:
+                        res = comp.compile(s)
+                    if res == []:
+                        code = None
+                    else:
+                        code = comp.assemble(res)
+                    defs = list(comp.defs)
+                    changes.defined.update(map(_varName, defs))
+                    signatures = list(comp.signatures)
+                    entry = codecache.IndexEntry(formhash, line,
+                                                 tuple(comp.deps),
+                                                 tuple(comp.refs))
+                if code is not None:
+                    namespaces.add(comp.getNS().__name__)
+                    deps.update(entry.deps)
+                    refs.update(entry.refs)
+                    if writer is not None:
+                        with compileprofile.CACHE:
+                            writer.add(comp.getNS(), defs, code, entry)
+                    if ran:
+                        # loadCached already ran this form
+                        ran -= 1
+                    else:
+                        with compileprofile.RUN:
+                            eval(code, comp.getNS().__dict__)
+                changes.resigned.update(_varName(v) for v, old in signatures
+                                        if compileSignature(v) != old)
                 if stopafter is not None:
                     if hasattr(comp.getNS(), stopafter):
                         break
             except Exception as exp:
+                if writer is not None:
+                    writer.abort()
                 print s, filename
                 raise
 
@@ -75,8 +171,79 @@ def requireClj(filename, stopafter=None):
                     break
     except IOError as e:
         pass
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if stopafter is None:
+        loadedFiles[filename] = LoadedFile(key[-1], namespaces, deps, refs)
+    if writer is not None:
+        return writer.commit()
+    return False
+
+def _findCached(index, start, formhash, changes):
+    """ Index of the first cached form from start on that has the source
+        formhash and doesn't depend on anything in changes, or None """
+    for idx in range(start, len(index)):
+        entry = index[idx]
+        if entry.hash == formhash:
+            if changes.defined.intersection(entry.deps) or \
+               changes.resigned.intersection(entry.refs):
+                return None
+            return idx
+    return None
+
+def loadCached(comp, filename, key):
+    """ Runs the forms of filename from its cache file. Returns None once
+        all of them ran. Otherwise the cache is unusable or a record couldn't
+        be read, the number of forms that ran before is returned and the
+        file has to be compiled from the form after them on. """
+    cache = codecache.CacheReader(filename, key)
+    if not cache.isValid():
+        return 0
+    try:
+        index = cache.readIndex()
+    except Exception:
+        cache.close()
+        return 0
+    ran = 0
+    namespaces = set()
+    # unpickling creates lots of objects but no garbage, so don't let the
+    # cycle collector walk them over and over again
+    gcenabled = gc.isenabled()
+    gc.disable()
+    try:
+        records = iter(cache)
+        while True:
+            try:
+                with compileprofile.CACHE:
+                    ns, code = next(records)
+            except StopIteration:
+                break
+            except Exception:
+                cache.close()
+                return ran
+            comp.ns = ns
+            namespaces.add(ns.__name__)
+            with compileprofile.RUN:
+                eval(code, ns.__dict__)
+            ran += 1
+    finally:
+        if gcenabled:
+            gc.enable()
+    deps, refs = set(), set()
+    for entry in index:
+        deps.update(entry.deps)
+        refs.update(entry.refs)
+    loadedFiles[filename] = LoadedFile(key[-1], namespaces, deps, refs)
+    return None
 
-    #o.close()
+def buildCore():
+    """ Compiles clojure/core.clj ahead of time and writes the image that
+        later launches load instead of compiling core again. Returns True if
+        the image was written. """
+    return requireClj(os.path.join(os.path.dirname(__file__), "core.clj"),
+                      forcecompile=True)
 
 #requireClj(os.path.dirname(__file__) + "/core.clj")
 import clojure.core
@@ -89,6 +256,19 @@ def main():
     if not sys.argv[1:]:
         import clojure.repl
         clojure.repl.run_repl(comp)
+    elif sys.argv[1:] == ["--build-core"]:
+        if not buildCore():
+            print "could not write the clojure.core image"
+            sys.exit(1)
+    elif sys.argv[1] == "--aot":
+        if len(sys.argv) != 3 or not os.path.isdir(sys.argv[2]):
+            print "usage: clojurepy --aot <dir>"
+            sys.exit(2)
+        failed = aotCompile(sys.argv[2])
+        for filename in sorted(failed):
+            print >> sys.stderr, "%s: %s" % (filename, failed[filename])
+        if failed:
+            sys.exit(1)
     else:
         for x in sys.argv[1:]:
             if x.endswith('.clj'):
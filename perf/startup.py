@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Measures time-to-first-eval of a fresh interpreter
+
+A cold start compiles clojure/core.clj from source, a warm start loads the
+precompiled core image (clojure/core.cljc, see `clojure.py --build-core`).
+
+    python perf/startup.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMAGE = os.path.join(ROOT, "clojure", "core.cljc")
+
+FIRST_EVAL = """
+import clojure.main
+from clojure.lang.compiler import Compiler
+from clojure.lang.fileseq import StringReader
+from clojure.lang.lispreader import read
+from clojure.lang.symbol import symbol
+comp = Compiler()
+comp.setNS(symbol("user"))
+assert comp.executeCode(comp.compile(read(StringReader("(+ 1 2)"),
+                                          True, None, True))) == 3
+"""
+
+
+def timeStart(env):
+    start = time.time()
+    subprocess.check_call([sys.executable, "-c", FIRST_EVAL], cwd=ROOT,
+                          env=env, stdout=open(os.devnull, "w"))
+    return time.time() - start
+
+
+def report(name, times):
+    print "%-5s min %7.1f ms  avg %7.1f ms" % (name, min(times) * 1000,
+                                               sum(times) / len(times) * 1000)
+
+
+def main():
+    runs = int(sys.argv[1]) if sys.argv[1:] else 5
+
+    env = dict(os.environ)
+    # keep the cold runs from writing the image themselves
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    aside = IMAGE + ".startup-bench"
+    if os.path.exists(IMAGE):
+        os.rename(IMAGE, aside)
+    try:
+        cold = [timeStart(env) for x in range(runs)]
+    finally:
+        if os.path.exists(aside):
+            os.rename(aside, IMAGE)
+
+    subprocess.check_call([sys.executable, "clojure.py", "--build-core"],
+                          cwd=ROOT, stdout=open(os.devnull, "w"))
+    warm = [timeStart(env) for x in range(runs)]
+
+    report("cold", cold)
+    report("warm", warm)
+
+
+if __name__ == "__main__":
+    main()
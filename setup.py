@@ -4,10 +4,20 @@ from os.path import exists
 try:
     # Use setup() from setuptools(/distribute) if available
     from setuptools import setup
+    from setuptools.command.build_py import build_py as _build_py
 except ImportError:
     from distutils.core import setup
+    from distutils.command.build_py import build_py as _build_py
 
-from clojure.main import VERSION
+from clojure.main import VERSION, buildCore
+
+
+class build_py(_build_py):
+    """ Ships a precompiled clojure.core image (core.cljc) with the package """
+    def run(self):
+        if not buildCore():
+            raise SystemExit("could not write the clojure.core image")
+        _build_py.run(self)
 
 
 setup(name='clojure_py',
@@ -15,7 +25,7 @@ setup(name='clojure_py',
       author='Timothy Baldridge',
       author_email='tbaldridge@gmail.com',
       packages=['clojure', 'clojure/lang', 'clojure/util'],
-      package_data={'clojure': ['core.clj']},
+      package_data={'clojure': ['core.clj', 'core.cljc', 'edn.clj']},
       scripts=[],
       url='https://github.com/halgari/clojure-py',
       license='',
@@ -23,4 +33,5 @@ setup(name='clojure_py',
       long_description=open('README.md').read() if exists("README.md") else "",
       entry_points=dict(console_scripts=['clojurepy=clojure.main:main']),
       install_requires=[],
+      cmdclass={'build_py': build_py},
 )
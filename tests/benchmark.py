@@ -0,0 +1,30 @@
+"""Shared by the tests/*-benchmark.py scripts
+
+Importing it puts the root of the repository on sys.path, so the scripts
+run against the tree they are in.
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def best(fn, arg, runs):
+    """ The fewest seconds fn(arg) took in runs calls """
+    secs = None
+    for x in range(runs):
+        start = time.time()
+        fn(arg)
+        took = time.time() - start
+        secs = took if secs is None else min(secs, took)
+    return secs
+
+
+def sizeAndRuns(size=1000000, runs=3):
+    """ The size and runs given on the command line, or their defaults """
+    size = int(sys.argv[1]) if sys.argv[1:] else size
+    runs = int(sys.argv[2]) if sys.argv[2:] else runs
+    return size, runs
@@ -0,0 +1,328 @@
+import cPickle
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+from textwrap import dedent
+import unittest
+
+import clojure.main as main
+from clojure.main import requireClj
+from clojure.lang.reload import loadedFiles, reloadClj
+from clojure.lang.aot import namespaceDeps, namespaceGraph, aotCompile
+import clojure.lang.codecache as codecache
+from clojure.lang.cljkeyword import keyword
+from clojure.lang.symbol import symbol
+
+
+class CodeCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dont_write_bytecode = sys.dont_write_bytecode
+        sys.dont_write_bytecode = False
+
+    def tearDown(self):
+        sys.dont_write_bytecode = self.dont_write_bytecode
+        shutil.rmtree(self.dir)
+        for filename in loadedFiles.keys():
+            if filename.startswith(self.dir):
+                del loadedFiles[filename]
+        for name in ["cachetest", "cachetest2", "cachetest3"]:
+            sys.modules.pop(name, None)
+
+    def writeClj(self, name, source):
+        filename = os.path.join(self.dir, name + ".clj")
+        with open(filename, "w") as f:
+            f.write(dedent(source))
+        return filename
+
+    def testStripCode(self):
+        code = compile("x = (1, 'a', None)", "<test>", "exec")
+        data, externals = codecache._stripCode(code)
+        self.assertEqual(externals, ())
+        self.assertEqual(codecache._rebuildCode(data, externals).co_consts,
+                         code.co_consts)
+
+    def testKey(self):
+        self.assertEqual(codecache.cacheKey("(+ 1 2)", "1"),
+                         codecache.cacheKey("(+ 1 2)", "1"))
+        self.assertNotEqual(codecache.cacheKey("(+ 1 2)", "1"),
+                            codecache.cacheKey("(+ 1 3)", "1"))
+        self.assertNotEqual(codecache.cacheKey("(+ 1 2)", "1"),
+                            codecache.cacheKey("(+ 1 2)", "2"))
+
+    def testRoundTrip(self):
+        filename = self.writeClj("cachetest", """
+            (ns cachetest)
+            (def ^{:doc "a value"} x [1 2 {:a 3}])
+            (defn add-x [y] (+ (first x) y))
+            (defmacro twice [form] `(do ~form ~form))
+            (def ^:dynamic *d* :kw)
+            """)
+        requireClj(filename)
+        self.assertTrue(os.path.exists(codecache.cacheFileFor(filename)))
+        del sys.modules["cachetest"]
+
+        requireClj(filename)
+        ns = sys.modules["cachetest"]
+        self.assertEqual(getattr(ns, "add-x").deref()(4), 5)
+        self.assertEqual(ns.x.meta()[keyword(symbol("doc"))], "a value")
+        self.assertTrue(getattr(ns, "*d*").isDynamic())
+        self.assertTrue(getattr(ns, "*d*").deref()
+                        is keyword(symbol("kw")))
+
+        # macros loaded from the cache still expand
+        user = self.writeClj("cachetest2", """
+            (ns cachetest2)
+            (require 'cachetest)
+            (def y (cachetest/twice (cachetest/add-x 1)))
+            """)
+        sys.path.insert(0, self.dir)
+        try:
+            requireClj(user)
+        finally:
+            sys.path.remove(self.dir)
+        self.assertEqual(sys.modules["cachetest2"].y.deref(), 2)
+
+    def testStaleCache(self):
+        filename = self.writeClj("cachetest", """
+            (ns cachetest)
+            (def x 1)
+            """)
+        requireClj(filename)
+        del sys.modules["cachetest"]
+        self.writeClj("cachetest", """
+            (ns cachetest)
+            (def x 2)
+            """)
+        requireClj(filename)
+        self.assertEqual(sys.modules["cachetest"].x.deref(), 2)
+
+    def testBrokenRecordResumes(self):
+        hits = types.ModuleType("cachetest_hits")
+        hits.hits = []
+        sys.modules["cachetest_hits"] = hits
+        filename = self.writeClj("cachetest", """
+            (ns cachetest)
+            (.append cachetest_hits/hits 1)
+            (def x 2)
+            (.append cachetest_hits/hits 3)
+            """)
+        try:
+            requireClj(filename)
+            self.assertEqual(hits.hits, [1, 3])
+            del hits.hits[:]
+            sys.modules.pop("cachetest")
+            read = codecache.CacheReader.next
+            calls = []
+            def next(reader):
+                calls.append(reader)
+                if len(calls) == 3:
+                    raise cPickle.UnpicklingError("broken record")
+                return read(reader)
+            codecache.CacheReader.next = next
+            try:
+                requireClj(filename)
+            finally:
+                codecache.CacheReader.next = read
+            self.assertEqual(len(calls), 3)
+            self.assertEqual(hits.hits, [1, 3])
+            self.assertEqual(sys.modules["cachetest"].x.deref(), 2)
+        finally:
+            del sys.modules["cachetest_hits"]
+
+    def testUnserializable(self):
+        filename = self.writeClj("cachetest", """
+            (ns cachetest)
+            (def x 1)
+            (defmacro anonymous-type []
+              (py/type "Anonymous" (py/tuple [py/object]) (py/dict)))
+            (def y (anonymous-type))
+            """)
+        requireClj(filename)
+        self.assertFalse(os.path.exists(codecache.cacheFileFor(filename)))
+        self.assertEqual(sys.modules["cachetest"].x.deref(), 1)
+
+    def testReloadCompilesChangedForms(self):
+        source = """
+            (ns cachetest)
+            (def expansions (py/list))
+            (defmacro counted [x] (.append expansions x) x)
+            (def a (counted 1))
+            (defn f [] (counted 2))
+            """
+        filename = self.writeClj("cachetest", source)
+        requireClj(filename)
+        ns = sys.modules["cachetest"]
+        self.assertEqual(ns.expansions.deref(), [1, 2])
+
+        self.writeClj("cachetest", source.replace("(counted 2)", "(counted 3)"))
+        changes = reloadClj(filename)
+        self.assertEqual(changes.defined, set(["cachetest/f"]))
+        self.assertEqual(ns.expansions.deref(), [3])
+        self.assertEqual(ns.a.deref(), 1)
+        self.assertEqual(ns.f.deref()(), 3)
+
+    def testReloadFollowsMacros(self):
+        filename = self.writeClj("cachetest", """
+            (ns cachetest)
+            (defmacro twice [x] `(+ ~x ~x))
+            (def a (twice 1))
+            (def b 2)
+            """)
+        user = self.writeClj("cachetest3", """
+            (ns cachetest3)
+            (def c (cachetest/twice 5))
+            """)
+        requireClj(filename)
+        requireClj(user)
+        self.assertEqual(sys.modules["cachetest3"].c.deref(), 10)
+
+        self.writeClj("cachetest", """
+            (ns cachetest)
+            (defmacro twice [x] `(* 2 ~x 10))
+            (def a (twice 1))
+            (def b 2)
+            """)
+        changes = reloadClj(filename)
+        self.assertEqual(sys.modules["cachetest"].a.deref(), 20)
+        self.assertEqual(sys.modules["cachetest3"].c.deref(), 100)
+        self.assertFalse("cachetest/b" in changes.defined)
+        self.assertTrue("cachetest3/c" in changes.defined)
+
+    def testReloadResignsMacros(self):
+        filename = self.writeClj("cachetest", """
+            (ns cachetest)
+            (defn f [] 1)
+            (defmacro m [] 2)
+            """)
+        user = self.writeClj("cachetest3", """
+            (ns cachetest3)
+            (defn g [] (cachetest/f))
+            """)
+        requireClj(filename)
+        requireClj(user)
+        self.assertEqual(sys.modules["cachetest3"].g.deref()(), 1)
+
+        self.writeClj("cachetest", """
+            (ns cachetest)
+            (defmacro f [] 5)
+            (defmacro m [] 2)
+            """)
+        changes = reloadClj(filename)
+        self.assertEqual(changes.resigned, set(["cachetest/f"]))
+        self.assertEqual(sys.modules["cachetest3"].g.deref()(), 5)
+
+    def testReloadKeepsNewMeta(self):
+        source = """
+            (ns cachetest)
+            (def ^{:doc "old"} x 1)
+            (def y 2)
+            """
+        filename = self.writeClj("cachetest", source)
+        requireClj(filename)
+        self.writeClj("cachetest", source.replace('"old"', '"new"'))
+        reloadClj(filename)
+        ns = sys.modules["cachetest"]
+        self.assertEqual(ns.x.meta()[keyword(symbol("doc"))], "new")
+        self.assertEqual(ns.y.deref(), 2)
+
+    def testReloadMovesLines(self):
+        source = """
+            (ns cachetest)
+            (defn f [] (throw (py/Exception)))
+            """
+        filename = self.writeClj("cachetest", source)
+        requireClj(filename)
+        self.writeClj("cachetest", "\n\n\n" + dedent(source))
+        before = sys.modules["cachetest"].f.deref().func_code.co_firstlineno
+        changes = reloadClj(filename)
+        self.assertEqual(changes.defined, set())
+        after = sys.modules["cachetest"].f.deref().func_code.co_firstlineno
+        self.assertEqual(after - before, 3)
+
+    def testNamespaceDeps(self):
+        filename = self.writeClj("cachetest", """
+            (ns cachetest
+              (:require [cachetest2 :as c2]
+                        (lib a b))
+              (:use cachetest3))
+            (require 'other)
+            """)
+        self.assertEqual(namespaceDeps(filename),
+                         ("cachetest", ["cachetest2", "lib.a", "lib.b",
+                                        "cachetest3", "other"]))
+
+    def testAotCompile(self):
+        first = self.writeClj("cachetest", """
+            (ns cachetest)
+            (defmacro twice [x] `(* 2 ~x))
+            """)
+        second = self.writeClj("cachetest2", """
+            (ns cachetest2 (:require cachetest))
+            (def a (cachetest/twice 2))
+            """)
+        third = self.writeClj("cachetest3", """
+            (ns cachetest3 (:require cachetest))
+            (def b (cachetest/twice 3))
+            """)
+        self.assertEqual(namespaceGraph(self.dir),
+                         {first: set(), second: set([first]),
+                          third: set([first])})
+        self.assertEqual(aotCompile(self.dir, 2), {})
+        for filename in [first, second, third]:
+            self.assertTrue(os.path.exists(codecache.cacheFileFor(filename)))
+        self.assertFalse("cachetest2" in sys.modules)
+
+        loaded = []
+        loadCached = main.loadCached
+        def recordLoad(comp, filename, key):
+            ran = loadCached(comp, filename, key)
+            loaded.append((filename, ran))
+            return ran
+        main.loadCached = recordLoad
+        sys.path.insert(0, self.dir)
+        try:
+            requireClj(second)
+        finally:
+            sys.path.remove(self.dir)
+            main.loadCached = loadCached
+        self.assertEqual(sys.modules["cachetest2"].a.deref(), 4)
+        # both files ran from their cache, None means every form did
+        self.assertEqual(sorted(loaded), [(first, None), (second, None)])
+
+    def testAotCompileReportsFailures(self):
+        first = self.writeClj("cachetest", """
+            (ns cachetest)
+            (undefined-fn)
+            """)
+        second = self.writeClj("cachetest2", """
+            (ns cachetest2 (:require cachetest))
+            """)
+        failed = aotCompile(self.dir, 1)
+        self.assertEqual(sorted(failed), [first, second])
+        self.assertEqual(failed[second], "depends on " + first)
+
+    def testAotCompileSurvivesExit(self):
+        first = self.writeClj("cachetest", """
+            (ns cachetest)
+            (sys/exit 1)
+            """)
+        second = self.writeClj("cachetest2", """
+            (ns cachetest2)
+            """)
+        failed = aotCompile(self.dir, 1)
+        self.assertEqual(sorted(failed), [first])
+        self.assertTrue("SystemExit" in failed[first])
+
+    def testAotCompileTimeout(self):
+        first = self.writeClj("cachetest", """
+            (ns cachetest)
+            (time/sleep 30)
+            """)
+        start = time.time()
+        failed = aotCompile(self.dir, 1, 1)
+        self.assertEqual(failed, {first: "timed out after 1 seconds"})
+        self.assertTrue(time.time() - start < 20)
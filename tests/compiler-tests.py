@@ -1,16 +1,25 @@
+import gc
 from itertools import chain, repeat
 import pprint
+import sys
 from textwrap import dedent
 import unittest
+import weakref
 
 from clojure.main import requireClj
 from clojure.lang.compiler import Compiler
 from clojure.lang.fileseq import StringReader
 from clojure.lang.globals import currentCompiler
-from clojure.lang.lispreader import read
+from clojure.lang.lispreader import read, lineOf
 import clojure.lang.rt as RT
+import clojure.lang.compiler as compiler
+import clojure.lang.namespace as namespace
+import clojure.lang.peephole as peephole
 from clojure.lang.symbol import symbol
+from clojure.lang.cljkeyword import keyword
+from clojure.lang.cljexceptions import ArityException, CompilerException
 from clojure.util.byteplay import Code, Label, SetLineno
+import clojure.util.byteplay as byteplay
 
 
 requireClj('./clojure/core.clj')
@@ -26,13 +35,24 @@ except AttributeError:
         return ret
 
 
-class NonOverloadedFunctions(unittest.TestCase):
+class CompilerTestCase(unittest.TestCase):
+    """ Compiles and runs forms in a fresh compiler set to namespace """
+    namespace = 'clojure.core'
+
     def setUp(self):
         RT.init()
         self.comp = Compiler()
         currentCompiler.set(self.comp)
-        self.comp.setNS(symbol('clojure.core'))
+        self.comp.setNS(symbol(self.namespace))
+
+    def eval(self, code):
+        r = StringReader(code)
+        s = read(r, True, None, True)
+        res = self.comp.compile(s)
+        return self.comp.executeCode(res)
 
+
+class NonOverloadedFunctions(CompilerTestCase):
     def testZeroArguments(self):
         actual = self.compileActual('(defn abc [] 2)')
         expected = self.compileExpected('''
@@ -58,27 +78,16 @@ class NonOverloadedFunctions(unittest.TestCase):
             pprint.pprint(items)
 
     def testMultipleArguments(self):
-        actual = self.compileActual('(defn abc ([x] x) ([x y] y))')
+        # every arity is compiled to a function of its own
+        r = StringReader('(defn abc ([x] x) ([x y] y))')
+        fn = self.comp.executeCode(self.comp.compile(read(r, True, None, True)))
+        actual = [c for c in Code.from_code(fn.deref().__arities__[2].func_code).code[:]
+                  if c[0] is not SetLineno]
         expected = self.compileExpected('''
-            def abc(*__argsv__):
-                if __argsv__.__len__() == 1:
-                    x = __argsv__[0]
-                    return x
-                elif __argsv__.__len__() == 2:
-                    x = __argsv__[0]
-                    y = __argsv__[1]
-                    return y
-                raise Exception()''')
-        # There's a slight different between clojure-py's compiled code and
-        # Python's: clojure-py produces (LOAD_CONST, <type
-        # 'exceptions.Exception'>) while Python produces (LOAD_CONST,
-        # 'Exception'). Just ignore it; it's not what we're testing here.
-
-        # Also the last to two bytecodes generated by Python are to load None
-        # and return it, which isn't necessary after raising an exception.
+            def abc(x, y):
+                return y''')
         items = [(a == e, a, e)
-                 for a, e in self.zipActualExpected(actual, expected[:-2])
-                 if e[1] != 'Exception']
+                 for a, e in self.zipActualExpected(actual, expected)]
         try:
             assert all(item[0] for item in items)
         except AssertionError:
@@ -105,13 +114,7 @@ class NonOverloadedFunctions(unittest.TestCase):
                 if c[0] is not SetLineno]
 
 
-class TruthinessTests(unittest.TestCase):
-    def setUp(self):
-        RT.init()
-        self.comp = Compiler()
-        currentCompiler.set(self.comp)
-        self.comp.setNS(symbol('clojure.core'))
-
+class TruthinessTests(CompilerTestCase):
     def testTrue(self):
         self.assertTrue(self.eval('(if true true false)'))
 
@@ -139,27 +142,405 @@ class TruthinessTests(unittest.TestCase):
     def testFalse(self):
         self.assertFalse(self.eval('(if false true false)'))
 
-    def eval(self, code):
-        r = StringReader(code)
-        s = read(r, True, None, True)
-        res = self.comp.compile(s)
-        return self.comp.executeCode(res)
-
-
-class PyNamespaceTests(unittest.TestCase):
-    def setUp(self):
-        RT.init()
-        self.comp = Compiler()
-        currentCompiler.set(self.comp)
-        self.comp.setNS(symbol('clojure.core'))
 
+class PyNamespaceTests(CompilerTestCase):
     def testBuiltinsNamespaced(self):
         self.assertEqual(self.eval('(py/str [1 2 3])'), '[1 2 3]')
         self.assertEqual(self.eval('(py/list "abc")'), ['a', 'b', 'c'])
         self.assertEqual(self.eval('((py/getattr "namespace" "__len__"))'), 9)
 
-    def eval(self, code):
-        r = StringReader(code)
-        s = read(r, True, None, True)
-        res = self.comp.compile(s)
-        return self.comp.executeCode(res)
+
+class DirectLinkingTests(CompilerTestCase):
+    namespace = 'clojure.directlinking-test'
+
+    def setUp(self):
+        self.directLinking = compiler.directLinking
+        compiler.directLinking = True
+        CompilerTestCase.setUp(self)
+
+    def tearDown(self):
+        compiler.directLinking = self.directLinking
+
+    def testRootIsConstant(self):
+        self.eval('(defn linked-inc [x] (py.bytecode/BINARY_ADD x 1))')
+        self.eval('(defn linked-caller [x] (linked-inc x))')
+        inc = self.eval('linked-inc')
+        caller = self.eval('linked-caller')
+        self.assertTrue(inc in caller.func_code.co_consts)
+        self.assertEqual(caller(1), 2)
+
+    def testRedefinitionRelinks(self):
+        self.eval('(defn relinked-inc [x] (py.bytecode/BINARY_ADD x 1))')
+        self.eval('(defn relinked-caller [x] (relinked-inc x))')
+        self.eval('(defn relinked-inc [x] (py.bytecode/BINARY_ADD x 2))')
+        self.assertEqual(self.eval('(relinked-caller 1)'), 3)
+
+    def testForwardReference(self):
+        self.eval('(def forward-fn)')
+        self.eval('(defn forward-caller [] (forward-fn))')
+        self.eval('(defn forward-fn [] 42)')
+        self.assertEqual(self.eval('(forward-caller)'), 42)
+
+    def testCallsLinkToArity(self):
+        self.eval('(defn arity-fn ([] 0) ([x] 1) ([x y & more] :more))')
+        self.eval('(defn arity-caller [] [(arity-fn 1) (arity-fn 1 2 3)])')
+        fn = self.eval('arity-fn')
+        consts = self.eval('arity-caller').func_code.co_consts
+        self.assertTrue(fn.__arities__[1] in consts)
+        self.assertTrue(fn.__arities__[-3] in consts)
+        self.assertFalse(fn in consts)
+        self.assertEqual(self.eval('(arity-caller)'),
+                         self.eval('[1 :more]'))
+
+    def testRedefinitionRelinksArity(self):
+        self.eval('(defn rearity-fn ([x] 1) ([x & more] :more))')
+        self.eval('(defn rearity-caller [] [(rearity-fn 1) (rearity-fn 1 2)])')
+        self.eval('(defn rearity-fn ([x y] 2) ([x & more] :more))')
+        self.assertEqual(self.eval('(rearity-caller)'),
+                         self.eval('[:more 2]'))
+
+    def testRedefinitionKeepsSharedRoot(self):
+        self.eval('(defn shared-a [] 1)')
+        self.eval('(def shared-b shared-a)')
+        self.eval('(defn shared-caller [] [(shared-a) (shared-b)])')
+        self.eval('(defn shared-a [] 2)')
+        self.assertEqual(self.eval('(shared-caller)'), self.eval('[2 1]'))
+
+    def testRedefinitionKeepsSharedArity(self):
+        self.eval('(defn shared-arity ([] 0) ([x] 1))')
+        self.eval('(def shared-alias shared-arity)')
+        self.eval('(defn shared-arity-caller [] '
+                  '[(shared-arity 1) (shared-alias 1)])')
+        self.eval('(defn shared-arity ([] 0) ([x] 2))')
+        self.assertEqual(self.eval('(shared-arity-caller)'),
+                         self.eval('[2 1]'))
+
+    def testDynamicVarsAreNotLinked(self):
+        self.eval('(def ^:dynamic *linked-dynamic* 1)')
+        self.eval('(defn read-dynamic [] *linked-dynamic*)')
+        self.assertTrue(getattr(self.comp.getNS(),
+                                '*linked-dynamic*').isDynamic())
+        self.assertEqual(self.eval('(read-dynamic)'), 1)
+        self.eval('(def ^:dynamic *linked-dynamic* 2)')
+        self.assertEqual(self.eval('(read-dynamic)'), 2)
+
+
+class ExpansionLineTests(CompilerTestCase):
+    namespace = 'clojure.expansion-line-test'
+
+    def testMacroExpansion(self):
+        self.eval('(defmacro bad-if [] (list (quote if)))')
+        try:
+            self.eval('\n\n(bad-if)')
+        except CompilerException as e:
+            self.assertTrue(str(e).endswith(" at 3"))
+        else:
+            self.fail("CompilerException not raised")
+
+    def testInlineExpansion(self):
+        form = read(StringReader('\n(inc x)'), True, None, True)
+        expansion = compiler.inlineExpand(self.comp, form)
+        self.assertEqual(lineOf(expansion), 2)
+
+
+class InlineTests(CompilerTestCase):
+    namespace = 'clojure.inline-test'
+
+    def testArithmeticIsInlined(self):
+        fn = self.eval('(fn [x y] (+ (inc x) y 3))')
+        ops = [op for op, arg in Code.from_code(fn.func_code).code]
+        self.assertEqual(ops.count(byteplay.BINARY_ADD), 3)
+        self.assertFalse(byteplay.CALL_FUNCTION in ops)
+        self.assertEqual(fn(1, 2), 7)
+
+    def testInlineArities(self):
+        self.assertEqual(self.eval('(+)'), 0)
+        self.assertEqual(self.eval('(- 5)'), -5)
+        self.assertEqual(self.eval('(- 10 1 2)'), 7)
+        self.assertTrue(self.eval('(< 1 2 3)'))
+        self.assertFalse(self.eval('(= 1 1 2)'))
+
+    def testUserInline(self):
+        self.eval("""(defn twice
+                       {:inline (fn [x] (list 'py.bytecode/BINARY_MULTIPLY x 2))
+                        :inline-arities #{1}}
+                       ([x] (py.bytecode/BINARY_MULTIPLY x 2))
+                       ([x y] :not-inlined))""")
+        fn = self.eval('(fn [x] (twice x))')
+        ops = [op for op, arg in Code.from_code(fn.func_code).code]
+        self.assertTrue(byteplay.BINARY_MULTIPLY in ops)
+        self.assertEqual(fn(4), 8)
+        self.assertEqual(self.eval('(twice 1 2)'), keyword(symbol('not-inlined')))
+
+    def testLocalsShadowInline(self):
+        self.assertEqual(self.eval('(let [+ (fn [x y] :local)] (+ 1 2))'),
+                         keyword(symbol('local')))
+
+
+class PeepholeTests(CompilerTestCase):
+    namespace = 'clojure.peephole-test'
+
+    def testBoolTestSkipsTruthiness(self):
+        fn = self.eval('(fn [x] (if (nil? x) :nil :other))')
+        ops = self.ops(fn)
+        self.assertEqual(ops.count(byteplay.COMPARE_OP), 1)
+        self.assertFalse(byteplay.STORE_FAST in ops)
+        self.assertEqual(fn(None), keyword(symbol('nil')))
+        self.assertEqual(fn(False), keyword(symbol('other')))
+
+    def testOtherTestsKeepTruthiness(self):
+        fn = self.eval('(fn [x] (if x :true :false))')
+        self.assertEqual(fn(""), keyword(symbol('true')))
+        self.assertEqual(fn(False), keyword(symbol('false')))
+        self.assertEqual(fn(None), keyword(symbol('false')))
+
+    def testDeadCodeRemoved(self):
+        fn = self.eval('(fn [x] (let [y (inc x)] (do 1 :unused y)))')
+        self.assertEqual(self.ops(fn), [byteplay.LOAD_FAST,
+                                        byteplay.LOAD_CONST,
+                                        byteplay.BINARY_ADD,
+                                        byteplay.RETURN_VALUE])
+        self.assertEqual(fn(1), 2)
+
+    def testJumpToReturn(self):
+        fn = self.eval('(fn [x] (if (< x 0) :neg (if (< x 10) :small :big)))')
+        self.assertFalse(byteplay.JUMP_ABSOLUTE in self.ops(fn))
+        self.assertEqual(map(fn, [-1, 1, 11]),
+                         [keyword(symbol(x)) for x in ['neg', 'small', 'big']])
+
+    def testRecur(self):
+        fn = self.eval('(fn [x acc] (if (> x 0) (recur (dec x) (+ acc x)) acc))')
+        self.assertEqual(fn(10, 0), 55)
+
+    def testListInstructions(self):
+        # byteplay code may hold instructions as lists as well as tuples
+        code = [(byteplay.LOAD_CONST, 1), [byteplay.STORE_FAST, 'x'],
+                [byteplay.LOAD_FAST, 'x'], (byteplay.RETURN_VALUE, None)]
+        self.assertEqual(peephole.optimize(code),
+                         [(byteplay.LOAD_CONST, 1),
+                          (byteplay.RETURN_VALUE, None)])
+
+    def ops(self, fn):
+        return [op for op, arg in Code.from_code(fn.func_code).code
+                if byteplay.isopcode(op)]
+
+
+class ConstantLiteralTests(CompilerTestCase):
+    namespace = 'clojure.constant-test'
+
+    def testConstantVectorIsShared(self):
+        fn = self.eval('(fn [] [:a 1 "b" [2 {:c nil}]])')
+        self.assertTrue(fn() is fn())
+        self.assertEqual(fn(), self.eval('(vector :a 1 "b" (vector 2 (hash-map :c nil)))'))
+        self.assertFalse(byteplay.CALL_FUNCTION in self.ops(fn))
+
+    def testConstantMapIsShared(self):
+        fn = self.eval('(fn [] {:type :foo :n 1})')
+        self.assertTrue(fn() is fn())
+        self.assertEqual(fn()[keyword(symbol('type'))], keyword(symbol('foo')))
+
+    def testPartiallyConstantVector(self):
+        fn = self.eval('(fn [x] [:a x :c (inc x)])')
+        self.assertEqual(fn(1), self.eval('(vector :a 1 :c 2)'))
+        self.assertFalse(fn(1) is fn(1))
+
+    def testPartiallyConstantMap(self):
+        fn = self.eval('(fn [x] {:a 1 :b x})')
+        m = fn(2)
+        self.assertEqual(len(m), 2)
+        self.assertEqual(m[keyword(symbol('a'))], 1)
+        self.assertEqual(m[keyword(symbol('b'))], 2)
+
+    def testSymbolsAreNotConstant(self):
+        fn = self.eval('(fn [x] [x x])')
+        self.assertEqual(fn(3), self.eval('(vector 3 3)'))
+
+    def ops(self, fn):
+        return [op for op, arg in Code.from_code(fn.func_code).code
+                if byteplay.isopcode(op)]
+
+
+class MultiArityTests(CompilerTestCase):
+    namespace = 'clojure.arity-test'
+
+    def testDispatch(self):
+        fn = self.eval('(fn ([] 0) ([x] x) ([x y & more] [x y more]))')
+        self.assertEqual(fn(), 0)
+        self.assertEqual(fn(1), 1)
+        self.assertEqual(fn(1, 2), self.eval('[1 2 nil]'))
+        self.assertEqual(fn(1, 2, 3)[2], (3,))
+        self.assertEqual(sorted(fn.__arities__), [-3, 0, 1])
+
+    def testWrongArity(self):
+        fn = self.eval('(fn ([x] x) ([x y] y))')
+        self.assertRaises(ArityException, fn)
+        self.assertRaises(ArityException, fn, 1, 2, 3)
+        fn = self.eval('(fn ([x y] 2) ([x y z w & more] more))')
+        self.assertRaises(ArityException, fn, 1)
+        self.assertRaises(ArityException, fn, 1, 2, 3)
+        self.assertEqual(fn(1, 2, 3, 4, 5), (5,))
+
+    def testFixedAfterVariadic(self):
+        fn = self.eval('(fn ([] 0) ([x & more] [x more]) ([x y z] 3))')
+        self.assertEqual(fn(), 0)
+        self.assertEqual(fn(1), self.eval('[1 nil]'))
+        self.assertEqual(fn(1, 2)[1], (2,))
+        self.assertEqual(fn(1, 2, 3), 3)
+        self.assertEqual(fn(1, 2, 3, 4)[1], (2, 3, 4))
+
+    def testRecurInArity(self):
+        fn = self.eval('(fn ([x] x) ([x acc] (if (> x 0) (recur (dec x) (+ acc x)) acc)))')
+        self.assertEqual(fn(10, 0), 55)
+
+    def testClosure(self):
+        fn = self.eval('(let [a 10] (fn self ([] (self 1)) ([x] (+ a x))))')
+        self.assertEqual(fn(), 11)
+        self.assertEqual(fn(2), 12)
+        self.assertEqual(fn.__arities__[1](3), 13)
+
+
+class TypeHintTests(CompilerTestCase):
+    namespace = 'clojure.tag-test'
+
+    def setUp(self):
+        CompilerTestCase.setUp(self)
+        self.warn = compiler.warnOnReflection
+        compiler.warnOnReflection = True
+        del compiler.reflectionWarnings[:]
+
+    def tearDown(self):
+        compiler.warnOnReflection = self.warn
+        del compiler.reflectionWarnings[:]
+
+    def testTaggedArgument(self):
+        fn = self.eval('(fn [^clojure.lang.persistentvector/PersistentVector v i] (nth v i))')
+        self.assertTrue((byteplay.LOAD_ATTR, 'nth') in self.code(fn))
+        self.assertEqual(fn(self.eval('[1 2 3]'), 1), 2)
+        self.assertEqual(fn(None, 1), None)
+        self.assertEqual(compiler.reflectionWarnings, [])
+
+    def testInferredFromLiteral(self):
+        fn = self.eval('(fn [x] (let [v [1 2 x]] (count v)))')
+        self.assertTrue((byteplay.LOAD_CONST, len) in self.code(fn))
+        self.assertEqual(fn(3), 3)
+
+    def testTaggedReturn(self):
+        self.eval('(defn ^clojure.lang.persistentvector/PersistentVector make-v [] [1 2])')
+        fn = self.eval('(fn [] (nth (make-v) 1))')
+        self.assertTrue((byteplay.LOAD_ATTR, 'nth') in self.code(fn))
+        self.assertEqual(fn(), 2)
+
+    def testIntLoop(self):
+        fn = self.eval('''(fn [^int n]
+                            (loop [^int i 0 acc 0]
+                              (if (< i n)
+                                (recur (inc i) (if (even? i) (+ acc (mod i 3)) acc))
+                                acc)))''')
+        ops = [op for op, arg in self.code(fn)]
+        self.assertFalse(byteplay.CALL_FUNCTION in ops)
+        self.assertEqual(fn(10), 5)
+
+    def testProtocolMethod(self):
+        fn = self.eval('(fn [^clojure.lang.persistentvector/PersistentVector v] (seq v))')
+        self.assertTrue((byteplay.LOAD_ATTR, 'seq') in self.code(fn))
+        self.assertEqual(fn(self.eval('[]')), None)
+        self.assertEqual(list(fn(self.eval('[1 2]'))), [1, 2])
+
+    def testClosureKeepsTag(self):
+        fn = self.eval('(fn [^clojure.lang.iseq/ISeq s] (fn [] (first s)))')
+        self.assertEqual(fn(RT.seq((1, 2)))(), 1)
+        self.assertEqual(fn(None)(), None)
+        self.assertEqual(compiler.reflectionWarnings, [])
+
+    def testReflectionWarning(self):
+        fn = self.eval('(fn [v] (nth v 0))')
+        self.assertEqual(fn((1,)), 1)
+        self.assertEqual([name for f, line, name in compiler.reflectionWarnings],
+                         ['clojure.core/nth'])
+
+    def code(self, fn):
+        return Code.from_code(fn.func_code).code
+
+
+class ResolutionCacheTests(CompilerTestCase):
+    namespace = 'clojure.resolve-test'
+
+    def setUp(self):
+        CompilerTestCase.setUp(self)
+        self.ns = self.comp.getNS()
+
+    def testLookup(self):
+        self.eval('(def resolved 1)')
+        var = getattr(self.ns, 'resolved')
+        self.assertEqual(namespace.lookup(self.ns, symbol('resolved')),
+                         (self.ns, var))
+        self.assertEqual(namespace.lookup(self.ns, symbol('unresolved')),
+                         (self.ns, None))
+
+    def testMappingChanges(self):
+        self.eval('(def remapped 1)')
+        self.eval('(defn read-remapped [] remapped)')
+        setattr(self.ns, 'remapped', getattr(self.ns, 'read-remapped'))
+        self.assertTrue(self.eval('remapped') is self.eval('read-remapped'))
+
+    def testAliasChanges(self):
+        self.eval('(alias (quote s) (quote clojure.lang.symbol) (quote clojure.resolve-test))')
+        self.assertEqual(self.eval('s/__name__'), 'clojure.lang.symbol')
+        self.eval('(alias (quote s) (quote clojure.lang.cljkeyword) (quote clojure.resolve-test))')
+        self.assertEqual(self.eval('s/__name__'), 'clojure.lang.cljkeyword')
+
+    def testMacroChanges(self):
+        self.eval('(defn later-macro [form env x] x)')
+        self.assertFalse(namespace.resolve(self.ns, symbol('later-macro'))[3])
+        self.eval('(set-macro later-macro)')
+        self.assertTrue(namespace.resolve(self.ns, symbol('later-macro'))[3])
+        self.assertEqual(self.eval('(later-macro 3)'), 3)
+        self.eval('(defn later-macro [x] x)')
+        self.assertFalse(namespace.resolve(self.ns, symbol('later-macro'))[3])
+
+    def testEntryIsCached(self):
+        self.eval('(def cached 1)')
+        entry = namespace.resolve(self.ns, symbol('cached'))
+        self.assertTrue(namespace.resolve(self.ns, symbol('cached')) is entry)
+        self.eval('(def other-cached 1)')
+        self.assertFalse(namespace.resolve(self.ns, symbol('cached')) is entry)
+
+    def testRemovedNamespaceIsFreed(self):
+        ns = namespace.findOrCreate('clojure.resolve-test-removed')
+        namespace.intern(ns, symbol('x'))
+        namespace.resolve(ns, symbol('x'))
+        namespace.resolve(ns, symbol('map'))
+        ref = weakref.ref(ns)
+        namespace.remove(ns)
+        del ns
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+
+class ReferralTests(CompilerTestCase):
+    namespace = 'clojure.referral-test'
+
+    def setUp(self):
+        CompilerTestCase.setUp(self)
+        self.ns = self.comp.getNS()
+        self.core = sys.modules['clojure.core']
+
+    def tearDown(self):
+        self.core.__dict__.pop('referral-test-var', None)
+
+    def testNothingCopied(self):
+        self.assertFalse('map' in self.ns.__dict__)
+        self.assertTrue(self.ns.map is self.core.map)
+        self.assertEqual(self.eval('(map inc [1 2])'), [2, 3])
+        self.assertTrue('map' in self.eval('(ns-map (quote clojure.referral-test))'))
+
+    def testLaterCoreDefs(self):
+        self.assertRaises(AttributeError, getattr, self.ns, 'referral-test-var')
+        setattr(self.core, 'referral-test-var', getattr(self.core, 'inc'))
+        self.assertEqual(self.eval('(referral-test-var 1)'), 2)
+
+    def testShadowing(self):
+        self.eval('(defn first [x] :shadowed)')
+        self.assertEqual(self.eval('(first [1])'), keyword('shadowed'))
+        self.assertEqual(self.eval('(clojure.core/first [1])'), 1)
+        self.assertEqual(self.core.first.deref()([1]), 1)
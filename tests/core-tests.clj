@@ -16,8 +16,9 @@
 (deftest identical?-tests
     (assertions/assert-true (identical? 1 1))
     (assertions/assert-false (identical? 1 2))
-    (assertions/assert-false (identical? '() '()))
-    (let [tmp '()]
+    (assertions/assert-true (identical? '() '()))
+    (assertions/assert-false (identical? '(1) '(1)))
+    (let [tmp '(1)]
          (assertions/assert-true (identical? tmp tmp))))
 
 (deftest compare-tests
@@ -0,0 +1,113 @@
+import datetime
+import os
+import tempfile
+import unittest
+
+from clojure.main import requireClj
+from clojure.lang.cljexceptions import ReaderException, \
+     IllegalArgumentException
+from clojure.lang.cljkeyword import keyword
+from clojure.lang.compiler import Compiler
+from clojure.lang.ednreader import readString, readFile
+from clojure.lang.fileseq import StringReader
+from clojure.lang.globals import currentCompiler
+from clojure.lang.lispreader import read
+from clojure.lang.persistenthashmap import PersistentHashMap
+from clojure.lang.persistenthashset import PersistentHashSet
+from clojure.lang.persistentlist import PersistentList
+from clojure.lang.persistentvector import PersistentVector
+import clojure.lang.rt as RT
+from clojure.lang.symbol import symbol
+
+
+class EdnReaderTests(unittest.TestCase):
+    def testLiterals(self):
+        self.assertEqual(readString("nil"), None)
+        self.assertEqual(readString("true"), True)
+        self.assertEqual(readString("-12"), -12)
+        self.assertEqual(readString("2.5"), 2.5)
+        self.assertEqual(readString('"a\\nb"'), "a\nb")
+        self.assertEqual(readString(":a"), keyword("a"))
+        self.assertEqual(readString("a/b"), symbol("a", "b"))
+
+    def testCollections(self):
+        form = readString("{:a [1 2] :b #{3} :c (4 5)} ; comment")
+        self.assertTrue(isinstance(form, PersistentHashMap))
+        self.assertTrue(isinstance(form[keyword("a")], PersistentVector))
+        self.assertTrue(isinstance(form[keyword("b")], PersistentHashSet))
+        self.assertTrue(isinstance(form[keyword("c")], PersistentList))
+        self.assertEqual(form[keyword("c")], [4, 5])
+        self.assertEqual(form[keyword("c")].meta(), None)
+        big = readString("[" + " ".join(map(str, range(1100))) + "]")
+        self.assertEqual(list(big), range(1100))
+
+    def testSameAsCodeReader(self):
+        source = '[1 -2 3.5 1/2 "s" \\c :k sym {:a #{1 2}} (a b) #_ x nil]'
+        self.assertEqual(readString(source),
+                         read(StringReader(source), True, None, True))
+
+    def testDuplicateKeys(self):
+        self.assertRaises(IllegalArgumentException, readString, "{:a 1 :a 2}")
+        self.assertRaises(IllegalArgumentException, readString, "#{1 1}")
+
+    def testNoCodeSyntax(self):
+        for source in ["#(+ % 1)", '#"regex"', "#'var", "(1 2"]:
+            self.assertRaises(ReaderException, readString, source)
+
+    def testEof(self):
+        self.assertRaises(ReaderException, readString, " ; nothing")
+        self.assertEqual(readString(" ; nothing", False, "eof"), "eof")
+
+    def testTaggedLiterals(self):
+        self.assertEqual(readString('#inst "2012-01-02T03:04:05.5+01:00"'),
+                         datetime.datetime(2012, 1, 2, 2, 4, 5, 500000))
+        self.assertEqual(str(readString(
+            '#uuid "f81d4fae-7dec-11d0-a765-00a0c91e6bf6"')),
+            "f81d4fae-7dec-11d0-a765-00a0c91e6bf6")
+        readers = {symbol("my", "inc"): lambda x: x + 1}
+        self.assertEqual(readString("#my/inc 1", readers=readers), 2)
+        self.assertEqual(readString("#my/pair 1",
+                                    default=lambda tag, x: (tag, x)),
+                         (symbol("my", "pair"), 1))
+        self.assertRaises(ReaderException, readString, "#my/unknown 1")
+
+    def testReadFile(self):
+        fd, filename = tempfile.mkstemp(".edn")
+        try:
+            os.write(fd, "{:a 1}\n[2 3] ; comment\n#_ (4) 5\n")
+            os.close(fd)
+            self.assertEqual(list(readFile(filename)),
+                             [RT.map(keyword("a"), 1), [2, 3], 5])
+        finally:
+            os.remove(filename)
+
+
+class EdnNamespaceTests(unittest.TestCase):
+    def setUp(self):
+        RT.init()
+        self.comp = Compiler()
+        currentCompiler.set(self.comp)
+        self.comp.setNS(symbol('clojure.edn-test'))
+        self.eval("(require 'clojure.edn)")
+
+    def testReadString(self):
+        self.assertEqual(self.eval('(clojure.edn/read-string "[1 2]")'),
+                         [1, 2])
+        self.assertEqual(self.eval('(clojure.edn/read-string nil)'), None)
+        self.assertEqual(self.eval('(clojure.edn/read-string "")'), None)
+        self.assertEqual(self.eval('(clojure.edn/read-string {:eof :end} "")'),
+                         keyword("end"))
+        self.assertEqual(self.eval("(clojure.edn/read-string "
+                                   "{:readers {'x/y inc}} \"#x/y 1\")"), 2)
+
+    def testReadSeq(self):
+        self.assertEqual(self.eval('(vec (clojure.edn/read-seq '
+                                   '(clojure.lang.fileseq/StringReader '
+                                   '"1 [2] :x")))'),
+                         [1, [2], keyword("x")])
+
+    def eval(self, code):
+        r = StringReader(code)
+        s = read(r, True, None, True)
+        res = self.comp.compile(s)
+        return self.comp.executeCode(res)
@@ -0,0 +1,56 @@
+import cPickle
+import unittest
+
+import clojure.main
+from clojure.lang.persistentvector import create as vector, fromList
+from clojure.lang.persistentlist import creator as list
+from clojure.lang.persistenthashset import create as hashSet
+from clojure.lang.rt import map as hashMap, cons
+from clojure.lang.cljkeyword import keyword
+from clojure.lang.symbol import symbol
+
+
+class CollectionHashTests(unittest.TestCase):
+    def testEqualCollectionsHashEqual(self):
+        for a, b in [(vector(1, None, "a"), list(1, None, "a")),
+                     (vector(1, 2), cons(1, cons(2, None))),
+                     (vector(1, 2), fromList([0, 1, 2]).seq().next()),
+                     (hashMap(keyword("a"), vector(1), None, 2),
+                      hashMap(None, 2, keyword("a"), list(1))),
+                     (hashSet(vector(1), None), hashSet(None, list(1)))]:
+            self.assertEqual(a, b)
+            self.assertEqual(hash(a), hash(b))
+            self.assertEqual(a.hasheq(), hash(a))
+        self.assertEqual(hash(vector()), hash(list()))
+
+    def testKeys(self):
+        d = {vector(1, 2): "v", hashMap(1, 2): "m", hashSet(1): "s"}
+        self.assertEqual(d[list(1, 2)], "v")
+        self.assertEqual(d[hashMap(1, 2)], "m")
+        self.assertEqual(d[hashSet(1)], "s")
+        m = hashMap(vector(symbol("a"), 1), "x")
+        self.assertEqual(m[vector(symbol("a"), 1)], "x")
+
+    def testCollidingKinds(self):
+        # {} and #{} both hash to 0, but they aren't equal
+        self.assertEqual(hash(hashMap()), hash(hashSet()))
+        items = [None, vector(), hashMap(), 0, hashSet()]
+        self.assertEqual(len(hashSet(*items)), 5)
+        self.assertEqual(len(hashMap(*sum([[x, x] for x in items], []))), 5)
+        d = {hashMap(): "m", hashSet(): "s"}
+        self.assertEqual(d[hashMap()], "m")
+        self.assertEqual(d[hashSet()], "s")
+
+    def testCachedHashes(self):
+        a = fromList(range(100))
+        b = fromList(range(99) + [0])
+        hash(a)
+        hash(b)
+        self.assertNotEqual(a, b)
+        self.assertNotEqual(hashSet(1), hashSet(1, 2))
+        self.assertNotEqual(hashSet(1, 2), hashSet(1))
+        # the hashes of symbols change from one process to the next, so
+        # cached hashes aren't pickled
+        x = hashMap(symbol("a"), vector(symbol("b")))
+        hash(x)
+        self.assertEqual(cPickle.loads(cPickle.dumps(x, 2))._hash, -1)
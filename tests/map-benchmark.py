@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""Builds hash maps of a million entries with and without a transient
+
+One assoc per key, which copies the path to the key every time, against
+the builders that go through TransientHashMap: persistenthashmap.fromList
+(rt.map, map literals), fromDict and conj of one map onto another (merge).
+The best of a few runs is reported.
+
+    python tests/map-benchmark.py [entries] [runs]
+"""
+
+from benchmark import best, sizeAndRuns
+
+import clojure.main
+from clojure.lang.persistenthashmap import EMPTY, fromList, fromDict
+
+
+def assocEach(kvs):
+    m = EMPTY
+    for i in range(0, len(kvs), 2):
+        m = m.assoc(kvs[i], kvs[i + 1])
+    return m
+
+
+def main():
+    size, runs = sizeAndRuns()
+    kvs = []
+    for x in range(size):
+        kvs.append("key%d" % x)
+        kvs.append(x)
+    d = dict(zip(kvs[::2], kvs[1::2]))
+    half = fromList(kvs[:size])
+    other = fromList(kvs[size:])
+    for name, fn, arg in [("assoc", assocEach, kvs),
+                          ("fromList", fromList, kvs),
+                          ("fromDict", fromDict, d),
+                          ("merge", half.cons, other)]:
+        print "%-9s %8d entries %7.2f s" % (name, size, best(fn, arg, runs))
+
+
+if __name__ == "__main__":
+    main()
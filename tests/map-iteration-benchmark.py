@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Times walking a hash map of a million entries
+
+Python iteration over its keys, toDict, = against an equal map built
+separately, a first/next walk of its seq, and summing its values with
+reduce over the entries and with reduce-kv. The best of a few runs is
+reported.
+
+    python tests/map-iteration-benchmark.py [entries] [runs]
+"""
+
+from benchmark import best, sizeAndRuns
+
+import clojure.main
+import clojure.core as core
+from clojure.lang.persistenthashmap import fromList
+
+
+def iterate(m):
+    for k in m:
+        pass
+
+
+def toDict(m):
+    m.toDict()
+
+
+def equals(ms):
+    assert ms[0] == ms[1]
+
+
+def walkSeq(m):
+    s = m.seq()
+    while s is not None:
+        s.first()
+        s = s.next()
+
+
+def reduceEntries(m):
+    getattr(core, "reduce1")(lambda acc, e: acc + e.getValue(), 0, m)
+
+
+def reduceKV(m):
+    getattr(core, "reduce-kv")(lambda acc, k, v: acc + v, 0, m)
+
+
+def main():
+    size, runs = sizeAndRuns()
+    kvs = []
+    for x in range(size):
+        kvs.append("key%d" % x)
+        kvs.append(x)
+    m = fromList(kvs)
+    other = fromList(kvs)
+    for fn, arg in [(iterate, m), (toDict, m), (equals, (m, other)),
+                    (walkSeq, m), (reduceEntries, m), (reduceKV, m)]:
+        print "%-14s %8d entries %7.2f s" % (fn.__name__, size,
+                                             best(fn, arg, runs))
+
+
+if __name__ == "__main__":
+    main()
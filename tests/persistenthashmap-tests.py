@@ -0,0 +1,105 @@
+from random import Random
+import threading
+import unittest
+
+import clojure.main
+import clojure.core as core
+from clojure.lang.persistenthashmap import EMPTY, fromList, fromDict
+from clojure.lang.cljexceptions import IllegalAccessError
+
+
+class Collides(object):
+    """ A key that shares its hash with a few others """
+    def __init__(self, v):
+        self.v = v
+
+    def __hash__(self):
+        return self.v % 7
+
+    def __eq__(self, other):
+        return isinstance(other, Collides) and other.v == self.v
+
+
+class TransientHashMapTests(unittest.TestCase):
+    def testAgainstDict(self):
+        rnd = Random(1)
+        keys = [Collides(x) for x in range(40)] + range(2000) + [None]
+        m = EMPTY
+        d = {}
+        for step in range(4):
+            before, beforeDict = m, dict(d)
+            t = m.asTransient()
+            for x in range(3000):
+                k = rnd.choice(keys)
+                if rnd.random() < 0.6:
+                    self.assertTrue(t.assoc(k, x) is t)
+                    d[k] = x
+                else:
+                    self.assertTrue(t.without(k) is t)
+                    d.pop(k, None)
+                self.assertEqual(t.count(), len(d))
+            m = t.persistent()
+            self.assertEqual(len(m), len(d))
+            for k in keys:
+                self.assertEqual(m.valAt(k, "missing"), d.get(k, "missing"))
+                # the map the transient came from is untouched
+                self.assertEqual(before.valAt(k, "missing"),
+                                 beforeDict.get(k, "missing"))
+            self.assertEqual(len(list(m)), len(d))
+            p = m
+            for k in keys:
+                p = p.without(k)
+            self.assertEqual(len(p), 0)
+
+    def testBuilders(self):
+        kvs = []
+        for x in range(500):
+            kvs.extend(["k%d" % x, x])
+        m = fromList(kvs)
+        self.assertEqual(len(m), 500)
+        self.assertEqual(m, fromDict(dict(zip(kvs[::2], kvs[1::2]))))
+        self.assertEqual(fromList(kvs[:4]), fromList(kvs[:4]))
+        merged = fromList(kvs[:500]).cons(fromList(kvs[500:]))
+        self.assertEqual(merged, m)
+
+    def testOwner(self):
+        t = EMPTY.asTransient()
+        errors = []
+        def assoc():
+            try:
+                t.assoc(1, 2)
+            except IllegalAccessError as e:
+                errors.append(e)
+        thread = threading.Thread(target=assoc)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        t.persistent()
+        self.assertRaises(IllegalAccessError, t.assoc, 1, 2)
+        self.assertRaises(IllegalAccessError, t.persistent)
+
+
+class IterationTests(unittest.TestCase):
+    def testAgainstSeq(self):
+        rnd = Random(3)
+        for n in [0, 1, 5, 40, 3000]:
+            keys = [Collides(x) for x in range(n // 3)] + range(n) + [None]
+            m = EMPTY
+            for k in keys:
+                m = m.assoc(k, rnd.random())
+            for k in keys[::3]:
+                m = m.without(k)
+            entries = []
+            s = m.seq()
+            while s is not None:
+                entries.append((s.first().getKey(), s.first().getValue()))
+                s = s.next()
+            self.assertEqual(list(m.items()), entries)
+            self.assertEqual(list(m.keys()), [k for k, v in entries])
+            self.assertEqual(list(m), [k for k, v in entries])
+            self.assertEqual(list(m.vals()), [v for k, v in entries])
+            self.assertEqual(m.toDict(), dict(entries))
+            self.assertEqual(dict(m), dict(entries))
+            reduceKV = getattr(core, "reduce-kv")
+            self.assertEqual(reduceKV(lambda acc, k, v: acc + [(k, v)], [], m),
+                             entries)
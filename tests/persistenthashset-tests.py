@@ -0,0 +1,68 @@
+from random import Random
+import threading
+import unittest
+
+from clojure.lang.persistenthashset import EMPTY, create, fromList
+from clojure.lang.persistentvector import create as vector
+from clojure.lang.rt import map as hashMap
+from clojure.lang.cljexceptions import (IllegalAccessError,
+                                        IllegalArgumentException)
+
+
+class TransientHashSetTests(unittest.TestCase):
+    def testAgainstSet(self):
+        rnd = Random(2)
+        s = EMPTY
+        expected = set()
+        for step in range(3):
+            before, beforeExpected = s, set(expected)
+            t = s.asTransient()
+            for x in range(3000):
+                k = rnd.choice(range(1500) + [None])
+                if rnd.random() < 0.7:
+                    self.assertTrue(t.conj(k) is t)
+                    expected.add(k)
+                else:
+                    self.assertTrue(t.disjoin(k) is t)
+                    expected.discard(k)
+                self.assertEqual(len(t), len(expected))
+                self.assertEqual(k in t, k in expected)
+            s = t.persistent()
+            self.assertEqual(set(s), expected)
+            # the set the transient came from is untouched
+            self.assertEqual(set(before), beforeExpected)
+
+    def testBuilders(self):
+        items = range(100) * 3
+        self.assertEqual(set(create(items)), set(range(100)))
+        self.assertEqual(create(*items[:4]), create(iter(items[:4])))
+        self.assertEqual(create(), EMPTY)
+        self.assertEqual(fromList(range(100), True), create(range(100)))
+        self.assertRaises(IllegalArgumentException, fromList, [1, 2, 1], True)
+        self.assertRaises(IllegalArgumentException, fromList, items, True)
+
+    def testOwner(self):
+        t = EMPTY.asTransient()
+        errors = []
+        def conj():
+            try:
+                t.conj(1)
+            except IllegalAccessError as e:
+                errors.append(e)
+        thread = threading.Thread(target=conj)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        t.persistent()
+        self.assertRaises(IllegalAccessError, t.conj, 1)
+        self.assertRaises(IllegalAccessError, t.persistent)
+
+
+class EqualityTests(unittest.TestCase):
+    def testNotEqualToMaps(self):
+        for m, s in [(hashMap(), EMPTY), (hashMap(1, 1), create(1))]:
+            self.assertFalse(m == s)
+            self.assertFalse(s == m)
+            self.assertTrue(m != s)
+            self.assertTrue(s != m)
+        self.assertEqual(len(create(None, vector(), hashMap(), 0, EMPTY)), 5)
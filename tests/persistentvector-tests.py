@@ -0,0 +1,95 @@
+import threading
+import unittest
+
+from clojure.lang.persistentvector import EMPTY, create, vec, fromList
+from clojure.lang.ichunkedseq import IChunkedSeq
+from clojure.lang.cljexceptions import (IllegalAccessError,
+                                        IllegalStateException,
+                                        IndexOutOfBoundsException)
+
+
+class TransientVectorTests(unittest.TestCase):
+    def testConj(self):
+        for n in [0, 1, 32, 33, 1024, 1057, 40000]:
+            t = EMPTY.asTransient()
+            for x in range(n):
+                self.assertTrue(t.conj(x) is t)
+            v = t.persistent()
+            self.assertEqual(len(v), n)
+            self.assertEqual(list(v), range(n))
+            self.assertEqual(v, create(*range(n)))
+            self.assertEqual(v, vec(range(n)))
+
+    def testAssocN(self):
+        v = create(*range(2000))
+        t = v.asTransient()
+        for x in range(0, 2000, 7):
+            t.assocN(x, -x)
+        t.assocN(2000, "end")
+        self.assertRaises(IndexOutOfBoundsException, t.assocN, 2002, None)
+        w = t.persistent()
+        self.assertEqual(w[7], -7)
+        self.assertEqual(w[8], 8)
+        self.assertEqual(w[2000], "end")
+        # the vector the transient came from is untouched
+        self.assertEqual(list(v), range(2000))
+
+    def testPop(self):
+        v = create(*range(1100))
+        t = v.asTransient()
+        for n in range(1100, 0, -1):
+            self.assertEqual(t.count(), n)
+            self.assertEqual(t.nth(n - 1), n - 1)
+            t.pop()
+        self.assertRaises(IllegalStateException, t.pop)
+        self.assertEqual(t.persistent(), EMPTY)
+        self.assertEqual(list(v), range(1100))
+        t = v.asTransient()
+        for n in range(1100 - 35):
+            t.pop()
+        w = t.persistent().cons("x")
+        self.assertEqual(list(w), range(35) + ["x"])
+
+    def testOwner(self):
+        t = EMPTY.asTransient()
+        errors = []
+        def conj():
+            try:
+                t.conj(1)
+            except IllegalAccessError as e:
+                errors.append(e)
+        thread = threading.Thread(target=conj)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        t.persistent()
+        self.assertRaises(IllegalAccessError, t.conj, 1)
+        self.assertRaises(IllegalAccessError, t.persistent)
+
+
+class ChunkedSeqTests(unittest.TestCase):
+    def testChunks(self):
+        for n in [1, 31, 32, 33, 1056, 1057, 1100]:
+            v = fromList(range(n))
+            s = v.seq()
+            items = []
+            while s is not None:
+                self.assertTrue(isinstance(s, IChunkedSeq))
+                self.assertEqual(len(s), n - len(items))
+                chunk = s.chunkedFirst()
+                self.assertTrue(0 < len(chunk) <= 32)
+                items.extend(chunk)
+                s = s.chunkedNext()
+            self.assertEqual(items, range(n))
+            if n > 1:
+                self.assertEqual(list(v.seq().next()), range(1, n))
+            self.assertEqual(list(v), range(n))
+        self.assertEqual(EMPTY.seq(), None)
+
+    def testReversed(self):
+        for n in [1, 32, 33, 1057]:
+            v = fromList(range(n))
+            self.assertEqual(list(reversed(v)), range(n - 1, -1, -1))
+            self.assertEqual(list(v.rseq()), range(n - 1, -1, -1))
+            self.assertEqual(len(v.rseq()), n)
+        self.assertEqual(EMPTY.rseq(), None)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Compares printing with clojure.lang.printer to the old repr path
+
+The old __repr__ of vectors and maps built a list of the reprs of the
+items and joined it, recursively. Both are run on a vector of a million
+ints and on a vector of maps of vectors with a million items in all, each
+in its own process so the peak memory use can be told apart.
+
+    python tests/printer-benchmark.py [size]
+"""
+
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(ROOT))
+
+
+def oldRepr(x):
+    from clojure.lang.apersistentvector import APersistentVector
+    from clojure.lang.apersistentmap import APersistentMap
+    if isinstance(x, APersistentVector):
+        return "[" + " ".join([oldRepr(y) for y in x]) + "]"
+    if isinstance(x, APersistentMap):
+        s = []
+        for k in x:
+            s.append(oldRepr(k))
+            s.append(oldRepr(x[k]))
+        return "{" + " ".join(s) + "}"
+    return repr(x)
+
+
+def structure(kind, size):
+    from clojure.lang.persistentvector import vec
+    from clojure.lang.rt import map as hashMap
+    from clojure.lang.cljkeyword import keyword
+    if kind == "flat":
+        return vec(range(size))
+    ids, items = keyword("id"), keyword("items")
+    return vec([hashMap(ids, x, items, vec(range(x * 100, x * 100 + 100)))
+                for x in range(size // 100)])
+
+
+def run(path, kind, size):
+    """ Runs in the child process, prints seconds and peak memory in KB """
+    import clojure.main
+    from clojure.lang.printer import printTo
+    x = structure(kind, size)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    with open(os.devnull, "w") as out:
+        start = time.time()
+        if path == "repr":
+            out.write(oldRepr(x))
+        else:
+            printTo(x, out)
+        secs = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print secs, peak - base
+
+
+def main():
+    if sys.argv[1:2] == ["--run"]:
+        run(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+    size = int(sys.argv[1]) if sys.argv[1:] else 1000000
+    for kind in ["flat", "nested"]:
+        for path in ["repr", "printer"]:
+            out = subprocess.check_output([sys.executable, __file__, "--run",
+                                           path, kind, str(size)])
+            secs, kb = out.split()[-2:]
+            print "%-7s %-8s %7.2f s %8d KB" % (kind, path, float(secs),
+                                                int(kb))
+
+
+if __name__ == "__main__":
+    main()
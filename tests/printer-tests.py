@@ -0,0 +1,51 @@
+import unittest
+from StringIO import StringIO
+
+import clojure.main
+import clojure.core as core
+from clojure.lang.printer import printTo, printString
+from clojure.lang.persistentvector import create as vector
+from clojure.lang.persistentlist import creator as list
+from clojure.lang.persistenthashset import create as hashSet
+from clojure.lang.rt import map as hashMap, cons
+from clojure.lang.cljkeyword import keyword
+from clojure.lang.symbol import symbol
+from clojure.lang.var import pushThreadBindings, popThreadBindings
+
+
+class PrinterTests(unittest.TestCase):
+    def testReadably(self):
+        x = vector(1, "a\"\n", None, True, keyword("k"), symbol("s"),
+                   list(1, 2), hashSet(3), hashMap(keyword("a"), vector()))
+        self.assertEqual(printString(x),
+                         '[1 "a\\"\\n" nil true :k s (1 2) #{3} {:a []}]')
+        self.assertEqual(repr(x), printString(x))
+        self.assertEqual(printString(x, False),
+                         '[1 a"\n nil true :k s (1 2) #{3} {:a []}]')
+
+    def testUnicode(self):
+        x = vector(u"\xe9", u"a\u20ac")
+        self.assertEqual(repr(x), '["\\u00e9" "a\\u20ac"]')
+        self.assertTrue(type(repr(x)) is str)
+        self.assertEqual(printString(x), repr(x))
+        self.assertEqual(core.str(x), repr(x))
+        self.assertEqual(printString(x, False), u"[\xe9 a\u20ac]")
+
+    def testWriter(self):
+        out = StringIO()
+        printTo(vector(vector(1, 2), 3), out)
+        self.assertEqual(out.getvalue(), "[[1 2] 3]")
+
+    def testLimits(self):
+        x = vector(1, vector(2, vector(3)), list(4, 5), 6)
+        pushThreadBindings(hashMap(getattr(core, "*print-length*"), 2,
+                                   getattr(core, "*print-level*"), 2))
+        try:
+            self.assertEqual(printString(x), "[1 [2 #] ...]")
+            self.assertEqual(printString(hashMap(1, 2, 3, 4, 5, 6))[-5:],
+                             " ...}")
+            self.assertEqual(printString(cons(1, cons(2, cons(3, None)))),
+                             "(1 2 ...)")
+        finally:
+            popThreadBindings()
+        self.assertEqual(printString(x), "[1 [2 [3]] (4 5) 6]")
@@ -1,4 +1,4 @@
-from clojure.lang.protocol import ProtocolFn
+from clojure.lang.protocol import ProtocolFn, ProtocolException
 import unittest
 
 class TestProtocolFunctions(unittest.TestCase):
@@ -11,4 +11,48 @@ class TestProtocolFunctions(unittest.TestCase):
         self.assertEqual(z(1), "int")
         self.assertEqual(z(1.0), "float")
         self.assertEqual(z(z), "fn")
-        
+
+    def testInherited(self):
+        z = ProtocolFn("foo")
+        z.extend(int, lambda x: "int")
+        self.assertEqual(z(True), "int")
+        self.assertTrue(z.isExtendedBy(bool))
+        self.assertFalse(z.isExtendedBy(str))
+
+        z.extend(bool, lambda x: "bool")
+        self.assertEqual(z(True), "bool")
+        self.assertEqual(z(1), "int")
+
+    def testReextend(self):
+        z = ProtocolFn("foo")
+        z.extend(object, lambda x: "object")
+        self.assertEqual(z(1), "object")
+        z.extend(int, lambda x: "int")
+        self.assertEqual(z(1), "int")
+        self.assertEqual(z(1.0), "object")
+
+    def testMethod(self):
+        class Base(object):
+            def foo(self):
+                return "base"
+        z = ProtocolFn("foo")
+        z.extendByMethod(Base)
+        class Derived(Base):
+            def foo(self):
+                return "derived"
+        self.assertEqual(z(Base()), "base")
+        self.assertEqual(z(Derived()), "derived")
+
+    def testDefault(self):
+        z = ProtocolFn("foo")
+        self.assertRaises(ProtocolException, z, 1)
+        z.setDefault(lambda x: "default")
+        self.assertEqual(z(1), "default")
+
+    def testErrorsPropagate(self):
+        z = ProtocolFn("foo")
+        def fail(x):
+            raise KeyError(x)
+        z.extend(int, fail)
+        z.setDefault(lambda x: "default")
+        self.assertRaises(KeyError, z, 1)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Measures LispReader throughput in MB/s
+
+Reads clojure/core.clj and a generated data file (maps of numbers,
+strings, keywords and vectors) from memory, the best of a few runs is
+reported.
+
+    python tests/reader-benchmark.py [runs]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import clojure.main
+from clojure.lang.fileseq import StringReader
+from clojure.lang.lispreader import read
+from clojure.lang.compiler import Compiler
+from clojure.lang.globals import currentCompiler
+from clojure.lang.symbol import symbol
+
+
+def dataSource(records=5000):
+    rows = []
+    for x in range(records):
+        rows.append('{:id %d :name "record %d" :score %d.5 '
+                    ':tags [:a :b "c\\td"] :ratio 3/7}' % (x, x, x))
+    return "\n".join(rows)
+
+
+def readAll(source):
+    r = StringReader(source)
+    while read(r, False, None, True) is not None:
+        pass
+
+
+def throughput(source, runs):
+    best = None
+    for x in range(runs):
+        start = time.time()
+        readAll(source)
+        secs = time.time() - start
+        best = secs if best is None else min(best, secs)
+    return len(source) / best / (1024 * 1024)
+
+
+def main():
+    runs = int(sys.argv[1]) if sys.argv[1:] else 3
+    comp = Compiler()
+    currentCompiler.set(comp)
+    comp.setNS(symbol("user"))
+
+    with open(os.path.join(ROOT, "clojure", "core.clj")) as f:
+        core = f.read()
+    for name, source in [("core.clj", core), ("data", dataSource())]:
+        print "%-10s %8d bytes %7.2f MB/s" % (name, len(source),
+                                              throughput(source, runs))
+
+
+if __name__ == "__main__":
+    main()
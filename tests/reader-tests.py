@@ -7,14 +7,27 @@
 Friday, March 16 2012
 """
 
-import unittest, string
+import os, tempfile, unittest, string
+from StringIO import StringIO
 from random import choice
 from fractions import Fraction
 
-from clojure.lang.lispreader import read
+from clojure.lang.lispreader import read, readString, lineOf
 from clojure.lang.character import Character
-from clojure.lang.fileseq import StringReader
+from clojure.lang.fileseq import StringReader, BufferedFileReader, \
+     MappedFileReader
 from clojure.lang.cljexceptions import ReaderException
+from clojure.lang.symbol import symbol
+
+def readAll(r):
+    """ The forms read from r, with their line numbers and the position the
+        reader ended up at """
+    forms = []
+    while True:
+        form = read(r, False, None, False)
+        if form is None:
+            return forms
+        forms.append((form, lineOf(form), r.lineCol()))
 
 class TestReader(unittest.TestCase):
     def testIntegerReader_PASS(self):
@@ -62,6 +75,44 @@ class TestReader(unittest.TestCase):
         for k,v in literalStringMap_PASS.items():
             r = StringReader('"' + k + '"')
             self.assertEqual(read(r, False, None, False), v)
+    def testStringReaderLines_PASS(self):
+        r = StringReader("(a\n  b)\n\n; c\n(d)")
+        self.assertEqual(lineOf(read(r, False, None, False)), 1)
+        self.assertEqual(r.lineCol(), [2, 5])
+        self.assertEqual(lineOf(read(r, False, None, False)), 5)
+        r.back()
+        self.assertEqual(r.lineCol(), [5, 3])
+        self.assertEqual(r.read(), ")")
+        self.assertEqual(read(r, False, None, False), None)
+        self.assertEqual(r.line, 5)
+    def testLinesNotTracked_PASS(self):
+        form = readString("\n(a (b))", False)
+        self.assertEqual(lineOf(form), None)
+        self.assertEqual(lineOf(form.next().first()), None)
+        self.assertEqual(form.meta(), None)
+        form = readString("\n(a\n ^:c (b))")
+        self.assertEqual(lineOf(form), 2)
+        self.assertEqual(lineOf(form.next().first()), 3)
+        self.assertEqual(form.meta(), None)
+    def testScannedTokens_PASS(self):
+        r = StringReader(' ,; comment\n  foo/bar+ 12 "a\\"b\\n"\n;end')
+        self.assertEqual(read(r, False, None, False), symbol("foo", "bar+"))
+        self.assertEqual(read(r, False, None, False), 12)
+        self.assertEqual(read(r, False, None, False), 'a"b\n')
+        self.assertEqual(read(r, False, None, False), None)
+    def testFileReaders_PASS(self):
+        source = '(a "long string\\n" ; comment\n [1 2.5 :kw])\n\n(b\n c)'
+        expected = readAll(StringReader(source))
+        self.assertEqual(readAll(BufferedFileReader(StringIO(source), 3)),
+                         expected)
+        fd, filename = tempfile.mkstemp(".clj")
+        try:
+            os.write(fd, source)
+            os.close(fd)
+            with MappedFileReader(filename) as r:
+                self.assertEqual(readAll(r), expected)
+        finally:
+            os.remove(filename)
     # def testStringReader_FAIL(self):
     #     # special case, missing trailing "
     #     r = StringReader('"foo')
@@ -0,0 +1,44 @@
+import cPickle
+import gc
+import unittest
+
+from clojure.lang.symbol import Symbol, symbol
+from clojure.lang.cljkeyword import keyword, find
+from clojure.lang.persistenthashmap import EMPTY as EMPTY_MAP
+
+
+class SymbolTests(unittest.TestCase):
+    def testEquality(self):
+        self.assertEqual(symbol("foo"), symbol("foo"))
+        self.assertEqual(hash(symbol("foo")), hash(symbol("foo")))
+        self.assertEqual(symbol("ns", "foo"), symbol(symbol("ns"), "foo"))
+        self.assertNotEqual(symbol("foo"), symbol("ns", "foo"))
+
+    def testMeta(self):
+        meta = EMPTY_MAP.assoc(keyword("tag"), int)
+        s = symbol("foo").withMeta(meta)
+        self.assertFalse(s is symbol("foo"))
+        self.assertEqual(s, symbol("foo"))
+        self.assertEqual(hash(s), hash(symbol("foo")))
+        self.assertEqual(s.withMeta(None).meta(), None)
+
+    def testPickle(self):
+        s = Symbol(None, "foo")
+        s2 = cPickle.loads(cPickle.dumps(s, 2))
+        self.assertEqual(s2, s)
+        self.assertEqual(hash(s2), hash(s))
+
+
+class KeywordTests(unittest.TestCase):
+    def testInterned(self):
+        self.assertTrue(keyword("foo") is keyword(None, "foo"))
+        self.assertTrue(keyword("foo") is keyword(Symbol(None, "foo")))
+        self.assertFalse(keyword("foo") == keyword("ns", "foo"))
+
+    def testWeak(self):
+        self.assertEqual(find("kw-tests-unused"), None)
+        k = keyword("kw-tests-unused")
+        self.assertTrue(find("kw-tests-unused") is k)
+        del k
+        gc.collect()
+        self.assertEqual(find("kw-tests-unused"), None)
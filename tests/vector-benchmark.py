@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Times walking a vector of a million ints
+
+Python iteration forwards and backwards, a first/next walk of its seq,
+and the core functions that take chunks off chunked seqs: reduce, map
+and filter. The best of a few runs is reported.
+
+    python tests/vector-benchmark.py [size] [runs]
+"""
+
+from benchmark import best, sizeAndRuns
+
+import clojure.main
+import clojure.core as core
+from clojure.lang.persistentvector import fromList
+
+
+def iterate(v):
+    for x in v:
+        pass
+
+
+def iterateReversed(v):
+    for x in reversed(v):
+        pass
+
+
+def walkSeq(v):
+    s = v.seq()
+    while s is not None:
+        s.first()
+        s = s.next()
+
+
+def reduceSum(v):
+    getattr(core, "reduce1")(core.__dict__["+"], 0, v)
+
+
+def mapInc(v):
+    iterate(core.map(core.inc, v))
+
+
+def filterEven(v):
+    iterate(core.filter(getattr(core, "even?"), v))
+
+
+def main():
+    size, runs = sizeAndRuns()
+    v = fromList(range(size))
+    for fn in [iterate, iterateReversed, walkSeq, reduceSum, mapInc,
+               filterEven]:
+        print "%-16s %8d items %7.2f s" % (fn.__name__, size,
+                                           best(fn, v, runs))
+
+
+if __name__ == "__main__":
+    main()